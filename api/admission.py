@@ -0,0 +1,93 @@
+"""
+Admission control for new jobs.
+
+Limits how many jobs may wait in the queue and how many upload bytes may be
+in flight (being uploaded, queued or processed) in this API process. Requests
+over a limit are rejected up front with a Retry-After estimate, so a burst
+backs off instead of piling work onto the host.
+
+Bytes are reserved as soon as an upload starts, under a key for the upload
+(its request or upload session), and the reservation is handed over to the
+job the upload becomes with transfer(), so concurrent uploads cannot all pass
+the check and overrun the limit together.
+"""
+
+import math
+import threading
+from typing import Callable, Dict
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, status_code: int = 429, retry_after: int = 0):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Queue-length and bytes-in-flight limits with byte reservations per job or upload.
+
+    A limit of 0 disables it. job_seconds returns the current estimate of how
+    long a job runs, from which Retry-After is derived.
+    """
+
+    def __init__(self, max_queued_jobs: int, max_bytes_in_flight: int, workers: int,
+                 job_seconds: Callable[[], float]):
+        self.max_queued_jobs = max_queued_jobs
+        self.max_bytes_in_flight = max_bytes_in_flight
+        self.workers = max(1, workers)
+        self.job_seconds = job_seconds
+        self._reserved: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def bytes_in_flight(self) -> int:
+        with self._lock:
+            return sum(self._reserved.values())
+
+    def retry_after(self) -> int:
+        """Seconds until a running job is likely to finish and free capacity."""
+        return max(1, math.ceil(self.job_seconds() / self.workers))
+
+    def check(self, queued: int, nbytes: int = 0):
+        """Raise AdmissionRejected if a new job of nbytes would exceed a limit."""
+        with self._lock:
+            self._check(queued, nbytes)
+
+    def _check(self, queued: int, nbytes: int):
+        if self.max_queued_jobs and queued >= self.max_queued_jobs:
+            raise AdmissionRejected(f"Job queue is full ({queued} jobs waiting)", retry_after=self.retry_after())
+        if self.max_bytes_in_flight and nbytes:
+            if nbytes > self.max_bytes_in_flight:
+                # Could never be admitted, so retrying would not help
+                raise AdmissionRejected(
+                    f"Upload of {nbytes} bytes exceeds the {self.max_bytes_in_flight} byte limit", status_code=413
+                )
+            in_flight = sum(self._reserved.values())
+            if in_flight + nbytes > self.max_bytes_in_flight:
+                raise AdmissionRejected(f"Too much data in flight ({in_flight} bytes)", retry_after=self.retry_after())
+
+    def reserve(self, key: str, queued: int, nbytes: int):
+        """Check the limits and hold nbytes for key (a job or an upload) until release()."""
+        with self._lock:
+            self._check(queued, nbytes)
+            self._reserved[key] = self._reserved.get(key, 0) + nbytes
+
+    def held(self, key: str) -> int:
+        """Bytes currently reserved under key."""
+        with self._lock:
+            return self._reserved.get(key, 0)
+
+    def transfer(self, source: str, dest: str) -> int:
+        """Move the bytes held for source to dest. Returns the bytes moved (0 if source held none)."""
+        with self._lock:
+            nbytes = self._reserved.pop(source, 0)
+            if nbytes:
+                self._reserved[dest] = self._reserved.get(dest, 0) + nbytes
+        return nbytes
+
+    def release(self, key: str):
+        """Free the bytes held for a job or upload."""
+        with self._lock:
+            self._reserved.pop(key, None)
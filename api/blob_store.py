@@ -0,0 +1,253 @@
+"""
+Content-addressed storage for uploaded videos and their processed results.
+
+Uploads are stored once under their SHA-256 and hardlinked into job
+directories, so the same stream part uploaded to several jobs takes the disk
+space of one. Processed transcript/keyframe files are cached per
+(video hash, processing parameters) so an already-seen video skips
+transcription, CLIP and Vision entirely. Rendered generate-cuts outputs are
+cached per (narrative, parameters, source content) so a repeated request is
+answered without interval selection or re-rendering.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import time
+import tempfile
+from typing import Dict, Optional, Tuple
+
+# Bump when interval selection or cutting changes in a way that alters renders
+CUTS_VERSION = 1
+
+# Read size when hashing source files
+HASH_READ_SIZE = 4 * 1024 * 1024
+
+# Files kept for a cached render
+CUTS_FILES = ("final_cut_video.mp4", "intervals.json")
+
+# prune() leaves anything modified more recently than this alone, whatever max_age it is given:
+# temp files of uploads and cache writes in progress, and blobs about to be linked into a job
+PRUNE_GRACE_SECONDS = 3600
+
+
+def params_key(params: Dict) -> str:
+    """Stable short key for a set of processing parameters."""
+    encoded = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+def cuts_key(narrative_text: str, duration: int, interval_duration: int, processed_dir: str, video_dir: str,
+             video_hashes: Optional[Dict[str, str]] = None, selection_mode: str = "ai") -> str:
+    """Key for a generate-cuts render: the request parameters plus the content of its source files.
+
+    Processed transcripts are hashed in full. Videos are identified by their
+    upload SHA-256 from video_hashes (filename -> sha256) when known, otherwise
+    by name, size and modification time.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        "version": CUTS_VERSION,
+        "narrative": narrative_text,
+        "duration": duration,
+        "interval_duration": interval_duration,
+        "selection_mode": selection_mode,
+    }, sort_keys=True).encode())
+    if os.path.isdir(processed_dir):
+        for name in sorted(os.listdir(processed_dir)):
+            if not name.endswith(".txt"):
+                continue
+            digest.update(f"\0processed:{name}\0".encode())
+            with open(os.path.join(processed_dir, name), "rb") as f:
+                for block in iter(lambda: f.read(HASH_READ_SIZE), b""):
+                    digest.update(block)
+    if os.path.isdir(video_dir):
+        for name in sorted(os.listdir(video_dir)):
+            known = (video_hashes or {}).get(name)
+            if known is None:
+                st = os.stat(os.path.join(video_dir, name))
+                known = f"{st.st_size}:{st.st_mtime_ns}"
+            digest.update(f"\0video:{name}:{known}".encode())
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Shared store of upload blobs and cached processing results, keyed by content hash."""
+
+    def __init__(self, root: str = "blob_store"):
+        self.root = root
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.results_dir = os.path.join(root, "results")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.cuts_dir = os.path.join(root, "cuts")
+        for directory in (self.blobs_dir, self.results_dir, self.tmp_dir, self.cuts_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blobs_dir, sha256[:2], sha256)
+
+    def new_temp_path(self, suffix: str = "") -> str:
+        """Path for an in-progress upload on the same filesystem as the blobs."""
+        fd, path = tempfile.mkstemp(dir=self.tmp_dir, suffix=suffix)
+        os.close(fd)
+        return path
+
+    def ingest(self, temp_path: str, sha256: str) -> Tuple[str, bool]:
+        """Move a fully written upload into the store.
+
+        Returns (blob_path, reused); if a blob with the same hash already
+        exists the new copy is discarded and reused is True.
+        """
+        blob_path = self.blob_path(sha256)
+        if os.path.exists(blob_path):
+            os.remove(temp_path)
+            return blob_path, True
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(temp_path, blob_path)
+        return blob_path, False
+
+    @staticmethod
+    def link(source: str, dest: str):
+        """Hardlink source to dest, copying when the filesystem can't link."""
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(source, dest)
+        except OSError:
+            shutil.copyfile(source, dest)
+
+    def _result_path(self, sha256: str, key: str) -> str:
+        return os.path.join(self.results_dir, sha256[:2], sha256, f"{key}.txt")
+
+    def cached_result(self, sha256: str, key: str) -> Optional[str]:
+        """Return the cached processed output for a video and parameter set, if any."""
+        path = self._result_path(sha256, key)
+        return path if os.path.exists(path) else None
+
+    def load_result_stats(self, sha256: str, key: str) -> Optional[Dict]:
+        path = self._result_path(sha256, key) + ".stats.json"
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def store_result(self, sha256: str, key: str, output_path: str, stats: Optional[Dict] = None):
+        """Cache a processed output file (and its stage report) for later jobs."""
+        path = self._result_path(sha256, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Copy rather than link: job outputs are not immutable, cache entries must be
+        temp_path = path + f".{os.getpid()}.tmp"
+        shutil.copyfile(output_path, temp_path)
+        if stats is not None:
+            with open(temp_path + ".stats.json", "w", encoding="utf-8") as f:
+                json.dump(stats, f)
+            os.replace(temp_path + ".stats.json", path + ".stats.json")
+        os.replace(temp_path, path)
+
+    def _cuts_path(self, key: str) -> str:
+        return os.path.join(self.cuts_dir, key[:2], key)
+
+    def cached_cuts(self, key: str) -> Optional[Dict]:
+        """Metadata of a cached render (with "directory" holding its files), or None."""
+        path = self._cuts_path(key)
+        try:
+            with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        return {**meta, "directory": path}
+
+    def store_cuts(self, key: str, job_dir: str, meta: Dict):
+        """Cache the render in job_dir (final video and intervals) under key, replacing any entry."""
+        path = self._cuts_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        # Renders are never modified after completion, so linking is safe
+        for name in CUTS_FILES:
+            self.link(os.path.join(job_dir, name), os.path.join(temp_dir, name))
+        with open(os.path.join(temp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        if os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.rename(temp_dir, path)
+        except OSError:
+            # Another process cached the same render first
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def restore_cuts(self, key: str, job_dir: str) -> Optional[Dict]:
+        """Link a cached render into job_dir. Returns its metadata, or None on a miss."""
+        cached = self.cached_cuts(key)
+        if cached is None:
+            return None
+        os.makedirs(job_dir, exist_ok=True)
+        try:
+            for name in CUTS_FILES:
+                self.link(os.path.join(cached["directory"], name), os.path.join(job_dir, name))
+        except FileNotFoundError:
+            # Pruned while we were reading it
+            return None
+        return cached
+
+    def clear_cuts(self) -> int:
+        """Invalidate every cached render. Returns the number of entries removed."""
+        removed = 0
+        for prefix in os.listdir(self.cuts_dir):
+            prefix_dir = os.path.join(self.cuts_dir, prefix)
+            for key in os.listdir(prefix_dir):
+                shutil.rmtree(os.path.join(prefix_dir, key), ignore_errors=True)
+                removed += 1
+        return removed
+
+    def prune(self, max_age: float) -> int:
+        """Remove blobs and cached renders no job links to, and abandoned temp files, older than max_age seconds.
+
+        max_age is raised to PRUNE_GRACE_SECONDS so in-flight writes survive.
+        Returns the number of bytes freed.
+        """
+        cutoff = time.time() - max(max_age, PRUNE_GRACE_SECONDS)
+        freed = 0
+        for directory, _, names in os.walk(self.blobs_dir):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                    # A blob linked into a job directory has more than one link
+                    if st.st_nlink == 1 and st.st_mtime < cutoff:
+                        os.remove(path)
+                        freed += st.st_size
+                except FileNotFoundError:
+                    continue
+        for prefix in os.listdir(self.cuts_dir):
+            prefix_dir = os.path.join(self.cuts_dir, prefix)
+            for key in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, key)
+                try:
+                    st = os.stat(os.path.join(path, CUTS_FILES[0]))
+                    if st.st_nlink == 1 and st.st_mtime < cutoff:
+                        shutil.rmtree(path, ignore_errors=True)
+                        freed += st.st_size
+                except FileNotFoundError:
+                    continue
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                st = os.stat(path)
+                if st.st_mtime < cutoff:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+                    freed += st.st_size
+            except FileNotFoundError:
+                continue
+        return freed
+
+    def restore_result(self, sha256: str, key: str, output_path: str) -> bool:
+        """Copy a cached output to output_path. Returns False on a cache miss."""
+        cached = self.cached_result(sha256, key)
+        if cached is None:
+            return False
+        shutil.copyfile(cached, output_path)
+        return True
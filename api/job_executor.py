@@ -0,0 +1,246 @@
+"""
+Job executor that runs blocking pipeline work in a process pool.
+
+Jobs are queued on the event loop by priority and dispatched to a pool of worker
+processes, at most one job per worker at a time. Workers report state changes
+through a JobReporter, whose updates are pumped back into the API process
+asynchronously together with the metrics they recorded, and poll it to learn
+whether their job was cancelled. PrioritySlots applies the same ordering to
+jobs that run in the API process itself.
+"""
+
+import time
+import heapq
+import asyncio
+import itertools
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+from metrics import REGISTRY
+
+
+class JobReporter:
+    """Worker-side handle for publishing job status updates to the API process."""
+
+    def __init__(self, job_id: str, updates, cancelled=None):
+        self.job_id = job_id
+        self._updates = updates
+        self._cancelled = cancelled
+
+    def update(self, **fields):
+        """Publish changed job fields (status, message, progress, result, error)."""
+        self._updates.put({"job_id": self.job_id, **fields, **self._metrics()})
+        if "message" in fields:
+            progress = f" (Progress: {fields['progress']}%)" if "progress" in fields else ""
+            print(f"🔄 Job {self.job_id}: {fields['message']}{progress}")
+
+    def finish(self):
+        """Mark the job as finished, whatever its final status."""
+        self._updates.put({"job_id": self.job_id, "finished": True, **self._metrics()})
+
+    @staticmethod
+    def _metrics() -> Dict:
+        """Metric increments recorded in this worker since the last update."""
+        deltas = REGISTRY.drain()
+        return {"metrics": deltas} if deltas else {}
+
+    def cancelled(self) -> bool:
+        """Whether the job has been cancelled and should stop as soon as possible."""
+        return self._cancelled is not None and self.job_id in self._cancelled
+
+
+def _run_job(fn: Callable, job_id: str, updates, cancelled, args: tuple):
+    """Entry point inside a worker process."""
+    reporter = JobReporter(job_id, updates, cancelled)
+    try:
+        fn(reporter, *args)
+    finally:
+        reporter.finish()
+
+
+class JobExecutor:
+    """Priority queue feeding a process pool, with job updates flowing back to a callback.
+
+    Higher priorities run first; jobs of equal priority run in submission order.
+    Running jobs are not preempted.
+    """
+
+    def __init__(self, max_workers: int, on_update: Callable[[Dict], None], default_job_seconds: float = 300.0):
+        self.max_workers = max_workers
+        self.on_update = on_update
+        # Moving average of job run time, for queue wait estimates
+        self.average_job_seconds = default_job_seconds
+        # Spawn keeps CUDA/torch state and the API's threads out of the workers
+        self._context = multiprocessing.get_context("spawn")
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._updates = None
+        self._cancelled = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._pending: Dict[str, tuple] = {}
+        self._running = set()
+        self._tasks = []
+
+    async def start(self):
+        """Start the worker pool, the dispatchers and the update pump."""
+        self._manager = self._context.Manager()
+        self._updates = self._manager.Queue()
+        # Shared with the workers, which poll it through JobReporter.cancelled()
+        self._cancelled = self._manager.dict()
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._context)
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.max_workers)]
+        self._tasks.append(asyncio.create_task(self._pump()))
+        print(f"⚙️ Job executor started with {self.max_workers} worker processes")
+
+    async def shutdown(self):
+        """Stop accepting work and wait for the pool to exit."""
+        for task in self._tasks:
+            task.cancel()
+        self._updates.put(None)
+        await asyncio.to_thread(self._pool.shutdown, wait=True, cancel_futures=True)
+        self._manager.shutdown()
+
+    def submit(self, job_id: str, fn: Callable, *args, priority: int = 0):
+        """Queue fn(reporter, *args) to run in a worker process. fn must be importable."""
+        key = (-priority, next(self._sequence))
+        self._pending[job_id] = key
+        self._queue.put_nowait((*key, job_id, fn, args))
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if this executor doesn't own it.
+
+        Queued jobs are dropped when they reach the front of the queue; running
+        jobs see the flag through their reporter and stop at the next check.
+        """
+        if job_id not in self._pending and job_id not in self._running:
+            return False
+        self._cancelled[job_id] = True
+        return True
+
+    @property
+    def queued(self) -> int:
+        return len(self._pending)
+
+    @property
+    def active_jobs(self) -> set:
+        """IDs of jobs queued or running in this executor."""
+        return set(self._pending) | self._running
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position of a queued job in dispatch order, or None if it isn't queued."""
+        key = self._pending.get(job_id)
+        if key is None:
+            return None
+        return 1 + sum(1 for other in self._pending.values() if other < key)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job_id, fn, args = await self._queue.get()
+            self._pending.pop(job_id, None)
+            started = time.monotonic()
+            try:
+                if job_id in self._cancelled:
+                    print(f"🚫 Skipping cancelled job {job_id}")
+                    self.on_update({"job_id": job_id, "finished": True})
+                    continue
+                self._running.add(job_id)
+                await loop.run_in_executor(self._pool, _run_job, fn, job_id, self._updates, self._cancelled, args)
+                self.average_job_seconds = 0.8 * self.average_job_seconds + 0.2 * (time.monotonic() - started)
+            except Exception as e:
+                # The worker died or the job could not be pickled
+                traceback.print_exc()
+                self.on_update({"job_id": job_id, "status": "error", "error": str(e),
+                                "message": f"Error during processing: {e}", "finished": True})
+            finally:
+                self._running.discard(job_id)
+                self._cancelled.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _pump(self):
+        while True:
+            update = await asyncio.to_thread(self._updates.get)
+            if update is None:
+                break
+            try:
+                self.on_update(update)
+            except Exception:
+                traceback.print_exc()
+
+
+class PrioritySlots:
+    """Limits how many in-process jobs run at once, starting waiting jobs by priority.
+
+    Higher priorities start first; jobs of equal priority start in enqueue order.
+    Must be used from the event loop.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = max(1, slots)
+        self._sequence = itertools.count()
+        self._heap = []
+        # job_id -> (sort key, future resolved when the job gets a slot)
+        self._waiting: Dict[str, tuple] = {}
+        self._running = set()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def enqueue(self, job_id: str, priority: int = 0):
+        """Queue a job for a slot; acquire() then waits for it."""
+        key = (-priority, next(self._sequence))
+        self._waiting[job_id] = (key, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._heap, (key, job_id))
+        self._grant()
+
+    async def acquire(self, job_id: str):
+        """Wait until an enqueued job holds a slot."""
+        entry = self._waiting.get(job_id)
+        if entry is None:
+            if job_id in self._running:
+                return
+            raise KeyError(job_id)
+        future = entry[1]
+        try:
+            await future
+        except asyncio.CancelledError:
+            self.release(job_id)
+            raise
+
+    def release(self, job_id: str):
+        """Give up a job's slot, or its place in the queue, and start the next job."""
+        entry = self._waiting.pop(job_id, None)
+        if entry is not None:
+            entry[1].cancel()
+        self._running.discard(job_id)
+        self._grant()
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position of a waiting job in start order, or None if it isn't waiting."""
+        entry = self._waiting.get(job_id)
+        if entry is None:
+            return None
+        return 1 + sum(1 for key, _ in self._waiting.values() if key < entry[0])
+
+    def _grant(self):
+        while self._heap and len(self._running) < self.slots:
+            _, job_id = heapq.heappop(self._heap)
+            entry = self._waiting.pop(job_id, None)
+            if entry is None:
+                # Released while waiting
+                continue
+            self._running.add(job_id)
+            entry[1].set_result(None)
@@ -0,0 +1,334 @@
+"""
+Durable job store backed by SQLite.
+
+The database runs in WAL mode so several API worker processes can read while one
+writes. Status and created_at are indexed, progress updates are single atomic
+UPDATE statements, and listing is cursor-paginated on (created_at, job_id).
+"""
+
+import os
+import json
+import base64
+import asyncio
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Statuses after which a job no longer changes
+TERMINAL_STATUSES = ("completed", "error", "cancelled")
+
+
+class JobStatus:
+    def __init__(self, job_id: str, status: str = "uploading", progress: int = 0,
+                 message: str = "Starting upload...", result: Optional[Dict] = None,
+                 error: Optional[str] = None, created_at: Optional[datetime] = None,
+                 completed_at: Optional[datetime] = None, priority: int = 0):
+        self.job_id = job_id
+        self.status = status
+        self.progress = progress
+        self.message = message
+        self.result = result
+        self.error = error
+        self.created_at = created_at or datetime.now()
+        self.completed_at = completed_at
+        self.priority = priority
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "JobStatus":
+        return cls(
+            job_id=row["job_id"],
+            status=row["status"],
+            progress=row["progress"],
+            message=row["message"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"],
+            created_at=datetime.fromisoformat(row["created_at"]),
+            completed_at=datetime.fromisoformat(row["completed_at"]) if row["completed_at"] else None,
+            priority=row["priority"],
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "priority": self.priority,
+            "created_at": self.created_at.isoformat(),
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None
+        }
+
+    def to_event(self) -> Dict:
+        """Job state without the (potentially large) result, for change events."""
+        event = self.to_dict()
+        del event["result"]
+        return event
+
+    def to_summary(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": self.progress,
+            "priority": self.priority,
+            "created_at": self.created_at.isoformat(),
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class JobChangeNotifier:
+    """Wakes coroutines waiting on a job when it changes in this process.
+
+    Each job has a version counter that is bumped on every change, so a waiter
+    that read version N before loading the job cannot miss a change made after.
+    notify() may be called from any thread.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._events: Dict[str, asyncio.Event] = {}
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def version(self, job_id: str) -> int:
+        return self._versions.get(job_id, 0)
+
+    def notify(self, job_id: str):
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            self._bump(job_id)
+        else:
+            self._loop.call_soon_threadsafe(self._bump, job_id)
+
+    def _bump(self, job_id: str):
+        self._versions[job_id] += 1
+        event = self._events.pop(job_id, None)
+        if event:
+            event.set()
+
+    async def wait(self, job_id: str, seen_version: int, timeout: float) -> bool:
+        """Wait until the job changes past seen_version. Returns False on timeout."""
+        if self.version(job_id) != seen_version:
+            return True
+        event = self._events.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class JobStore:
+    """SQLite-backed job table shared by every API worker process."""
+
+    UPDATABLE_FIELDS = ("status", "progress", "message", "result", "error", "completed_at")
+
+    def __init__(self, db_path: str = "jobs.db", on_change: Optional[Callable[[str], None]] = None):
+        self.db_path = db_path
+        # Called with the job_id after every change made through this store
+        self.on_change = on_change
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                progress INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                result TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                completed_at TEXT,
+                priority INTEGER NOT NULL DEFAULT 0,
+                accessed_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+            CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at, job_id);
+        """)
+        # Databases created before these columns existed
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "priority" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+        if "accessed_at" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN accessed_at TEXT")
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id: str, status: str = "uploading", message: str = "Starting upload...",
+               priority: int = 0) -> JobStatus:
+        job = JobStatus(job_id, status=status, message=message, priority=priority)
+        self._conn().execute(
+            "INSERT INTO jobs (job_id, status, progress, message, created_at, priority) VALUES (?, ?, ?, ?, ?, ?)",
+            (job.job_id, job.status, job.progress, job.message, job.created_at.isoformat(), job.priority)
+        )
+        return job
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return JobStatus.from_row(row) if row else None
+
+    def update(self, job_id: str, **fields) -> bool:
+        """Atomically set the given fields. Returns False if the job does not exist.
+
+        A cancelled job keeps its status: late updates from the stages being
+        torn down only get to stamp completed_at.
+        """
+        unknown = set(fields) - set(self.UPDATABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        if not fields:
+            return self.get(job_id) is not None
+
+        values = []
+        for field, value in fields.items():
+            if field == "result" and value is not None:
+                value = json.dumps(value)
+            elif field == "completed_at" and value is not None:
+                value = value.isoformat()
+            values.append(value)
+
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        guard = "" if set(fields) == {"completed_at"} else " AND status != 'cancelled'"
+        cursor = self._conn().execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?{guard}", (*values, job_id))
+        self._changed(job_id)
+        return cursor.rowcount > 0
+
+    def cancel(self, job_id: str) -> bool:
+        """Mark an unfinished job as cancelled. Returns False if it already finished."""
+        placeholders = ",".join("?" * len(TERMINAL_STATUSES))
+        cursor = self._conn().execute(
+            f"UPDATE jobs SET status = 'cancelled', message = 'Job cancelled', completed_at = ? "
+            f"WHERE job_id = ? AND status NOT IN ({placeholders})",
+            (datetime.now().isoformat(), job_id, *TERMINAL_STATUSES)
+        )
+        self._changed(job_id)
+        return cursor.rowcount > 0
+
+    def interrupt_unfinished(self, message: str = "Interrupted by server restart") -> int:
+        """Fail every job that hasn't finished. Returns the number of jobs changed.
+
+        Queues and running work live in the API processes, so after a restart
+        nothing will ever finish these jobs.
+        """
+        placeholders = ",".join("?" * len(TERMINAL_STATUSES))
+        cursor = self._conn().execute(
+            f"UPDATE jobs SET status = 'error', message = ?, error = ?, completed_at = ? "
+            f"WHERE status NOT IN ({placeholders})",
+            (message, message, datetime.now().isoformat(), *TERMINAL_STATUSES)
+        )
+        return cursor.rowcount
+
+    def finish(self, job_id: str) -> Optional[JobStatus]:
+        """Stamp completed_at and return the final job state."""
+        self.update(job_id, completed_at=datetime.now())
+        return self.get(job_id)
+
+    def delete(self, job_id: str) -> bool:
+        deleted = self._conn().execute("DELETE FROM jobs WHERE job_id = ?", (job_id,)).rowcount > 0
+        self._changed(job_id)
+        return deleted
+
+    def touch(self, job_id: str):
+        """Record that a job's data was used, for least-recently-used eviction."""
+        self._conn().execute("UPDATE jobs SET accessed_at = ? WHERE job_id = ?",
+                             (datetime.now().isoformat(), job_id))
+
+    def finished_before(self, cutoff: datetime, limit: int = 100, exclude: Iterable[str] = ()) -> List[str]:
+        """IDs of finished jobs completed before cutoff and not used since, other than those in exclude."""
+        exclude = list(exclude)
+        placeholders = ",".join("?" * len(TERMINAL_STATUSES))
+        excluded = ",".join("?" * len(exclude))
+        rows = self._conn().execute(
+            f"SELECT job_id FROM jobs WHERE status IN ({placeholders}) "
+            f"AND COALESCE(accessed_at, completed_at, created_at) < ? "
+            f"AND job_id NOT IN ({excluded}) LIMIT ?",
+            (*TERMINAL_STATUSES, cutoff.isoformat(), *exclude, limit)
+        ).fetchall()
+        return [row["job_id"] for row in rows]
+
+    def least_recently_used(self, limit: int = 10, before: Optional[datetime] = None,
+                            exclude: Iterable[str] = ()) -> List[str]:
+        """IDs of finished jobs, least recently completed or used first.
+
+        With before, only jobs last completed or used before it; jobs in exclude are skipped.
+        """
+        exclude = list(exclude)
+        placeholders = ",".join("?" * len(TERMINAL_STATUSES))
+        excluded = ",".join("?" * len(exclude))
+        rows = self._conn().execute(
+            f"SELECT job_id FROM jobs WHERE status IN ({placeholders}) "
+            f"AND COALESCE(accessed_at, completed_at, created_at) < ? "
+            f"AND job_id NOT IN ({excluded}) "
+            f"ORDER BY COALESCE(accessed_at, completed_at, created_at) LIMIT ?",
+            (*TERMINAL_STATUSES, (before or datetime.max).isoformat(), *exclude, limit)
+        ).fetchall()
+        return [row["job_id"] for row in rows]
+
+    def exists(self, job_id: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone() is not None
+
+    def _changed(self, job_id: str):
+        if self.on_change:
+            self.on_change(job_id)
+
+    def clear(self):
+        self._conn().execute("DELETE FROM jobs")
+
+    def list(self, limit: int = 50, cursor: Optional[str] = None,
+             status: Optional[str] = None) -> Tuple[List[JobStatus], Optional[str]]:
+        """Return up to limit jobs, newest first, and the cursor for the next page."""
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if cursor:
+            created_at, job_id = self._decode_cursor(cursor)
+            clauses.append("(created_at, job_id) < (?, ?)")
+            params.extend([created_at, job_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn().execute(
+            f"SELECT * FROM jobs {where} ORDER BY created_at DESC, job_id DESC LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+
+        jobs = [JobStatus.from_row(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = jobs[-1]
+            next_cursor = self._encode_cursor(last.created_at.isoformat(), last.job_id)
+        return jobs, next_cursor
+
+    @staticmethod
+    def _encode_cursor(created_at: str, job_id: str) -> str:
+        return base64.urlsafe_b64encode(f"{created_at}|{job_id}".encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[str, str]:
+        try:
+            created_at, job_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        except Exception:
+            raise ValueError("Invalid cursor")
+        return created_at, job_id
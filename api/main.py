@@ -1,38 +1,214 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Form
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import os
-import tempfile
 import shutil
 import uuid
-from pathlib import Path
 import asyncio
-import subprocess
+import threading
 import sys
 from typing import List, Dict, Optional
 import json
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
 
 # Load environment variables from .env file
 from dotenv import load_dotenv
 load_dotenv()
 
-# Add parent directory to path to import video_processor and nlpv2
+# Add parent directory to path to import keyframe_index, and this directory for the API modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from video_processor import VideoProcessor
-from nlpv2.main import read_folder_raw, generate_narrative, save_narrative
-
-# Add the parent directory to sys.path to access the scripts
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from keyframe_index import KeyframeIndex, ClipTextEncoder
+from metrics import REGISTRY, Gauge, JOB_STAGE_SECONDS, BYTES_UPLOADED
+from job_executor import JobExecutor, PrioritySlots
+from job_store import JobStore, JobChangeNotifier, TERMINAL_STATUSES
+from media_response import RangeFileResponse
+from multipart_upload import MultipartError, receive_multipart
+from blob_store import BlobStore, cuts_key
+from upload_sessions import UploadSessionStore
+from admission import AdmissionController, AdmissionRejected
+from retention import RetentionManager
+from pipeline_jobs import process_videos_job, KEYFRAME_INDEX_DIR, BLOB_STORE_DIR
+from generate_narrative_intervals import select_intervals, SELECTION_MODES
+from cut_video_segments import render_cuts
 
 # Create job_data directory if it doesn't exist
 os.makedirs("job_data", exist_ok=True)
 
-app = FastAPI(title="Video Processing & Narrative Generation API", version="1.0.0")
+# Number of worker processes running video processing jobs (each loads Whisper and CLIP)
+PROCESSING_WORKERS = int(os.getenv("PROCESSING_WORKERS", "1"))
+
+# API worker processes serving requests; they share job state through the job store
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+
+# Admission limits per API worker process (0 disables a limit)
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "16"))
+MAX_BYTES_IN_FLIGHT = int(os.getenv("MAX_BYTES_IN_FLIGHT", "0"))
+# Generate-cuts jobs running at once; the rest wait in the queue
+MAX_CONCURRENT_CUTS = int(os.getenv("MAX_CONCURRENT_CUTS", "2"))
+
+# Retention: finished jobs expire after JOB_TTL_HOURS (0 keeps them), and if DISK_HIGH_WATERMARK is set
+# and the disk is fuller than it, the least recently used ones are evicted down to DISK_LOW_WATERMARK
+JOB_TTL_HOURS = float(os.getenv("JOB_TTL_HOURS", "72"))
+DISK_HIGH_WATERMARK = float(os.getenv("DISK_HIGH_WATERMARK", "0"))
+DISK_LOW_WATERMARK = float(os.getenv("DISK_LOW_WATERMARK", "0.8"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "300"))
+UPLOAD_SESSION_TTL_HOURS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+
+# Durable job state shared by every API worker process, with in-process change notifications
+job_notifier = JobChangeNotifier()
+job_store = JobStore(os.getenv("JOB_DB_PATH", "jobs.db"), on_change=job_notifier.notify)
+
+# Seconds between job re-reads in event streams (catches changes made by other API workers)
+EVENTS_POLL_INTERVAL = 2.0
+# Seconds between keep-alive comments on idle event streams
+EVENTS_KEEPALIVE_INTERVAL = 15.0
+
+def update_job(job_id: str, **fields):
+    """Persist job field changes and log the new message."""
+    job_store.update(job_id, **fields)
+    if "message" in fields:
+        progress = f" (Progress: {fields['progress']}%)" if "progress" in fields else ""
+        print(f"🔄 Job {job_id}: {fields['message']}{progress}")
+
+def finish_job(job_id: str):
+    """Stamp a job's completion time."""
+    job = job_store.finish(job_id)
+    if job:
+        print(f"🏁 Job {job_id} finished at {job.completed_at} with status: {job.status}")
+
+def apply_job_update(update: dict):
+    """Apply a status update published by a worker process."""
+    if update.get("metrics"):
+        REGISTRY.merge(update["metrics"])
+    fields = {f: update[f] for f in ("status", "message", "progress", "result", "error") if f in update}
+    if fields:
+        job_store.update(update["job_id"], **fields)
+    if update.get("finished"):
+        admission.release(update["job_id"])
+        finish_job(update["job_id"])
+
+executor = JobExecutor(PROCESSING_WORKERS, apply_job_update)
+admission = AdmissionController(MAX_QUEUED_JOBS, MAX_BYTES_IN_FLIGHT, PROCESSING_WORKERS,
+                                lambda: executor.average_job_seconds)
+
+# Generate-cuts jobs waiting for a slot, started by priority, and those holding one
+cuts_slots = PrioritySlots(MAX_CONCURRENT_CUTS)
+
+# Scheduler state, read when /metrics is scraped
+Gauge("ezcut_queued_jobs", "Jobs waiting to start", callback=lambda: executor.queued + cuts_slots.waiting)
+Gauge("ezcut_active_jobs", "Jobs currently running", callback=lambda: executor.running + cuts_slots.running)
+Gauge("ezcut_bytes_in_flight", "Upload bytes reserved by uploads and admitted jobs",
+      callback=lambda: admission.bytes_in_flight)
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+    return HTTPException(status_code=e.status_code, detail=e.reason, headers=headers)
+
+def admit_job(job_id: str, queued: int, nbytes: int = 0):
+    """Reserve capacity for a new job or reject the request (429 with Retry-After, or 413)."""
+    try:
+        admission.reserve(job_id, queued, nbytes)
+    except AdmissionRejected as e:
+        print(f"⛔ Rejected job {job_id}: {e.reason}")
+        raise admission_error(e)
+
+def upload_reservation(upload_id: str) -> str:
+    """Admission key of the bytes held for a resumable upload session."""
+    try:
+        upload_id = uuid.UUID(upload_id).hex
+    except ValueError:
+        pass
+    return f"upload:{upload_id}"
+
+# Source job of each queued or running generate-cuts job, kept from retention while in use
+cuts_sources: Dict[str, str] = {}
+
+# Cancellation flags of running generate-cuts jobs, polled by interval generation and rendering
+running_cuts: Dict[str, threading.Event] = {}
+
+# Seconds between checks for jobs cancelled through another API worker
+CANCEL_SYNC_INTERVAL = 1.0
+
+def cancel_local_job(job_id: str) -> bool:
+    """Stop a job if it runs in this process. Returns False if it isn't ours."""
+    owned = executor.cancel(job_id)
+    cancel_event = running_cuts.get(job_id)
+    if cancel_event:
+        cancel_event.set()
+        owned = True
+    return owned
+
+async def sync_cancellations():
+    """Pick up cancellations of this process's jobs made through other API workers."""
+    while True:
+        await asyncio.sleep(CANCEL_SYNC_INTERVAL)
+        for job_id in executor.active_jobs | set(running_cuts):
+            job = await run_in_threadpool(job_store.get, job_id)
+            if job and job.status == "cancelled":
+                cancel_local_job(job_id)
 
-# Add CORS middleware
+def interrupt_unfinished_jobs():
+    """Fail jobs a previous server run left unfinished, so they expire and their event streams end."""
+    interrupted = job_store.interrupt_unfinished()
+    if interrupted:
+        print(f"⚠️ Marked {interrupted} unfinished jobs from a previous run as interrupted")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_notifier.bind(asyncio.get_running_loop())
+    if API_WORKERS == 1:
+        # With several workers this runs once in __main__, before any worker could own a job
+        interrupt_unfinished_jobs()
+    await executor.start()
+    cancel_sync = asyncio.create_task(sync_cancellations())
+    retention.start()
+    yield
+    cancel_sync.cancel()
+    await retention.stop()
+    await executor.shutdown()
+
+app = FastAPI(title="Video Processing & Narrative Generation API", version="1.0.0", lifespan=lifespan)
+
+class UploadAdmissionMiddleware:
+    """Turn away uploads before their body is read when there is no capacity for them.
+    
+    Admitted uploads hold their Content-Length while the body is received;
+    upload_videos hands the reservation over to the job. A plain ASGI middleware
+    that passes every other request straight through, so responses (event
+    streams and file sends included) are not wrapped.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != "/upload-videos":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        reservation = f"request:{uuid.uuid4().hex}"
+        try:
+            admission.reserve(reservation, executor.queued, int(headers.get("content-length", 0)))
+        except AdmissionRejected as e:
+            retry_headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+            response = JSONResponse(status_code=e.status_code, content={"detail": e.reason}, headers=retry_headers)
+            await response(scope, receive, send)
+            return
+        scope.setdefault("state", {})["upload_reservation"] = reservation
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(reservation)
+
+app.add_middleware(UploadAdmissionMiddleware)
+
+# Add CORS middleware (added last so its headers are also set on early rejections)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -41,25 +217,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global storage for job status
-jobs = {}
+# Cross-job index of CLIP frame embeddings, searchable by text
+keyframe_index = KeyframeIndex(KEYFRAME_INDEX_DIR)
+clip_text_encoder = ClipTextEncoder()
+
+VALID_VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm'}
+
+# Uploads are stored once per content hash and hardlinked into job directories
+blob_store = BlobStore(BLOB_STORE_DIR)
 
-class JobStatus:
-    def __init__(self, job_id: str):
-        self.job_id = job_id
-        self.status = "uploading"
-        self.progress = 0
-        self.message = "Starting upload..."
-        self.result = None
-        self.error = None
-        self.created_at = datetime.now()
-        self.completed_at = None
+# Resumable upload sessions live next to the blobs so finalizing is a rename
+upload_sessions = UploadSessionStore(os.path.join(BLOB_STORE_DIR, "uploads"))
+
+retention = RetentionManager(
+    job_store, keyframe_index, "job_data", blob_store=blob_store, upload_sessions=upload_sessions,
+    job_ttl=JOB_TTL_HOURS * 3600, upload_session_ttl=UPLOAD_SESSION_TTL_HOURS * 3600,
+    on_upload_expired=lambda upload_id: admission.release(upload_reservation(upload_id)),
+    in_use=lambda: set(cuts_sources.values()),
+    high_watermark=DISK_HIGH_WATERMARK, low_watermark=DISK_LOW_WATERMARK, interval=RETENTION_INTERVAL
+)
 
 class GenerateCutsRequest(BaseModel):
     narrative_text: str
     duration: int = 120
     interval_duration: int = 10
     job_id: Optional[str] = None  # If provided, use existing job's processed files
+    priority: int = 0
+    refresh: bool = False  # Re-render even if an identical request was cached
+    selection_mode: str = "ai"  # "local" selects intervals offline, without OpenAI
+
+class CreateUploadRequest(BaseModel):
+    filename: str
+    size: int
+
+class FinalizeUploadRequest(BaseModel):
+    sha256: str
+
+class ProcessUploadsRequest(BaseModel):
+    upload_ids: List[str]
+    priority: int = 0
 
 @app.get("/")
 async def root():
@@ -69,249 +265,396 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
-@app.post("/upload-videos")
-async def upload_videos(
-    background_tasks: BackgroundTasks,
-    files: List[UploadFile] = File(...)
-):
-    """Upload multiple videos and process them asynchronously."""
-    
-    # Validate files
-    valid_extensions = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm'}
-    
-    for file in files:
-        if not file.filename or not any(file.filename.lower().endswith(ext) for ext in valid_extensions):
-            filename = file.filename or "unknown_file"
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Invalid file type: {filename}. Supported: {', '.join(valid_extensions)}"
-            )
-    
+# Multipart body of /upload-videos, which is parsed by hand so files are streamed to disk once
+UPLOAD_VIDEOS_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["files"],
+            "properties": {
+                "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                "priority": {"type": "integer", "default": 0},
+            },
+        }}},
+    }
+}
+
+def check_video_filename(filename: str):
+    if not is_valid_video_filename(filename):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type: {filename or 'unknown_file'}. Supported: {', '.join(VALID_VIDEO_EXTENSIONS)}"
+        )
+
+@app.post("/upload-videos", openapi_extra=UPLOAD_VIDEOS_BODY)
+async def upload_videos(request: Request):
+    """Upload multiple videos and process them asynchronously.
+    
+    The multipart body ("files" parts and an optional "priority" field) is
+    streamed straight into the blob store, hashing each file on the way, so
+    every upload is written to disk once.
+    """
     # Generate job ID
     job_id = str(uuid.uuid4())
-    jobs[job_id] = JobStatus(job_id)
-    
-    # Read file contents before starting background task
-    # This prevents "read of closed file" errors
-    file_data_list = []
-    for file in files:
-        file_content = await file.read()
-        file_data_list.append({
-            'filename': file.filename,
-            'content': file_content,
-            'content_type': file.content_type
-        })
+    admit_job(job_id, executor.queued)
+    # The bytes reserved when the upload started now belong to the job
+    admission.transfer(getattr(request.state, "upload_reservation", ""), job_id)
+    
+    videos_dir = os.path.join("job_data", job_id, "videos")
+    uploaded_files = []
+    upload_started = asyncio.get_running_loop().time()
+    form = None
+    try:
+        form = await receive_multipart(request, lambda filename: blob_store.new_temp_path(),
+                                       check_filename=check_video_filename)
+        if not form.files or any(received.field_name != "files" for received in form.files):
+            raise HTTPException(status_code=400, detail='Expected one or more "files" parts')
+        try:
+            priority = int(form.fields.get("priority", 0))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="priority must be an integer")
+        job_store.create(job_id, priority=priority)
+        
+        # File them by content hash
+        os.makedirs(videos_dir, exist_ok=True)
+        for received in form.files:
+            file_path = os.path.join(videos_dir, received.filename)
+            blob_path, reused = await run_in_threadpool(blob_store.ingest, received.path, received.sha256)
+            await run_in_threadpool(blob_store.link, blob_path, file_path)
+            uploaded_files.append({
+                'filename': received.filename,
+                'path': file_path,
+                'size': received.size,
+                'sha256': received.sha256,
+                'upload_reused': reused
+            })
+            BYTES_UPLOADED.inc(received.size)
+            print(f"📥 Saved file: {received.filename} ({received.size} bytes, sha256 {received.sha256[:12]}"
+                  f"{', already stored' if reused else ''})")
+    except BaseException as e:
+        shutil.rmtree(os.path.join("job_data", job_id), ignore_errors=True)
+        job_store.delete(job_id)
+        admission.release(job_id)
+        if isinstance(e, HTTPException):
+            raise
+        if isinstance(e, MultipartError):
+            raise HTTPException(status_code=400, detail=str(e))
+        if not isinstance(e, Exception):
+            # Client disconnects and cancellation
+            raise
+        raise HTTPException(status_code=500, detail=f"Failed to save upload: {e}")
+    finally:
+        # Files not yet moved into the store
+        for received in (form.files if form else []):
+            if os.path.exists(received.path):
+                os.remove(received.path)
     
-    # Start background processing with file data instead of file objects
-    background_tasks.add_task(process_videos_background, job_id, file_data_list)
+    JOB_STAGE_SECONDS.observe(asyncio.get_running_loop().time() - upload_started, stage="upload")
+    return start_processing_job(job_id, uploaded_files, priority)
+
+def start_processing_job(job_id: str, uploaded_files: List[dict], priority: int = 0):
+    """Queue a job whose videos are already on disk. Higher priorities are processed first."""
+    # Only paths are handed to processing, which runs in the worker pool
+    if job_store.update(job_id, status="queued", message="Queued for processing..."):
+        executor.submit(job_id, process_videos_job, uploaded_files, priority=priority)
+    else:
+        admission.release(job_id)
     
     return {
         "job_id": job_id,
-        "message": f"Uploaded {len(files)} videos. Processing started.",
+        "message": f"Uploaded {len(uploaded_files)} videos. Processing started.",
         "status_endpoint": f"/job/{job_id}"
     }
 
+def is_valid_video_filename(filename: Optional[str]) -> bool:
+    return bool(filename) and any(filename.lower().endswith(ext) for ext in VALID_VIDEO_EXTENSIONS)
+
+@app.post("/uploads")
+async def create_upload(request: CreateUploadRequest):
+    """Start a resumable upload session for one video of a known size."""
+    if not is_valid_video_filename(request.filename):
+        raise HTTPException(status_code=400, detail=f"Invalid file type: {request.filename}")
+    try:
+        admission.check(executor.queued, request.size)
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    try:
+        session = await run_in_threadpool(upload_sessions.create, request.filename, request.size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=507, detail=f"Could not allocate upload: {e}")
+    
+    # The declared size is held from now on; the job created from the session takes it over
+    try:
+        admission.reserve(upload_reservation(session['upload_id']), executor.queued, session['size'])
+    except AdmissionRejected as e:
+        # Another upload took the capacity since the check above
+        await run_in_threadpool(upload_sessions.delete, session['upload_id'])
+        raise admission_error(e)
+    
+    print(f"📤 Created upload session {session['upload_id']} for {session['filename']} ({session['size']} bytes)")
+    return session
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request):
+    """Write the request body into the upload at the given byte offset.
+    
+    Chunks may be sent in any order and in parallel; a failed chunk is simply retried.
+    """
+    try:
+        writer = await run_in_threadpool(upload_sessions.open_chunk, upload_id, offset)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    written = 0
+    try:
+        async for piece in request.stream():
+            if not piece:
+                continue
+            if offset + written + len(piece) > writer.size:
+                raise HTTPException(status_code=400, detail="Chunk extends past the end of the upload")
+            await run_in_threadpool(writer.write, piece, offset + written)
+            written += len(piece)
+    except ValueError as e:
+        # Finalized while this chunk was arriving
+        raise HTTPException(status_code=409, detail=str(e))
+    finally:
+        writer.close()
+    
+    # Only a fully received chunk counts; a dropped connection leaves its range missing
+    await run_in_threadpool(upload_sessions.commit_chunk, upload_id, offset, written)
+    BYTES_UPLOADED.inc(written)
+    return {"upload_id": upload_id, "offset": offset, "received": written}
+
+@app.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Upload session state, including the byte ranges still missing."""
+    try:
+        return await run_in_threadpool(upload_sessions.status, upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+@app.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, request: FinalizeUploadRequest):
+    """Verify the assembled upload against its SHA-256 and store it."""
+    try:
+        status = await run_in_threadpool(upload_sessions.finalize, upload_id, request.sha256, blob_store)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    print(f"📦 Finalized upload {upload_id}: {status['filename']} (sha256 {status['sha256'][:12]})")
+    return status
+
+@app.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    """Abandon an upload session."""
+    try:
+        await run_in_threadpool(upload_sessions.delete, upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    admission.release(upload_reservation(upload_id))
+    return {"message": f"Upload {upload_id} deleted"}
+
+@app.post("/uploads/process")
+async def process_uploads(request: ProcessUploadsRequest):
+    """Create a processing job from finalized upload sessions."""
+    if not request.upload_ids:
+        raise HTTPException(status_code=400, detail="No uploads given")
+    
+    sessions = []
+    for upload_id in request.upload_ids:
+        try:
+            session = await run_in_threadpool(upload_sessions.get_finalized, upload_id)
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"Upload not found: {upload_id}")
+        if session is None:
+            raise HTTPException(status_code=409, detail=f"Upload is not finalized: {upload_id}")
+        sessions.append(session)
+    
+    job_id = str(uuid.uuid4())
+    # Sessions created through this API worker already hold their bytes; reserve the rest
+    unreserved = sum(session['size'] for session in sessions
+                     if not admission.held(upload_reservation(session['upload_id'])))
+    admit_job(job_id, executor.queued, unreserved)
+    for session in sessions:
+        admission.transfer(upload_reservation(session['upload_id']), job_id)
+    job_store.create(job_id, priority=request.priority)
+    videos_dir = os.path.join("job_data", job_id, "videos")
+    os.makedirs(videos_dir, exist_ok=True)
+    
+    uploaded_files = []
+    for session in sessions:
+        file_path = os.path.join(videos_dir, session['filename'])
+        await run_in_threadpool(blob_store.link, session['blob_path'], file_path)
+        uploaded_files.append({
+            'filename': session['filename'],
+            'path': file_path,
+            'size': session['size'],
+            'sha256': session['sha256'],
+            'upload_reused': session.get('upload_reused', False)
+        })
+        await run_in_threadpool(upload_sessions.delete, session['upload_id'])
+    
+    return start_processing_job(job_id, uploaded_files, request.priority)
+
+@app.delete("/cuts-cache")
+async def clear_cuts_cache():
+    """Invalidate every cached generate-cuts render."""
+    removed = await run_in_threadpool(blob_store.clear_cuts)
+    return {"message": f"Removed {removed} cached renders"}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this API process and its processing workers."""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/job/{job_id}")
 async def get_job_status(job_id: str):
     """Get the status of a processing job."""
-    if job_id not in jobs:
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    status = job.to_dict()
+    if job.status == "queued":
+        # Only known to the API worker that queued the job
+        position = executor.queue_position(job_id)
+        if position is None:
+            position = cuts_slots.queue_position(job_id)
+        if position is not None:
+            status["queue_position"] = position
+    return status
+
+@app.post("/job/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job.
+    
+    Queued jobs never start; running jobs have their ffmpeg children killed, and
+    skip any Vision, narrative or interval requests not yet sent.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not job_store.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already finished with status: {job.status}")
+    
+    cancel_local_job(job_id)
+    print(f"🚫 Job {job_id} cancelled")
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/job/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-sent events stream of a job's status, progress and message changes.
+    
+    Sends a "status" event whenever the job changes and a final "done" event
+    carrying the full job (including result) when it completes, fails or is cancelled.
+    """
+    if job_store.get(job_id) is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
+    async def event_stream():
+        last_state = None
+        last_sent = asyncio.get_running_loop().time()
+        while True:
+            seen_version = job_notifier.version(job_id)
+            job = job_store.get(job_id)
+            if job is None:
+                yield "event: deleted\ndata: {}\n\n"
+                return
+            
+            if job.status in TERMINAL_STATUSES:
+                yield f"event: done\ndata: {json.dumps(job.to_dict())}\n\n"
+                return
+            
+            state = job.to_event()
+            if state != last_state:
+                last_state = state
+                last_sent = asyncio.get_running_loop().time()
+                yield f"event: status\ndata: {json.dumps(state)}\n\n"
+            elif asyncio.get_running_loop().time() - last_sent >= EVENTS_KEEPALIVE_INTERVAL:
+                last_sent = asyncio.get_running_loop().time()
+                yield ": keep-alive\n\n"
+            
+            if await request.is_disconnected():
+                return
+            await job_notifier.wait(job_id, seen_version, EVENTS_POLL_INTERVAL)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs")
+async def list_jobs(limit: int = 50, cursor: Optional[str] = None, status: Optional[str] = None):
+    """List jobs, newest first. Pass next_cursor back as cursor to get the next page."""
+    limit = max(1, min(limit, 500))
+    try:
+        page, next_cursor = job_store.list(limit, cursor, status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     return {
-        "job_id": job.job_id,
-        "status": job.status,
-        "progress": job.progress,
-        "message": job.message,
-        "result": job.result,
-        "error": job.error,
-        "created_at": job.created_at.isoformat(),
-        "completed_at": job.completed_at.isoformat() if job.completed_at else None
+        "jobs": [job.to_summary() for job in page],
+        "next_cursor": next_cursor
     }
 
-@app.get("/jobs")
-async def list_jobs():
-    """List all jobs."""
+@app.get("/search")
+def search_moments(q: str, k: int = 10, job_id: Optional[str] = None):
+    """Find the frames across all processed jobs that best match a text query."""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    k = max(1, min(k, 100))
+    
+    query_embedding = clip_text_encoder.encode(q)
+    matches = keyframe_index.search(query_embedding, k, job_id)
+    
     return {
-        "jobs": [
+        "query": q,
+        "results": [
             {
-                "job_id": job.job_id,
-                "status": job.status,
-                "progress": job.progress,
-                "created_at": job.created_at.isoformat(),
-                "completed_at": job.completed_at.isoformat() if job.completed_at else None
+                **match,
+                "time": f"{int(match['timestamp'] // 3600):02d}:{int(match['timestamp'] % 3600 // 60):02d}:{int(match['timestamp'] % 60):02d}"
             }
-            for job in jobs.values()
+            for match in matches
         ]
     }
 
-async def process_videos_background(job_id: str, file_data_list: List[dict]):
-    """Background task to process uploaded videos."""
-    job = jobs[job_id]
-    
-    print(f"🚀 Starting background processing for job {job_id}")
-    print(f"📁 Processing {len(file_data_list)} files: {[f['filename'] for f in file_data_list]}")
-    
-    try:
-        # Create persistent directories for this job
-        job_dir = os.path.join("job_data", job_id)
-        videos_dir = os.path.join(job_dir, "videos")
-        processed_dir = os.path.join(job_dir, "processed")
-        
-        os.makedirs(videos_dir, exist_ok=True)
-        os.makedirs(processed_dir, exist_ok=True)
-        
-        print(f"📂 Created job directories: {job_dir}")
-        
-        job.status = "uploading"
-        job.message = "Saving uploaded files..."
-        job.progress = 10
-        print(f"🔄 Job {job_id}: {job.message} (Progress: {job.progress}%)")
-        
-        # Save uploaded files to persistent location
-        video_files = []
-        for i, file_data in enumerate(file_data_list):
-            file_path = os.path.join(videos_dir, file_data['filename'])
-            
-            # Write the pre-read content to file
-            with open(file_path, "wb") as buffer:
-                buffer.write(file_data['content'])
-            
-            video_files.append(file_path)
-            job.progress = 10 + (i + 1) * 20 // len(file_data_list)
-            print(f"📥 Saved file: {file_data['filename']} ({len(file_data['content'])} bytes)")
-        
-        job.status = "processing"
-        job.message = "Processing videos with AI..."
-        job.progress = 30
-        print(f"🔄 Job {job_id}: {job.message} (Progress: {job.progress}%)")
-        
-        # Process videos using video_processor
-        print(f"🎬 Initializing VideoProcessor...")
-        processor = VideoProcessor()
-        
-        for i, video_path in enumerate(video_files):
-            job.message = f"Processing video {i+1}/{len(video_files)}: {os.path.basename(video_path)}"
-            job.progress = 30 + (i + 1) * 40 // len(video_files)
-            print(f"🔄 Job {job_id}: {job.message} (Progress: {job.progress}%)")
-            
-            output_file = os.path.join(processed_dir, f"{Path(video_path).stem}_processed.txt")
-            print(f"🎥 Processing video: {video_path} -> {output_file}")
-            
-            try:
-                processor.process_video(video_path, output_file)
-                print(f"✅ Successfully processed: {os.path.basename(video_path)}")
-            except Exception as e:
-                print(f"❌ Error processing video {video_path}: {e}")
-                raise e
-        
-        # Check what files were created
-        txt_files = [f for f in os.listdir(processed_dir) if f.endswith('.txt')]
-        print(f"📋 Found {len(txt_files)} txt files:")
-        for txt_file in txt_files:
-            file_path = os.path.join(processed_dir, txt_file)
-            file_size = os.path.getsize(file_path)
-            print(f"  - {txt_file} ({file_size} bytes)")
-        
-        job.status = "generating_narrative"
-        job.message = "Generating narrative from processed content..."
-        job.progress = 80
-        print(f"🔄 Job {job_id}: {job.message} (Progress: {job.progress}%)")
-        
-        # Generate narrative using nlpv2
-        print(f"📖 Reading processed content from: {processed_dir}")
-        try:
-            content = read_folder_raw(processed_dir)
-            print(f"📄 Read content length: {len(content) if content else 0} characters")
-            
-            if content:
-                print(f"🤖 Generating narrative with AI...")
-                narrative = generate_narrative(content)
-                print(f"📝 Generated narrative length: {len(narrative)} characters")
-                
-                # Save narrative
-                print(f"💾 Saving narrative to api_outputs...")
-                output_file = save_narrative(narrative, "api_outputs")
-                print(f"💾 Narrative saved to: {output_file}")
-                
-                job.status = "completed"
-                job.message = "Processing completed successfully!"
-                job.progress = 100
-                job.result = {
-                    "narrative": narrative,
-                    "output_file": output_file,
-                    "processed_files": len(txt_files),
-                    "job_directory": job_dir,
-                    "videos_directory": videos_dir,
-                    "processed_directory": processed_dir
-                }
-                print(f"🎉 Job {job_id} completed successfully!")
-                print(f"🎉 Result: narrative={len(narrative)} chars, output_file={output_file}, processed_files={len(txt_files)}")
-                print(f"🎉 Job data saved to: {job_dir}")
-            else:
-                error_msg = "No content found in processed files"
-                print(f"❌ {error_msg}")
-                raise Exception(error_msg)
-        except Exception as e:
-            print(f"❌ Error in narrative generation: {e}")
-            raise e
-            
-    except Exception as e:
-        error_msg = str(e)
-        job.status = "error"
-        job.message = f"Error during processing: {error_msg}"
-        job.error = error_msg
-        print(f"❌ Job {job_id} failed: {error_msg}")
-        print(f"❌ Full error: {e}")
-        import traceback
-        traceback.print_exc()
-    
-    finally:
-        job.completed_at = datetime.now()
-        print(f"🏁 Job {job_id} finished at {job.completed_at} with status: {job.status}")
-        # Note: We no longer clean up the job directory to preserve files for generate-cuts
-
 @app.delete("/job/{job_id}")
 async def delete_job(job_id: str):
     """Delete a job and its data."""
-    if job_id not in jobs:
+    if job_store.get(job_id) is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    # Clean up job data directory
-    job_dir = os.path.join("job_data", job_id)
-    if os.path.exists(job_dir):
-        try:
-            shutil.rmtree(job_dir)
-            print(f"🧹 Cleaned up job directory: {job_dir}")
-        except Exception as e:
-            print(f"⚠️ Error cleaning up job directory {job_dir}: {e}")
-    
-    del jobs[job_id]
+    # The job directory is moved to the trash and removed in the background
+    await retention.delete_job(job_id)
+    print(f"🧹 Deleted job {job_id}")
     return {"message": "Job deleted successfully"}
 
 @app.delete("/jobs")
 async def clear_all_jobs():
     """Clear all jobs."""
-    # Clean up all job data directories
-    job_data_dir = "job_data"
-    if os.path.exists(job_data_dir):
-        try:
-            shutil.rmtree(job_data_dir)
-            print(f"🧹 Cleaned up all job directories: {job_data_dir}")
-        except Exception as e:
-            print(f"⚠️ Error cleaning up job directories {job_data_dir}: {e}")
-    
-    jobs.clear()
+    await retention.delete_all()
+    print("🧹 Deleted all jobs")
     return {"message": "All jobs cleared successfully"}
 
-@app.get("/download/{job_id}")
-async def download_video(job_id: str):
+@app.api_route("/download/{job_id}", methods=["GET", "HEAD"])
+async def download_video(job_id: str, request: Request):
     """Download the final video file for a completed job."""
-    if job_id not in jobs:
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
-    
     if job.status != "completed":
         raise HTTPException(status_code=400, detail="Job is not completed")
     
@@ -323,24 +666,21 @@ async def download_video(job_id: str):
     if not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video file not found on server")
     
+    job_store.touch(job_id)
+    
     # Get the filename for the download
     filename = os.path.basename(video_path)
     
-    return FileResponse(
-        path=video_path,
-        filename=filename,
-        media_type="video/mp4",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    return RangeFileResponse(request, video_path, media_type="video/mp4",
+                             filename=filename, disposition="attachment")
 
-@app.get("/preview/{job_id}")
-async def preview_video(job_id: str):
-    """Preview the final video file for a completed job (streaming)."""
-    if job_id not in jobs:
+@app.api_route("/preview/{job_id}", methods=["GET", "HEAD"])
+async def preview_video(job_id: str, request: Request):
+    """Preview the final video file for a completed job, with byte-range seeking."""
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
-    
     if job.status != "completed":
         raise HTTPException(status_code=400, detail="Job is not completed")
     
@@ -352,25 +692,53 @@ async def preview_video(job_id: str):
     if not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video file not found on server")
     
-    return FileResponse(
-        path=video_path,
-        media_type="video/mp4",
-        headers={"Accept-Ranges": "bytes"}
-    )
+    job_store.touch(job_id)
+    return RangeFileResponse(request, video_path, media_type="video/mp4")
 
 @app.post("/generate-cuts")
 async def generate_cuts(
     background_tasks: BackgroundTasks,
     request: GenerateCutsRequest
 ):
-    """Generate video cuts from narrative text using the interval generation and cutting scripts."""
+    """Generate video cuts from narrative text by selecting intervals and rendering them in-process."""
+    
+    if request.selection_mode not in SELECTION_MODES:
+        raise HTTPException(status_code=400, detail=f"selection_mode must be one of {', '.join(SELECTION_MODES)}")
     
     # Generate job ID
     job_id = str(uuid.uuid4())
-    jobs[job_id] = JobStatus(job_id)
+    
+    # An identical earlier request is answered from the render cache without queueing
+    cache_key = await run_in_threadpool(generate_cuts_key, request)
+    if cache_key and not request.refresh:
+        cached = await run_in_threadpool(blob_store.restore_cuts, cache_key, os.path.join("job_data", job_id))
+        if cached:
+            job_store.create(job_id, status="completed", message="Video cuts served from cache",
+                             priority=request.priority)
+            update_job(job_id, progress=100,
+                       result=cuts_result(job_id, request, cached["intervals_count"], cached["total_duration"],
+                                          cached=True))
+            finish_job(job_id)
+            if request.job_id:
+                job_store.touch(request.job_id)
+            print(f"♻️ Job {job_id}: reused cached cuts {cache_key[:12]}")
+            return {
+                "job_id": job_id,
+                "message": "Video cuts served from cache.",
+                "status_endpoint": f"/job/{job_id}",
+                "cached": True
+            }
+    
+    admit_job(job_id, cuts_slots.waiting)
+    job_store.create(job_id, status="queued", message="Queued for video cuts generation...",
+                     priority=request.priority)
+    cuts_slots.enqueue(job_id, request.priority)
+    if request.job_id:
+        cuts_sources[job_id] = request.job_id
+        job_store.touch(request.job_id)
     
     # Start background processing
-    background_tasks.add_task(generate_cuts_background, job_id, request)
+    background_tasks.add_task(generate_cuts_background, job_id, request, cache_key)
     
     return {
         "job_id": job_id,
@@ -378,39 +746,95 @@ async def generate_cuts(
         "status_endpoint": f"/job/{job_id}"
     }
 
-async def generate_cuts_background(job_id: str, request: GenerateCutsRequest):
-    """Background task to generate video cuts from narrative text."""
-    job = jobs[job_id]
-    
+def generate_cuts_key(request: GenerateCutsRequest) -> Optional[str]:
+    """Render cache key for a request, or None if its source job can't be used."""
+    video_hashes = None
+    if request.job_id:
+        source = job_store.get(request.job_id)
+        if source is None or source.status != "completed" or not source.result:
+            return None
+        processed_dir = source.result.get("processed_directory", "stream_processed_clip")
+        video_dir = source.result.get("videos_directory", "stream_videos")
+        video_hashes = {f["filename"]: f["sha256"] for f in source.result.get("uploaded_files", []) if "sha256" in f}
+    else:
+        processed_dir, video_dir = "stream_processed_clip", "stream_videos"
+    return cuts_key(request.narrative_text, request.duration, request.interval_duration,
+                    processed_dir, video_dir, video_hashes, request.selection_mode)
+
+def cuts_job_stopped(job_id: str) -> bool:
+    """Whether a generate-cuts job was cancelled or deleted and should not run further."""
+    job = job_store.get(job_id)
+    return job is None or job.status == "cancelled"
+
+def cuts_result(job_id: str, request: GenerateCutsRequest, intervals_count: int, total_duration: float,
+                cached: bool = False) -> dict:
+    """Result of a generate-cuts job whose files are in job_data/<job_id>."""
+    job_dir = os.path.join("job_data", job_id)
+    final_video = os.path.join(job_dir, "final_cut_video.mp4")
+    narrative_file = os.path.join(job_dir, "narrative.txt")
+    if not os.path.exists(narrative_file):
+        with open(narrative_file, 'w', encoding='utf-8') as f:
+            f.write(request.narrative_text)
+    return {
+        "final_video_path": final_video,
+        "final_video_size": os.path.getsize(final_video) if os.path.exists(final_video) else 0,
+        "intervals_count": intervals_count,
+        "total_duration": total_duration,
+        # Segments are not kept for cached renders
+        "output_directory": None if cached else os.path.join(job_dir, "output_segments"),
+        "intervals_file": os.path.join(job_dir, "intervals.json"),
+        "narrative_file": narrative_file,
+        "download_url": f"/download/{job_id}",
+        "preview_url": f"/preview/{job_id}",
+        "filename": os.path.basename(final_video),
+        "cached": cached
+    }
+
+async def generate_cuts_background(job_id: str, request: GenerateCutsRequest, cache_key: Optional[str] = None):
+    """Wait for a free cuts slot (higher priorities first), then generate the cuts."""
+    try:
+        await cuts_slots.acquire(job_id)
+        if cuts_job_stopped(job_id):
+            finish_job(job_id)
+            return
+        running_cuts[job_id] = threading.Event()
+        await run_generate_cuts(job_id, request, cache_key)
+    finally:
+        running_cuts.pop(job_id, None)
+        cuts_sources.pop(job_id, None)
+        cuts_slots.release(job_id)
+        admission.release(job_id)
+
+async def run_generate_cuts(job_id: str, request: GenerateCutsRequest, cache_key: Optional[str] = None):
+    """Generate video cuts from narrative text, caching the render under cache_key."""
     print(f"🎬 Starting video cuts generation for job {job_id}")
     print(f"📝 Narrative length: {len(request.narrative_text)} characters")
     print(f"⏱️ Target duration: {request.duration}s, Interval duration: {request.interval_duration}s")
     
     try:
-        # Create temporary directories
-        temp_dir = tempfile.mkdtemp(prefix="video_cuts_")
-        narrative_file = os.path.join(temp_dir, "narrative.txt")
-        intervals_file = os.path.join(temp_dir, "intervals.json")
-        output_dir = os.path.join(temp_dir, "output_segments")
-        final_video = os.path.join(temp_dir, "final_cut_video.mp4")
+        # Render into the job's own directory so retention removes it with the job
+        job_dir = os.path.join("job_data", job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        narrative_file = os.path.join(job_dir, "narrative.txt")
+        intervals_file = os.path.join(job_dir, "intervals.json")
+        output_dir = os.path.join(job_dir, "output_segments")
+        final_video = os.path.join(job_dir, "final_cut_video.mp4")
         
-        print(f"📂 Created temp directory: {temp_dir}")
+        print(f"📂 Created job directory: {job_dir}")
         
         # Step 1: Save narrative text to file
-        job.status = "preparing"
-        job.message = "Preparing narrative file..."
-        job.progress = 10
-        print(f"🔄 Job {job_id}: {job.message} (Progress: {job.progress}%)")
+        update_job(job_id, status="preparing", message="Preparing narrative file...", progress=10)
         
         with open(narrative_file, 'w', encoding='utf-8') as f:
             f.write(request.narrative_text)
         print(f"📝 Saved narrative to: {narrative_file}")
         
         # Step 2: Determine source directories
-        if request.job_id and request.job_id in jobs:
+        existing_job = job_store.get(request.job_id) if request.job_id else None
+        if existing_job:
             # Use existing job's processed files
-            existing_job = jobs[request.job_id]
             if existing_job.status == "completed" and existing_job.result:
+                job_store.touch(request.job_id)
                 # Use the actual directories from the existing job
                 stream_dir = existing_job.result.get("processed_directory", "stream_processed_clip")
                 video_dir = existing_job.result.get("videos_directory", "stream_videos")
@@ -445,84 +869,64 @@ async def generate_cuts_background(job_id: str, request: GenerateCutsRequest):
             print(f"📋 Video directory contents ({len(video_files)} files): {video_files[:5]}{'...' if len(video_files) > 5 else ''}")
         
         # Step 3: Generate intervals
-        job.status = "generating_intervals"
-        job.message = "Generating video intervals from narrative..."
-        job.progress = 30
-        print(f"🔄 Job {job_id}: {job.message} (Progress: {job.progress}%)")
+        update_job(job_id, status="generating_intervals", message="Generating video intervals from narrative...", progress=30)
         
-        intervals_success = await run_generate_intervals(
-            narrative_file, stream_dir, intervals_file, 
-            request.duration, request.interval_duration
-        )
+        with JOB_STAGE_SECONDS.time(stage="intervals"):
+            intervals_data = await run_generate_intervals(
+                job_id, request.narrative_text, stream_dir, request.duration, request.interval_duration,
+                request.selection_mode
+            )
         
-        if not intervals_success:
+        if not intervals_data or not intervals_data.get('intervals'):
             raise Exception("Failed to generate intervals")
         
-        # Check if intervals file was created
-        print(f"🔍 Checking if intervals file exists: {intervals_file}")
-        print(f"🔍 Intervals file exists: {os.path.exists(intervals_file)}")
-        if os.path.exists(intervals_file):
-            print(f"🔍 Intervals file size: {os.path.getsize(intervals_file)} bytes")
-            # Read a bit of the file to verify it's valid JSON
-            try:
-                with open(intervals_file, 'r', encoding='utf-8') as f:
-                    content = f.read(200)  # Read first 200 chars
-                    print(f"🔍 Intervals file preview: {content}...")
-            except Exception as e:
-                print(f"❌ Error reading intervals file: {e}")
-        else:
-            print(f"❌ Intervals file not found: {intervals_file}")
-            # List contents of the temp directory
-            temp_contents = os.listdir(temp_dir)
-            print(f"🔍 Temp directory contents: {temp_contents}")
+        # Kept with the job for the result and the render cache
+        with open(intervals_file, 'w', encoding='utf-8') as f:
+            json.dump(intervals_data, f, indent=2, ensure_ascii=False)
+        print(f"📝 Saved {len(intervals_data['intervals'])} intervals to: {intervals_file}")
         
         # Step 4: Cut video segments
-        job.status = "cutting_videos"
-        job.message = "Cutting video segments..."
-        job.progress = 60
-        print(f"🔄 Job {job_id}: {job.message} (Progress: {job.progress}%)")
+        if cuts_job_stopped(job_id):
+            raise Exception("Job cancelled")
+        update_job(job_id, status="cutting_videos", message="Cutting video segments...", progress=60)
         
-        cutting_success = await run_cut_video_segments(
-            intervals_file, video_dir, output_dir, final_video
-        )
+        with JOB_STAGE_SECONDS.time(stage="cut"):
+            render = await run_cut_video_segments(
+                job_id, intervals_data, video_dir, output_dir, final_video
+            )
         
-        if not cutting_success:
+        if not render:
             raise Exception("Failed to cut video segments")
         
-        # Step 5: Read the generated intervals for result
-        with open(intervals_file, 'r', encoding='utf-8') as f:
-            intervals_data = json.load(f)
-        
         # Step 6: Complete
-        job.status = "completed"
-        job.message = "Video cuts generation completed successfully!"
-        job.progress = 100
+        result = cuts_result(job_id, request, len(intervals_data.get('intervals', [])),
+                             intervals_data.get('metadata', {}).get('actual_total_duration', 0))
+        final_video_size = result["final_video_size"]
         
-        # Get file size of final video
-        final_video_size = os.path.getsize(final_video) if os.path.exists(final_video) else 0
+        if cache_key:
+            try:
+                await run_in_threadpool(blob_store.store_cuts, cache_key, job_dir, {
+                    "intervals_count": result["intervals_count"],
+                    "total_duration": result["total_duration"],
+                    "created_at": datetime.now().isoformat()
+                })
+            except OSError as e:
+                print(f"⚠️ Could not cache cuts for job {job_id}: {e}")
         
-        job.result = {
-            "final_video_path": final_video,
-            "final_video_size": final_video_size,
-            "intervals_count": len(intervals_data.get('intervals', [])),
-            "total_duration": intervals_data.get('metadata', {}).get('actual_total_duration', 0),
-            "output_directory": output_dir,
-            "intervals_file": intervals_file,
-            "narrative_file": narrative_file,
-            "download_url": f"/download/{job_id}",
-            "preview_url": f"/preview/{job_id}",
-            "filename": os.path.basename(final_video)
-        }
+        update_job(job_id, status="completed", message="Video cuts generation completed successfully!",
+                   progress=100, result=result)
         
         print(f"🎉 Job {job_id} completed successfully!")
         print(f"🎉 Final video: {final_video} ({final_video_size} bytes)")
         print(f"🎉 Intervals: {len(intervals_data.get('intervals', []))}")
         
     except Exception as e:
+        if cuts_job_stopped(job_id):
+            print(f"🚫 Job {job_id} cancelled or deleted")
+            return
         error_msg = str(e)
-        job.status = "error"
-        job.message = f"Error during video cuts generation: {error_msg}"
-        job.error = error_msg
+        update_job(job_id, status="error", message=f"Error during video cuts generation: {error_msg}",
+                   error=error_msg)
         print(f"❌ Job {job_id} failed: {error_msg}")
         print(f"❌ Full error: {e}")
         print(f"❌ Error type: {type(e).__name__}")
@@ -536,134 +940,74 @@ async def generate_cuts_background(job_id: str, request: GenerateCutsRequest):
         print(f"  - Narrative file size: {os.path.getsize(narrative_file) if 'narrative_file' in locals() and os.path.exists(narrative_file) else 'N/A'}")
         print(f"  - Stream dir exists: {os.path.exists(stream_dir) if 'stream_dir' in locals() else 'N/A'}")
         print(f"  - Video dir exists: {os.path.exists(video_dir) if 'video_dir' in locals() else 'N/A'}")
-        print(f"  - Current working directory: {os.getcwd()}")
-        print(f"  - Python executable: {sys.executable}")
-        print(f"  - Script paths:")
-        print(f"    - generate_narrative_intervals.py: {os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'generate_narrative_intervals.py')}")
-        print(f"    - cut_video_segments.py: {os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cut_video_segments.py')}")
     
     finally:
-        job.completed_at = datetime.now()
-        print(f"🏁 Job {job_id} finished at {job.completed_at} with status: {job.status}")
+        finish_job(job_id)
+
+def job_progress_callback(job_id: str, progress_start: int, progress_end: int, message: str):
+    """Progress callback mapping a fraction (0-1) onto the job's progress between progress_start and progress_end."""
+    last_progress = [progress_start]
+    
+    def report(fraction: float):
+        progress = progress_start + int((progress_end - progress_start) * fraction)
+        if progress != last_progress[0]:
+            last_progress[0] = progress
+            update_job(job_id, message=f"{message} ({int(fraction * 100)}%)", progress=progress)
+    
+    return report
 
-async def run_generate_intervals(narrative_file: str, stream_dir: str, output_file: str, 
-                               duration: int, interval_duration: int) -> bool:
-    """Run the generate_narrative_intervals.py script."""
+async def run_generate_intervals(job_id: str, narrative: str, stream_dir: str,
+                                 duration: int, interval_duration: int, selection_mode: str = "ai") -> Optional[dict]:
+    """Select intervals for the narrative in a worker thread. Returns the intervals document."""
+    cancel_event = running_cuts.get(job_id)
     try:
-        # Get the path to the script
-        script_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                  "generate_narrative_intervals.py")
-        
-        # Build the command
-        cmd = [
-            sys.executable, script_path,
-            narrative_file,
-            "--stream-dir", stream_dir,
-            "-o", output_file,
-            "--duration", str(duration),
-            "--interval-duration", str(interval_duration)
-        ]
-        
-        print(f"🔧 Running command: {' '.join(cmd)}")
-        print(f"🔧 Working directory: {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}")
-        
-        # Run the command
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        intervals_data = await asyncio.to_thread(
+            select_intervals, narrative, stream_dir, duration, interval_duration,
+            progress_callback=job_progress_callback(job_id, 30, 60, "Generating video intervals from narrative..."),
+            cancelled=cancel_event.is_set if cancel_event else None,
+            selection_mode=selection_mode,
+            # OpenAI requests are awaited here, on the server's pooled async client
+            event_loop=asyncio.get_running_loop()
         )
-        
-        print(f"🔧 Subprocess return code: {result.returncode}")
-        print(f"🔧 Subprocess stdout: {result.stdout}")
-        print(f"🔧 Subprocess stderr: {result.stderr}")
-        
-        if result.returncode == 0:
-            print(f"✅ Intervals generated successfully: {output_file}")
-            # Check if the file was actually created
-            if os.path.exists(output_file):
-                print(f"✅ Output file exists: {output_file}")
-                print(f"✅ Output file size: {os.path.getsize(output_file)} bytes")
-            else:
-                print(f"⚠️ Warning: Output file not found at expected location: {output_file}")
-                # Check if it was created with a different name
-                output_dir = os.path.dirname(output_file)
-                if os.path.exists(output_dir):
-                    files_in_dir = os.listdir(output_dir)
-                    json_files = [f for f in files_in_dir if f.endswith('.json')]
-                    print(f"🔍 JSON files in output directory: {json_files}")
-            return True
-        else:
-            print(f"❌ Failed to generate intervals")
-            print(f"❌ Return code: {result.returncode}")
-            print(f"❌ Error output: {result.stderr}")
-            print(f"❌ Standard output: {result.stdout}")
-            return False
-            
+        print(f"✅ Generated {len(intervals_data['intervals'])} intervals "
+              f"({intervals_data['metadata']['actual_total_duration']:.1f}s)")
+        return intervals_data
     except Exception as e:
-        print(f"❌ Exception running generate_intervals: {e}")
+        print(f"❌ Exception generating intervals: {e}")
         print(f"❌ Exception type: {type(e).__name__}")
         import traceback
         traceback.print_exc()
-        return False
+        return None
 
-async def run_cut_video_segments(intervals_file: str, video_dir: str, output_dir: str, 
-                                final_video: str) -> bool:
-    """Run the cut_video_segments.py script."""
+async def run_cut_video_segments(job_id: str, intervals_data: dict, video_dir: str, output_dir: str,
+                                 final_video: str) -> Optional[dict]:
+    """Render the intervals into final_video in a worker thread. Returns the render result."""
+    cancel_event = running_cuts.get(job_id)
     try:
-        # Get the path to the script
-        script_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                  "cut_video_segments.py")
-        
-        # Debug: Check if intervals file exists
-        print(f"🔍 Cut video segments - checking intervals file: {intervals_file}")
-        print(f"🔍 Intervals file exists: {os.path.exists(intervals_file)}")
-        print(f"🔍 Intervals file absolute path: {os.path.abspath(intervals_file)}")
-        
-        # Build the command
-        cmd = [
-            sys.executable, script_path,
-            os.path.abspath(intervals_file),  # Use absolute path
-            "-v", video_dir,
-            "-o", output_dir,
-            "-f", final_video
-        ]
-        
-        print(f"🔧 Running command: {' '.join(cmd)}")
-        print(f"🔧 Working directory: {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}")
-        print(f"🔧 Intervals file absolute path: {os.path.abspath(intervals_file)}")
-        
-        # Run the command with the same working directory as generate_intervals
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        render = await asyncio.to_thread(
+            render_cuts, intervals_data, video_dir, output_dir, final_video,
+            progress_callback=job_progress_callback(job_id, 60, 99, "Cutting video segments..."),
+            cancelled=cancel_event.is_set if cancel_event else None
         )
-        
-        print(f"🔧 Subprocess return code: {result.returncode}")
-        print(f"🔧 Subprocess stdout: {result.stdout}")
-        print(f"🔧 Subprocess stderr: {result.stderr}")
-        
-        if result.returncode == 0:
+        if render:
             print(f"✅ Video segments cut successfully: {final_video}")
-            return True
         else:
             print(f"❌ Failed to cut video segments")
-            print(f"❌ Return code: {result.returncode}")
-            print(f"❌ Error output: {result.stderr}")
-            print(f"❌ Standard output: {result.stdout}")
-            return False
-            
+        return render
     except Exception as e:
-        print(f"❌ Exception running cut_video_segments: {e}")
+        print(f"❌ Exception cutting video segments: {e}")
         print(f"❌ Exception type: {type(e).__name__}")
         import traceback
         traceback.print_exc()
-        return False
+        return None
 
 if __name__ == "__main__":
     import uvicorn
     print("Starting API server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    if API_WORKERS > 1:
+        interrupt_unfinished_jobs()
+        # Multiple workers need an import string; job state is shared through the job store
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=API_WORKERS,
+                    app_dir=os.path.dirname(os.path.abspath(__file__)))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,254 @@
+"""
+File responses with HTTP range and conditional GET support.
+
+Serves byte ranges (206, including multipart/byteranges for several ranges),
+validates If-None-Match / If-Modified-Since / If-Range against a size+mtime
+ETag, and answers 304 when the client copy is current.
+
+File bodies are handed to the server when it offers an ASGI file extension:
+whole files with http.response.pathsend, ranges with http.response.zerocopy
+(sendfile). uvicorn offers neither, so under uvicorn every body is read in
+CHUNK_SIZE chunks with pread in the thread pool and sent as ordinary body
+messages; that is the normal path, and benchmarks/bench_media_response.py
+measures it. Servers such as Granian advertise pathsend.
+"""
+
+import os
+import stat
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from metrics import BYTES_SERVED
+
+# Bytes read per chunk when the server offers no file extension (always, under uvicorn)
+CHUNK_SIZE = 1024 * 1024
+
+# Browsers probing a video ask for "bytes=0-"; more ranges than this in one request is abuse
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(value: str, size: int) -> List[Tuple[int, int]]:
+    """Parse a Range header into inclusive (start, end) pairs.
+
+    Returns an empty list when the header should be ignored (malformed or not
+    in bytes), and raises RangeNotSatisfiable when no range overlaps the file.
+    """
+    units, _, spec = value.partition("=")
+    if units.strip().lower() != "bytes" or not spec:
+        return []
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start_text, sep, end_text = part.partition("-")
+        if not sep:
+            return []
+        try:
+            if start_text:
+                start = int(start_text)
+                end = int(end_text) if end_text else size - 1
+            else:
+                # Suffix range: the last N bytes
+                suffix = int(end_text)
+                if suffix == 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return []
+        if start >= size:
+            continue
+        if start < 0 or end < start:
+            return []
+        ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+    if len(ranges) > MAX_RANGES:
+        return []
+
+    # Coalesce overlapping or adjacent ranges so the same bytes are not sent twice
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class RangeFileResponse(Response):
+    """File response with Range, ETag and Last-Modified handling."""
+
+    def __init__(self, request: Request, path: str, media_type: str, filename: Optional[str] = None,
+                 disposition: str = "inline", max_age: int = 0):
+        # Headers depend on the file and the request, so they are built when the response is sent
+        self.background = None
+        self.request_headers = Headers(scope=request.scope)
+        # First path segment (e.g. "preview" or "download"), used as the metrics label
+        self.endpoint = request.url.path.strip("/").split("/")[0]
+        self.method = request.method
+        self.path = path
+        self.media_type = media_type
+        self.filename = filename
+        self.disposition = disposition
+        self.max_age = max_age
+
+    def _validators(self, st: os.stat_result) -> Tuple[str, str]:
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        return etag, formatdate(st.st_mtime, usegmt=True)
+
+    def _not_modified(self, etag: str, st: os.stat_result) -> bool:
+        if_none_match = self.request_headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        if_modified_since = self.request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(st.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _range_applies(self, etag: str, last_modified: str) -> bool:
+        """If-Range: only honour Range when the client's validator still matches."""
+        if_range = self.request_headers.get("if-range")
+        if if_range is None:
+            return True
+        return if_range.strip() in (etag, last_modified)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await self._respond(scope, send)
+        if self.background is not None:
+            await self.background()
+
+    async def _respond(self, scope: Scope, send: Send):
+        try:
+            st = await run_in_threadpool(os.stat, self.path)
+        except FileNotFoundError:
+            await self._send_head(send, 404, {"content-type": "text/plain"}, b"File not found")
+            return
+        if not stat.S_ISREG(st.st_mode):
+            await self._send_head(send, 404, {"content-type": "text/plain"}, b"File not found")
+            return
+
+        size = st.st_size
+        etag, last_modified = self._validators(st)
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": last_modified,
+            "cache-control": f"private, max-age={self.max_age}",
+        }
+        if self.filename:
+            headers["content-disposition"] = f'{self.disposition}; filename="{self.filename}"'
+
+        if self._not_modified(etag, st):
+            await self._send_head(send, 304, headers)
+            return
+
+        ranges = []
+        range_header = self.request_headers.get("range")
+        if range_header and self._range_applies(etag, last_modified):
+            try:
+                ranges = parse_range_header(range_header, size)
+            except RangeNotSatisfiable:
+                headers["content-range"] = f"bytes */{size}"
+                await self._send_head(send, 416, headers)
+                return
+
+        send_body = self.method != "HEAD"
+        if not ranges:
+            headers["content-type"] = self.media_type
+            headers["content-length"] = str(size)
+            await self._start(send, 200, headers)
+            await self._send_file(scope, send, [(0, size - 1, b"")] if send_body and size else [], b"",
+                                  whole_file=True)
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            headers["content-type"] = self.media_type
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            headers["content-length"] = str(end - start + 1)
+            await self._start(send, 206, headers)
+            await self._send_file(scope, send, [(start, end, b"")] if send_body else [], b"")
+        else:
+            boundary = uuid.uuid4().hex
+            parts = [
+                (start, end, (f"--{boundary}\r\nContent-Type: {self.media_type}\r\n"
+                              f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode())
+                for start, end in ranges
+            ]
+            trailer = f"\r\n--{boundary}--\r\n".encode()
+            # Each part after the first is preceded by the CRLF ending the previous part
+            length = sum(len(prefix) + end - start + 1 for start, end, prefix in parts) \
+                + 2 * (len(parts) - 1) + len(trailer)
+            parts = [(start, end, (b"\r\n" if i else b"") + prefix) for i, (start, end, prefix) in enumerate(parts)]
+            headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+            headers["content-length"] = str(length)
+            await self._start(send, 206, headers)
+            await self._send_file(scope, send, parts if send_body else [], trailer if send_body else b"")
+
+    async def _start(self, send: Send, status: int, headers: dict):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+        })
+
+    async def _send_head(self, send: Send, status: int, headers: dict, body: bytes = b""):
+        if body:
+            headers = {**headers, "content-length": str(len(body))}
+        await self._start(send, status, headers)
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_file(self, scope: Scope, send: Send, parts: List[Tuple[int, int, bytes]], trailer: bytes,
+                         whole_file: bool = False):
+        """Send (start, end, prefix) slices of the file, then the trailer."""
+        if not parts:
+            await send({"type": "http.response.body", "body": trailer})
+            return
+
+        extensions = scope.get("extensions", {})
+        if whole_file and "http.response.pathsend" in extensions:
+            # The server sends the file itself, with sendfile where it can
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+            BYTES_SERVED.inc(parts[0][1] + 1, endpoint=self.endpoint)
+            return
+
+        zerocopy = "http.response.zerocopy" in extensions
+        fd = await run_in_threadpool(os.open, self.path, os.O_RDONLY)
+        try:
+            for start, end, prefix in parts:
+                if prefix:
+                    await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                if zerocopy:
+                    await send({"type": "http.response.zerocopy", "file": fd, "offset": start,
+                                "count": end - start + 1, "more_body": True})
+                    BYTES_SERVED.inc(end - start + 1, endpoint=self.endpoint)
+                    continue
+                offset = start
+                while offset <= end:
+                    chunk = await run_in_threadpool(os.pread, fd, min(CHUNK_SIZE, end - offset + 1), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                    BYTES_SERVED.inc(len(chunk), endpoint=self.endpoint)
+            await send({"type": "http.response.body", "body": trailer})
+        finally:
+            os.close(fd)
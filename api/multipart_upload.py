@@ -0,0 +1,174 @@
+"""
+Streaming multipart/form-data parsing for video uploads.
+
+Starlette's form parser spools every file part to a temporary file before the
+route runs, so the route then copies it a second time. receive_multipart()
+instead writes each file part straight to a path chosen by the caller (a temp
+file in the blob store), hashing it on the way, so an upload is written to
+disk exactly once.
+"""
+
+import hashlib
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+# Largest non-file form field accepted, in bytes
+MAX_FIELD_SIZE = 64 * 1024
+
+
+class MultipartError(ValueError):
+    pass
+
+
+@dataclass
+class ReceivedFile:
+    field_name: str
+    filename: str
+    path: str
+    size: int = 0
+    sha256: str = ""
+
+
+@dataclass
+class ReceivedForm:
+    files: List[ReceivedFile] = field(default_factory=list)
+    fields: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class _Part:
+    headers: Dict[bytes, bytes] = field(default_factory=dict)
+    name: str = ""
+    file: Optional[ReceivedFile] = None
+    digest: Any = None
+    fd: Optional[int] = None
+    value: bytearray = field(default_factory=bytearray)
+
+
+async def receive_multipart(request: Request, open_file: Callable[[str], str],
+                            check_filename: Callable[[str], None] = lambda filename: None) -> ReceivedForm:
+    """Parse a multipart request body, streaming file parts to disk.
+
+    open_file(filename) returns the path to write a file part to, and
+    check_filename(filename) may raise to reject a part before any of it is
+    stored. Raises MultipartError for malformed bodies. If anything fails, the
+    files written so far are removed.
+    """
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise MultipartError("Missing boundary in multipart body")
+
+    form = ReceivedForm()
+    parts: List[_Part] = []
+    # Work collected by the parser callbacks for the current request chunk
+    pending_data: List[tuple] = []
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_part_begin():
+        parts.append(_Part())
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        parts[-1].headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        part = parts[-1]
+        _, options = parse_options_header(part.headers.get(b"content-disposition", b""))
+        part.name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" in options:
+            filename = os.path.basename(options[b"filename"].decode("utf-8", "replace"))
+            check_filename(filename)
+            part.file = ReceivedFile(part.name, filename, "")
+            pending_data.append((part, None))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        part = parts[-1]
+        if part.file is None:
+            if len(part.value) + end - start > MAX_FIELD_SIZE:
+                raise MultipartError(f"Form field {part.name!r} is too large")
+            part.value.extend(data[start:end])
+        else:
+            pending_data.append((part, data[start:end]))
+
+    def on_part_end():
+        part = parts[-1]
+        if part.file is None:
+            form.fields[part.name] = part.value.decode("utf-8", "replace")
+        else:
+            pending_data.append((part, b""))
+
+    def open_part(part: _Part):
+        part.file.path = open_file(part.file.filename)
+        part.fd = os.open(part.file.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        part.digest = hashlib.sha256()
+        form.files.append(part.file)
+
+    def write_pending(work: List[tuple]):
+        for part, data in work:
+            if data is None:
+                open_part(part)
+            elif data:
+                part.digest.update(data)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(part.fd, view):]
+                part.file.size += len(data)
+            else:
+                os.close(part.fd)
+                part.fd = None
+                part.file.sha256 = part.digest.hexdigest()
+
+    parser = multipart.MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except multipart.exceptions.FormParserError as e:
+                raise MultipartError("Invalid multipart body") from e
+            if pending_data:
+                # File writes happen off the event loop, one batch per request chunk
+                work = pending_data[:]
+                pending_data.clear()
+                await run_in_threadpool(write_pending, work)
+        parser.finalize()
+        if pending_data:
+            await run_in_threadpool(write_pending, pending_data[:])
+        if any(part.file is not None and not part.file.sha256 for part in parts):
+            raise MultipartError("Multipart body ended in the middle of a file")
+    except BaseException:
+        for part in parts:
+            if part.fd is not None:
+                os.close(part.fd)
+        for received in form.files:
+            if received.path and os.path.exists(received.path):
+                os.remove(received.path)
+        raise
+    return form
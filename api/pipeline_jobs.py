@@ -0,0 +1,245 @@
+"""
+Pipeline jobs executed inside JobExecutor worker processes.
+
+Each job function takes a JobReporter as its first argument and publishes its
+progress through it. Models are loaded once per worker process and reused
+across jobs.
+"""
+
+import os
+import sys
+import time
+import threading
+import traceback
+from pathlib import Path
+from typing import List
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Add parent directory to path to import video_processor and nlpv2
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyframe_index import KeyframeIndex
+from metrics import JOB_STAGE_SECONDS
+from blob_store import BlobStore, params_key
+from nlpv2.main import read_folder_raw, generate_narrative, save_narrative
+
+# Keyframes packed into each Vision request during video processing
+DESCRIBE_BATCH_SIZE = int(os.getenv("DESCRIBE_BATCH_SIZE", "4"))
+
+# Optional per-video budgets for Vision description calls (unset means describe every keyframe)
+MAX_DESCRIBE_CALLS = int(os.environ["MAX_DESCRIBE_CALLS"]) if os.getenv("MAX_DESCRIBE_CALLS") else None
+DESCRIBE_TIME_BUDGET = float(os.environ["DESCRIBE_TIME_BUDGET"]) if os.getenv("DESCRIBE_TIME_BUDGET") else None
+
+# Cross-job index of CLIP frame embeddings, searchable by text
+KEYFRAME_INDEX_DIR = os.getenv("KEYFRAME_INDEX_DIR", "keyframe_index")
+
+# Content-addressed upload blobs and cached per-video processing results
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "blob_store")
+
+# Bump when a change to video processing should invalidate cached results
+PROCESSING_VERSION = 1
+
+# Seconds between cancellation checks while a job runs
+CANCEL_POLL_INTERVAL = 0.5
+
+# Per-process VideoProcessor, so Whisper and CLIP load once per worker
+_processor = None
+
+
+def get_processor():
+    """Return this worker's VideoProcessor, loading models on first use."""
+    global _processor
+    if _processor is None:
+        from video_processor import VideoProcessor
+        print(f"🎬 Initializing VideoProcessor in worker {os.getpid()}...")
+        _processor = VideoProcessor(keyframe_index=KeyframeIndex(KEYFRAME_INDEX_DIR))
+    return _processor
+
+
+def processing_params(processor) -> dict:
+    """Everything that influences a processed output file, used as its cache key."""
+    return {
+        "version": PROCESSING_VERSION,
+        "ingest_mode": processor.ingest_mode,
+        "max_frame_size": processor.max_frame_size,
+        "describe_batch_size": DESCRIBE_BATCH_SIZE,
+        "max_describe_calls": MAX_DESCRIBE_CALLS,
+        "describe_time_budget": DESCRIBE_TIME_BUDGET,
+    }
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def watch_for_cancel(reporter, processor) -> threading.Event:
+    """Cancel the processor when the job is cancelled. Set the returned event to stop watching."""
+    stop = threading.Event()
+
+    def watch():
+        while not stop.wait(CANCEL_POLL_INTERVAL):
+            if reporter.cancelled():
+                print(f"🚫 Cancelling job {reporter.job_id} in worker {os.getpid()}")
+                processor.cancel()
+                return
+
+    threading.Thread(target=watch, daemon=True).start()
+    return stop
+
+
+def process_videos_job(reporter, uploaded_files: List[dict]):
+    """Process uploaded videos and generate a narrative from the results."""
+    job_id = reporter.job_id
+
+    print(f"🚀 Starting background processing for job {job_id} in worker {os.getpid()}")
+    print(f"📁 Processing {len(uploaded_files)} files: {[f['filename'] for f in uploaded_files]}")
+
+    try:
+        # Create persistent directories for this job
+        job_dir = os.path.join("job_data", job_id)
+        videos_dir = os.path.join(job_dir, "videos")
+        processed_dir = os.path.join(job_dir, "processed")
+
+        os.makedirs(videos_dir, exist_ok=True)
+        os.makedirs(processed_dir, exist_ok=True)
+
+        print(f"📂 Created job directories: {job_dir}")
+
+        # Uploads were already streamed to disk by the request handler
+        video_files = [f['path'] for f in uploaded_files]
+
+        reporter.update(status="processing", message="Processing videos with AI...", progress=30)
+
+        # Process videos using video_processor
+        processor = get_processor()
+        processor.reset_cancel()
+        stop_watching = watch_for_cancel(reporter, processor)
+        blob_store = BlobStore(BLOB_STORE_DIR)
+        result_key = params_key(processing_params(processor))
+        stage_reports = {}
+
+        process_started = time.perf_counter()
+        for i, video_path in enumerate(video_files):
+            if reporter.cancelled():
+                raise JobCancelled()
+            reporter.update(
+                message=f"Processing video {i+1}/{len(video_files)}: {os.path.basename(video_path)}",
+                progress=30 + (i + 1) * 40 // len(video_files)
+            )
+
+            output_file = os.path.join(processed_dir, f"{Path(video_path).stem}_processed.txt")
+            sha256 = uploaded_files[i]['sha256']
+
+            # Reuse the output of an earlier job that processed the same video with the same settings,
+            # copying its frame embeddings so this job is searchable on its own. Without them (the
+            # earlier job was deleted, or predates content hashes) the video is processed again.
+            if (blob_store.restore_result(sha256, result_key, output_file)
+                    and processor.keyframe_index.copy_video(sha256, job_id, os.path.basename(video_path))):
+                uploaded_files[i]['result_reused'] = True
+                stage_reports[os.path.basename(video_path)] = {
+                    **(blob_store.load_result_stats(sha256, result_key) or {}), "cached": True
+                }
+                print(f"♻️ Reused processed result for {os.path.basename(video_path)} (sha256 {sha256[:12]})")
+                continue
+
+            print(f"🎥 Processing video: {video_path} -> {output_file}")
+
+            try:
+                report = processor.process_video(
+                    video_path, output_file, describe_batch_size=DESCRIBE_BATCH_SIZE,
+                    max_describe_calls=MAX_DESCRIBE_CALLS, describe_time_budget=DESCRIBE_TIME_BUDGET,
+                    index_job_id=job_id, index_content_hash=sha256
+                )
+                stage_reports[os.path.basename(video_path)] = report
+                blob_store.store_result(sha256, result_key, output_file, report)
+                uploaded_files[i]['result_reused'] = False
+                print(f"✅ Successfully processed: {os.path.basename(video_path)}")
+            except Exception as e:
+                print(f"❌ Error processing video {video_path}: {e}")
+                raise e
+
+        JOB_STAGE_SECONDS.observe(time.perf_counter() - process_started, stage="process")
+
+        # Check what files were created
+        txt_files = [f for f in os.listdir(processed_dir) if f.endswith('.txt')]
+        print(f"📋 Found {len(txt_files)} txt files:")
+        for txt_file in txt_files:
+            file_path = os.path.join(processed_dir, txt_file)
+            file_size = os.path.getsize(file_path)
+            print(f"  - {txt_file} ({file_size} bytes)")
+
+        reporter.update(status="generating_narrative", message="Generating narrative from processed content...",
+                        progress=80)
+
+        # Generate narrative using nlpv2
+        print(f"📖 Reading processed content from: {processed_dir}")
+        try:
+            content = read_folder_raw(processed_dir)
+            print(f"📄 Read content length: {len(content) if content else 0} characters")
+
+            if reporter.cancelled():
+                raise JobCancelled()
+            if content:
+                print(f"🤖 Generating narrative with AI...")
+                with JOB_STAGE_SECONDS.time(stage="narrative"):
+                    narrative = generate_narrative(content)
+                print(f"📝 Generated narrative length: {len(narrative)} characters")
+
+                # Save narrative
+                print(f"💾 Saving narrative to api_outputs...")
+                output_file = save_narrative(narrative, "api_outputs")
+                print(f"💾 Narrative saved to: {output_file}")
+
+                reporter.update(
+                    status="completed",
+                    message="Processing completed successfully!",
+                    progress=100,
+                    result={
+                        "narrative": narrative,
+                        "output_file": output_file,
+                        "processed_files": len(txt_files),
+                        "job_directory": job_dir,
+                        "videos_directory": videos_dir,
+                        "processed_directory": processed_dir,
+                        "uploaded_files": [
+                            {"filename": f['filename'], "size": f['size'], "sha256": f['sha256'],
+                             "upload_reused": f.get('upload_reused', False),
+                             "result_reused": f.get('result_reused', False)}
+                            for f in uploaded_files
+                        ],
+                        "dedup": {
+                            "uploads_reused": sum(1 for f in uploaded_files if f.get('upload_reused')),
+                            "results_reused": sum(1 for f in uploaded_files if f.get('result_reused'))
+                        },
+                        "stage_reports": stage_reports
+                    }
+                )
+                print(f"🎉 Job {job_id} completed successfully!")
+                print(f"🎉 Result: narrative={len(narrative)} chars, output_file={output_file}, processed_files={len(txt_files)}")
+                print(f"🎉 Job data saved to: {job_dir}")
+            else:
+                error_msg = "No content found in processed files"
+                print(f"❌ {error_msg}")
+                raise Exception(error_msg)
+        except Exception as e:
+            print(f"❌ Error in narrative generation: {e}")
+            raise e
+
+    except Exception as e:
+        if reporter.cancelled():
+            # Stages interrupted by the cancellation fail in all sorts of ways; none is an error
+            print(f"🚫 Job {job_id} cancelled ({type(e).__name__})")
+            return
+        error_msg = str(e)
+        reporter.update(status="error", message=f"Error during processing: {error_msg}", error=error_msg)
+        print(f"❌ Job {job_id} failed: {error_msg}")
+        print(f"❌ Full error: {e}")
+        traceback.print_exc()
+
+    finally:
+        if 'stop_watching' in locals():
+            stop_watching.set()
+        print(f"🏁 Job {job_id} finished in worker {os.getpid()}")
+        # Note: We no longer clean up the job directory to preserve files for generate-cuts
@@ -0,0 +1,261 @@
+"""
+Retention of job data on disk.
+
+Finished jobs expire after a TTL, and when the disk holding job_data passes a
+high watermark (opt-in) the least recently used finished jobs are evicted
+until usage drops below a low watermark. Jobs used recently or by a running
+job are never evicted. Deleting a job renames its directory into a
+trash directory, which is instant; the trash is emptied by a background task
+off the event loop. Sweeps also remove abandoned upload sessions, blobs no
+job links to any more, orphaned job directories and render directories left
+in the system temp dir by older versions, and compact the keyframe index.
+"""
+
+import os
+import stat
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Set
+
+from blob_store import BlobStore
+from job_store import JobStore
+from upload_sessions import UploadSessionStore
+
+# Job directories without a job record are left alone for this long (uploads in progress)
+ORPHAN_GRACE_SECONDS = 3600
+
+# Prefix of the render directories generate-cuts used to create with tempfile.mkdtemp; only ones owned
+# by this user and older than the job TTL (at least ORPHAN_GRACE_SECONDS) are removed
+LEGACY_RENDER_PREFIX = "video_cuts_"
+
+# Jobs evicted per job store query while over the watermark
+EVICTION_BATCH = 10
+
+# Finished jobs completed or used more recently than this are never evicted
+MIN_EVICTION_AGE_SECONDS = 3600
+
+# Lists the job directories that existed before retention first ran, which orphan removal keeps
+PRESERVED_FILE = ".preserved.json"
+
+
+class RetentionManager:
+    """Deletes expired and least recently used jobs and empties the trash in the background.
+
+    job_ttl and upload_session_ttl are in seconds; 0 disables them. Watermarks
+    are fractions of the whole disk holding data_dir, other data included; a
+    high watermark of 0 disables eviction. in_use returns the IDs of jobs that
+    running work depends on (such as the source job of a generate-cuts run),
+    which are neither expired nor evicted.
+    """
+
+    def __init__(self, job_store: JobStore, keyframe_index, data_dir: str = "job_data",
+                 blob_store: Optional[BlobStore] = None, upload_sessions: Optional[UploadSessionStore] = None,
+                 job_ttl: float = 0, upload_session_ttl: float = 0,
+                 high_watermark: float = 0.9, low_watermark: float = 0.8, interval: float = 300.0,
+                 on_upload_expired: Optional[Callable[[str], None]] = None,
+                 in_use: Optional[Callable[[], Set[str]]] = None,
+                 min_eviction_age: float = MIN_EVICTION_AGE_SECONDS):
+        self.job_store = job_store
+        self.keyframe_index = keyframe_index
+        self.data_dir = data_dir
+        self.blob_store = blob_store
+        self.upload_sessions = upload_sessions
+        self.job_ttl = job_ttl
+        self.upload_session_ttl = upload_session_ttl
+        self.high_watermark = high_watermark
+        self.low_watermark = min(low_watermark, high_watermark)
+        self.interval = interval
+        # Called with the ID of every upload session removed for inactivity
+        self.on_upload_expired = on_upload_expired
+        self.in_use = in_use or set
+        self.min_eviction_age = min_eviction_age
+        self.trash_dir = os.path.join(data_dir, ".trash")
+        os.makedirs(self.trash_dir, exist_ok=True)
+        self.preserved = self._load_preserved()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _load_preserved(self) -> Set[str]:
+        """Directories in data_dir before retention first ran (e.g. sample jobs shipped with the repo)."""
+        path = os.path.join(self.data_dir, PRESERVED_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return set(json.load(f))
+        except FileNotFoundError:
+            pass
+        preserved = sorted(name for name in os.listdir(self.data_dir)
+                           if not name.startswith(".") and os.path.isdir(os.path.join(self.data_dir, name)))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(preserved, f)
+        if preserved:
+            print(f"🧹 Retention: keeping {len(preserved)} existing job directories without job records")
+        return set(preserved)
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.data_dir, job_id)
+
+    def discard(self, path: str) -> bool:
+        """Move a directory into the trash to be removed in the background."""
+        try:
+            os.rename(path, os.path.join(self.trash_dir, f"{os.path.basename(path)}-{uuid.uuid4().hex}"))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _forget(self, job_id: str):
+        self.keyframe_index.remove_job(job_id)
+        self.job_store.delete(job_id)
+
+    def empty_trash(self):
+        for name in os.listdir(self.trash_dir):
+            # Other API workers may be emptying the same trash
+            shutil.rmtree(os.path.join(self.trash_dir, name), ignore_errors=True)
+
+    async def delete_job(self, job_id: str):
+        """Delete a job's record, search entries and data without blocking the event loop."""
+        await asyncio.to_thread(self.discard, self.job_dir(job_id))
+        await asyncio.to_thread(self._forget, job_id)
+        self._wake.set()
+
+    async def delete_all(self):
+        """Delete every job."""
+        def discard_all():
+            for name in os.listdir(self.data_dir):
+                if not name.startswith("."):
+                    self.discard(os.path.join(self.data_dir, name))
+            self.keyframe_index.clear()
+            self.job_store.clear()
+        await asyncio.to_thread(discard_all)
+        self._wake.set()
+
+    def disk_usage(self) -> float:
+        usage = shutil.disk_usage(self.data_dir)
+        return usage.used / usage.total
+
+    def _expire_jobs(self) -> int:
+        if not self.job_ttl:
+            return 0
+        cutoff = datetime.now() - timedelta(seconds=self.job_ttl)
+        expired = 0
+        while True:
+            job_ids = self.job_store.finished_before(cutoff, exclude=self.in_use())
+            for job_id in job_ids:
+                self.discard(self.job_dir(job_id))
+                self._forget(job_id)
+            expired += len(job_ids)
+            if not job_ids:
+                return expired
+
+    def _evict_jobs(self) -> int:
+        """Evict least recently used finished jobs while the disk is above the watermark."""
+        if not self.high_watermark or self.disk_usage() < self.high_watermark:
+            return 0
+        evicted = 0
+        cutoff = datetime.now() - timedelta(seconds=self.min_eviction_age)
+        while self.disk_usage() >= self.low_watermark:
+            job_ids = self.job_store.least_recently_used(EVICTION_BATCH, before=cutoff, exclude=self.in_use())
+            if not job_ids:
+                break
+            for job_id in job_ids:
+                # Space is needed now, so remove the data here rather than via the trash
+                shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+                self._forget(job_id)
+                evicted += 1
+                if self.disk_usage() < self.low_watermark:
+                    break
+        if self.blob_store is not None and self.disk_usage() >= self.low_watermark:
+            # Unlinked blobs only speed up re-uploads; drop them all under pressure
+            self.blob_store.prune(0)
+        return evicted
+
+    def _remove_orphans(self) -> int:
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        removed = 0
+        for name in os.listdir(self.data_dir):
+            path = os.path.join(self.data_dir, name)
+            if name.startswith(".") or name in self.preserved or not os.path.isdir(path):
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff and not self.job_store.exists(name):
+                    removed += self.discard(path)
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def _remove_legacy_render_dirs(self) -> int:
+        # Only directories this server's user created, and only once they are older than the job TTL:
+        # other users and programs may use the same prefix in a shared temp directory
+        temp_root = tempfile.gettempdir()
+        cutoff = time.time() - max(self.job_ttl, ORPHAN_GRACE_SECONDS)
+        uid = os.getuid()
+        removed = 0
+        for name in os.listdir(temp_root):
+            if not name.startswith(LEGACY_RENDER_PREFIX):
+                continue
+            path = os.path.join(temp_root, name)
+            try:
+                st = os.lstat(path)
+            except FileNotFoundError:
+                continue
+            if stat.S_ISDIR(st.st_mode) and st.st_uid == uid and st.st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def sweep(self):
+        """Apply every retention rule once."""
+        expired = self._expire_jobs()
+        evicted = self._evict_jobs()
+        orphans = self._remove_orphans()
+        legacy = self._remove_legacy_render_dirs()
+        sessions = 0
+        if self.upload_sessions is not None and self.upload_session_ttl:
+            for upload_id in self.upload_sessions.stale(self.upload_session_ttl):
+                self.upload_sessions.delete(upload_id)
+                if self.on_upload_expired:
+                    self.on_upload_expired(upload_id)
+                sessions += 1
+        freed = 0
+        if self.blob_store is not None and self.job_ttl:
+            freed = self.blob_store.prune(self.job_ttl)
+        # Drop the vectors of removed jobs from the search index once enough have piled up
+        compacted = self.keyframe_index.compact()
+        self.empty_trash()
+        if expired or evicted or orphans or legacy or sessions or freed or compacted:
+            print(f"🧹 Retention: {expired} expired, {evicted} evicted, {orphans} orphaned jobs, "
+                  f"{legacy} render dirs, {sessions} upload sessions, {freed} blob bytes, "
+                  f"{compacted} index vectors")
+
+    async def run(self):
+        """Sweep every interval and empty the trash whenever a job is deleted."""
+        next_sweep = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + self.interval
+                    await asyncio.to_thread(self.sweep)
+                else:
+                    await asyncio.to_thread(self.empty_trash)
+            except Exception as e:
+                print(f"⚠️ Retention sweep failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.0, next_sweep - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,135 @@
+"""
+Unit tests for the SQLite job store. Runs without a server: python -m pytest api/test_job_store.py
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def create_jobs(store, count, **kwargs):
+    base = datetime(2024, 1, 1)
+    job_ids = []
+    for i in range(count):
+        job_id = f"job-{i:02d}"
+        store.create(job_id, **kwargs)
+        # Distinct, increasing creation times
+        store._conn().execute("UPDATE jobs SET created_at = ? WHERE job_id = ?",
+                              ((base + timedelta(minutes=i)).isoformat(), job_id))
+        job_ids.append(job_id)
+    return job_ids
+
+
+def test_pagination_walks_every_job_newest_first(store):
+    job_ids = create_jobs(store, 7)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, cursor = store.list(limit=3, cursor=cursor)
+        seen.extend(job.job_id for job in page)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert seen == job_ids[::-1]
+    assert pages == 3
+
+
+def test_pagination_with_equal_timestamps(store):
+    job_ids = create_jobs(store, 5)
+    store._conn().execute("UPDATE jobs SET created_at = ?", (datetime(2024, 1, 1).isoformat(),))
+
+    first, cursor = store.list(limit=2)
+    second, cursor = store.list(limit=2, cursor=cursor)
+    third, cursor = store.list(limit=2, cursor=cursor)
+
+    assert [j.job_id for j in first + second + third] == sorted(job_ids, reverse=True)
+    assert cursor is None
+
+
+def test_status_filter_and_exact_last_page(store):
+    create_jobs(store, 4)
+    store.update("job-01", status="completed")
+    store.update("job-03", status="completed")
+
+    page, cursor = store.list(limit=2, status="completed")
+
+    assert [j.job_id for j in page] == ["job-03", "job-01"]
+    assert cursor is None
+
+
+def test_invalid_cursor(store):
+    with pytest.raises(ValueError):
+        store.list(cursor="not a cursor")
+
+
+def test_cancel_guards(store):
+    store.create("queued", status="queued")
+    store.create("done", status="completed")
+
+    assert store.cancel("queued")
+    assert not store.cancel("queued")
+    assert not store.cancel("done")
+    assert not store.cancel("missing")
+
+    # Late updates from a torn-down job don't overwrite the cancellation...
+    assert not store.update("queued", status="completed", progress=100)
+    job = store.get("queued")
+    assert job.status == "cancelled" and job.progress == 0
+    # ...but completed_at may still be stamped
+    assert store.update("queued", completed_at=datetime.now())
+
+
+def test_update_rejects_unknown_fields(store):
+    store.create("job")
+    with pytest.raises(ValueError):
+        store.update("job", priority=5)
+
+
+def test_result_round_trip(store):
+    store.create("job", priority=3)
+    store.update("job", status="completed", result={"files": [1, 2]})
+
+    job = store.get("job")
+    assert job.result == {"files": [1, 2]}
+    assert job.priority == 3
+
+
+def test_interrupt_unfinished(store):
+    for status in ("uploading", "queued", "processing", "completed", "cancelled"):
+        store.create(status, status=status)
+
+    assert store.interrupt_unfinished() == 3
+    statuses = {job_id: store.get(job_id).status for job_id in
+                ("uploading", "queued", "processing", "completed", "cancelled")}
+    assert statuses == {"uploading": "error", "queued": "error", "processing": "error",
+                        "completed": "completed", "cancelled": "cancelled"}
+    assert store.get("queued").completed_at is not None
+
+
+def test_retention_queries(store):
+    store.create("old", status="completed")
+    store.create("used", status="completed")
+    store.create("running", status="processing")
+    old = datetime.now() - timedelta(days=2)
+    store.update("old", completed_at=old)
+    store.update("used", completed_at=old)
+    store.touch("used")
+
+    cutoff = datetime.now() - timedelta(days=1)
+    assert store.finished_before(cutoff) == ["old"]
+    assert store.finished_before(cutoff, exclude=["old"]) == []
+    assert store.least_recently_used() == ["old", "used"]
+    assert store.least_recently_used(before=cutoff) == ["old"]
+    assert store.least_recently_used(exclude=["old"]) == ["used"]
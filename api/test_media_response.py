@@ -0,0 +1,108 @@
+"""
+Unit tests for Range header parsing and file sends. Runs without a server: python -m pytest api/test_media_response.py
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from starlette.requests import Request
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from media_response import MAX_RANGES, RangeFileResponse, RangeNotSatisfiable, parse_range_header
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=0-", [(0, 999)]),
+    ("bytes=500-", [(500, 999)]),
+    ("bytes=900-5000", [(900, 999)]),
+    ("bytes=-100", [(900, 999)]),
+    ("bytes=-5000", [(0, 999)]),
+    ("BYTES = 10-19", [(10, 19)]),
+])
+def test_single_ranges(header, expected):
+    assert parse_range_header(header, SIZE) == expected
+
+
+def test_multiple_ranges_are_sorted():
+    assert parse_range_header("bytes=500-599, 0-99", SIZE) == [(0, 99), (500, 599)]
+
+
+def test_overlapping_and_adjacent_ranges_are_merged():
+    assert parse_range_header("bytes=0-99,50-149,150-199,300-399", SIZE) == [(0, 199), (300, 399)]
+
+
+def test_suffix_range_merges_with_explicit_range():
+    assert parse_range_header("bytes=0-9,-100,850-949", SIZE) == [(0, 9), (850, 999)]
+
+
+def test_ranges_past_the_end_are_dropped():
+    assert parse_range_header("bytes=0-9,2000-3000", SIZE) == [(0, 9)]
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0", "bytes=1000-1,2000-"])
+def test_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, SIZE)
+
+
+@pytest.mark.parametrize("header", ["items=0-10", "bytes=", "bytes=abc-def", "bytes=10", "bytes=20-10", "bytes=5--3"])
+def test_malformed_headers_are_ignored(header):
+    assert parse_range_header(header, SIZE) == []
+
+
+def test_too_many_ranges_are_ignored():
+    header = "bytes=" + ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(MAX_RANGES + 1))
+    assert parse_range_header(header, SIZE) == []
+    header = "bytes=" + ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(MAX_RANGES))
+    assert len(parse_range_header(header, SIZE)) == MAX_RANGES
+
+
+def serve(path, range_header="", extensions=None):
+    """Run a RangeFileResponse for path and return the ASGI messages it sent."""
+    scope = {"type": "http", "method": "GET", "path": "/preview/job", "query_string": b"",
+             "headers": [(b"range", range_header.encode())] if range_header else [],
+             "extensions": extensions or {}}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        await RangeFileResponse(Request(scope, receive), path, media_type="video/mp4")(scope, receive, send)
+
+    asyncio.run(run())
+    return messages
+
+
+@pytest.fixture
+def media_file(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(bytes(range(256)) * 4)
+    return str(path)
+
+
+def test_whole_file_uses_pathsend_when_offered(media_file):
+    messages = serve(media_file, extensions={"http.response.pathsend": {}})
+
+    assert messages[0]["status"] == 200
+    assert messages[1:] == [{"type": "http.response.pathsend", "path": media_file}]
+
+
+def test_ranges_are_read_without_file_extensions(media_file):
+    # uvicorn offers neither pathsend nor zerocopy; ranges never use pathsend either
+    for extensions in (None, {"http.response.pathsend": {}}):
+        messages = serve(media_file, "bytes=10-19", extensions)
+
+        assert messages[0]["status"] == 206
+        assert all(m["type"] == "http.response.body" for m in messages[1:])
+        assert b"".join(m["body"] for m in messages[1:]) == (bytes(range(256)) * 4)[10:20]
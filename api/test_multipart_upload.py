@@ -0,0 +1,79 @@
+"""
+Unit tests for streaming multipart parsing. Runs without a server: python -m pytest api/test_multipart_upload.py
+"""
+
+import asyncio
+import hashlib
+import os
+import sys
+
+import pytest
+from starlette.requests import Request
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from multipart_upload import MultipartError, receive_multipart
+
+BOUNDARY = "test-boundary"
+
+
+def body(*parts) -> bytes:
+    """Multipart body of (name, filename or None, content) parts."""
+    out = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        out += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+    return out + f"--{BOUNDARY}--\r\n".encode()
+
+
+def receive(data: bytes, tmp_path, piece_size: int = 7, check_filename=lambda filename: None):
+    """Run receive_multipart over data delivered in small pieces."""
+    scope = {"type": "http", "method": "POST", "path": "/upload-videos", "query_string": b"",
+             "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]}
+    pieces = [data[i:i + piece_size] for i in range(0, len(data), piece_size)] or [b""]
+    messages = [{"type": "http.request", "body": piece, "more_body": i < len(pieces) - 1}
+                for i, piece in enumerate(pieces)]
+
+    async def receive_message():
+        return messages.pop(0)
+
+    counter = iter(range(100))
+
+    def open_file(filename):
+        return str(tmp_path / f"upload-{next(counter)}")
+
+    return asyncio.run(receive_multipart(Request(scope, receive_message), open_file, check_filename))
+
+
+def test_files_are_streamed_and_hashed(tmp_path):
+    video = os.urandom(5000)
+    form = receive(body(("priority", None, b"3"), ("files", "a.mp4", video), ("files", "../b.mov", b"")), tmp_path)
+
+    assert form.fields == {"priority": "3"}
+    assert [(f.field_name, f.filename, f.size) for f in form.files] == [("files", "a.mp4", 5000),
+                                                                        ("files", "b.mov", 0)]
+    assert form.files[0].sha256 == hashlib.sha256(video).hexdigest()
+    with open(form.files[0].path, "rb") as f:
+        assert f.read() == video
+
+
+def test_truncated_body_removes_written_files(tmp_path):
+    data = body(("files", "a.mp4", b"x" * 100))[:-40]
+    with pytest.raises(MultipartError):
+        receive(data, tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_rejected_filename_stops_before_storing(tmp_path):
+    def check(filename):
+        if not filename.endswith(".mp4"):
+            raise ValueError(filename)
+
+    with pytest.raises(ValueError, match="notes.txt"):
+        receive(body(("files", "a.mp4", b"video"), ("files", "notes.txt", b"text")), tmp_path, check_filename=check)
+    assert os.listdir(tmp_path) == []
+
+
+def test_oversized_field_is_rejected(tmp_path):
+    with pytest.raises(MultipartError):
+        receive(body(("priority", None, b"1" * 100_000)), tmp_path, piece_size=4096)
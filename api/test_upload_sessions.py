@@ -0,0 +1,123 @@
+"""
+Unit tests for resumable upload sessions. Runs without a server: python -m pytest api/test_upload_sessions.py
+"""
+
+import os
+import sys
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from blob_store import BlobStore
+from upload_sessions import UploadSessionStore
+
+DATA = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def blob_store(tmp_path):
+    return BlobStore(str(tmp_path / "blob_store"))
+
+
+@pytest.fixture
+def sessions(blob_store):
+    return UploadSessionStore(os.path.join(blob_store.root, "uploads"))
+
+
+def write_chunk(sessions, upload_id, offset, length):
+    writer = sessions.open_chunk(upload_id, offset)
+    try:
+        writer.write(DATA[offset:offset + length], offset)
+    finally:
+        writer.close()
+    sessions.commit_chunk(upload_id, offset, length)
+
+
+def test_missing_ranges_coalesce_out_of_order_chunks(sessions):
+    upload_id = sessions.create("clip.mp4", len(DATA))["upload_id"]
+    assert sessions.status(upload_id)["missing_ranges"] == [[0, len(DATA)]]
+
+    # Out of order, overlapping and adjacent chunks
+    write_chunk(sessions, upload_id, 6000, 1000)
+    write_chunk(sessions, upload_id, 0, 2000)
+    write_chunk(sessions, upload_id, 1500, 1500)
+    write_chunk(sessions, upload_id, 3000, 1000)
+
+    status = sessions.status(upload_id)
+    assert status["missing_ranges"] == [[4000, 6000], [7000, len(DATA)]]
+    assert status["received_bytes"] == 5000
+    assert not status["finalized"]
+
+
+def test_finalize_verifies_and_stores(sessions, blob_store):
+    upload_id = sessions.create("clip.mp4", len(DATA))["upload_id"]
+    sha256 = hashlib.sha256(DATA).hexdigest()
+    write_chunk(sessions, upload_id, 0, 5000)
+
+    with pytest.raises(ValueError, match="incomplete"):
+        sessions.finalize(upload_id, sha256, blob_store)
+
+    write_chunk(sessions, upload_id, 5000, len(DATA) - 5000)
+    with pytest.raises(ValueError, match="Checksum"):
+        sessions.finalize(upload_id, "0" * 64, blob_store)
+
+    status = sessions.finalize(upload_id, sha256.upper(), blob_store)
+    assert status["finalized"] and status["sha256"] == sha256
+    with open(status["blob_path"], "rb") as f:
+        assert f.read() == DATA
+    # Finalizing again returns the same state
+    assert sessions.finalize(upload_id, sha256, blob_store)["blob_path"] == status["blob_path"]
+    with pytest.raises(ValueError):
+        sessions.open_chunk(upload_id, 0)
+
+
+def test_concurrent_finalize_returns_the_same_result(sessions, blob_store):
+    upload_id = sessions.create("clip.mp4", len(DATA))["upload_id"]
+    write_chunk(sessions, upload_id, 0, len(DATA))
+    sha256 = hashlib.sha256(DATA).hexdigest()
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: sessions.finalize(upload_id, sha256, blob_store), range(4)))
+
+    assert {r["blob_path"] for r in results} == {results[0]["blob_path"]}
+    assert all(r["finalized"] for r in results)
+
+
+def test_writer_opened_before_finalize_cannot_change_the_blob(sessions, blob_store):
+    upload_id = sessions.create("clip.mp4", len(DATA))["upload_id"]
+    write_chunk(sessions, upload_id, 0, len(DATA))
+    late = sessions.open_chunk(upload_id, 0)
+    try:
+        status = sessions.finalize(upload_id, hashlib.sha256(DATA).hexdigest(), blob_store)
+        with pytest.raises(ValueError, match="finalized"):
+            late.write(b"x" * 100, 0)
+    finally:
+        late.close()
+
+    with open(status["blob_path"], "rb") as f:
+        assert f.read() == DATA
+
+
+def test_chunk_offsets_are_validated(sessions):
+    upload_id = sessions.create("clip.mp4", len(DATA))["upload_id"]
+    with pytest.raises(ValueError):
+        sessions.open_chunk(upload_id, len(DATA))
+    with pytest.raises(ValueError):
+        sessions.open_chunk(upload_id, -1)
+
+
+def test_unknown_and_deleted_sessions(sessions):
+    with pytest.raises(KeyError):
+        sessions.status("not-a-uuid")
+    upload_id = sessions.create("clip.mp4", 10)["upload_id"]
+    sessions.delete(upload_id)
+    with pytest.raises(KeyError):
+        sessions.status(upload_id)
+
+
+def test_create_rejects_empty_upload(sessions):
+    with pytest.raises(ValueError):
+        sessions.create("clip.mp4", 0)
@@ -0,0 +1,239 @@
+"""
+Resumable chunked upload sessions.
+
+A session preallocates its target file up front; chunks are written in place
+with positioned writes, so they can arrive in any order, in parallel and from
+any API worker process. Each stored chunk leaves a marker file, which is how
+the session knows which byte ranges are still missing. Finalizing verifies the
+SHA-256 of the assembled file and moves it into the blob store without a copy.
+Chunk writes share the session lock that finalizing holds exclusively, so no
+write can land in the file while it is hashed or once it is a blob.
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from blob_store import BlobStore
+
+# Suggested chunk size returned to clients
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Read size when hashing the assembled file
+HASH_READ_SIZE = 4 * 1024 * 1024
+
+# Created in a session directory once its file belongs to the blob store
+FINALIZED_MARKER = "finalized"
+
+
+class ChunkWriter:
+    """Positioned writes into a session's file, each checked against finalizing."""
+
+    def __init__(self, session_dir: str, size: int):
+        self.size = size
+        self._marker = os.path.join(session_dir, FINALIZED_MARKER)
+        self._lock_fd = os.open(os.path.join(session_dir, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            self._fd = os.open(os.path.join(session_dir, "data"), os.O_WRONLY)
+        except OSError:
+            os.close(self._lock_fd)
+            raise
+
+    def write(self, data: bytes, position: int):
+        """Write data at position. Raises ValueError once the upload is finalized."""
+        fcntl.flock(self._lock_fd, fcntl.LOCK_SH)
+        try:
+            if os.path.exists(self._marker):
+                raise ValueError("Upload is already finalized")
+            os.pwrite(self._fd, data, position)
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def close(self):
+        os.close(self._fd)
+        os.close(self._lock_fd)
+
+
+class UploadSessionStore:
+    """On-disk upload sessions under root/<upload_id>/.
+
+    root should be on the same filesystem as the blob store so finalizing is a rename.
+    """
+
+    def __init__(self, root: str = "upload_sessions", chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        os.makedirs(root, exist_ok=True)
+
+    def _session_dir(self, upload_id: str) -> str:
+        try:
+            upload_id = uuid.UUID(upload_id).hex
+        except ValueError:
+            raise KeyError(upload_id)
+        session_dir = os.path.join(self.root, upload_id)
+        if not os.path.isdir(session_dir):
+            raise KeyError(upload_id)
+        return session_dir
+
+    def _load(self, session_dir: str) -> Dict:
+        with open(os.path.join(session_dir, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save(self, session_dir: str, meta: Dict):
+        temp_path = os.path.join(session_dir, f"meta.json.{os.getpid()}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temp_path, os.path.join(session_dir, "meta.json"))
+
+    def create(self, filename: str, size: int) -> Dict:
+        """Start a session for a file of the given size, preallocating its storage."""
+        if size <= 0:
+            raise ValueError("size must be positive")
+        upload_id = uuid.uuid4().hex
+        session_dir = os.path.join(self.root, upload_id)
+        os.makedirs(os.path.join(session_dir, "parts"))
+
+        fd = os.open(os.path.join(session_dir, "data"), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
+
+        meta = {
+            "upload_id": upload_id,
+            "filename": os.path.basename(filename),
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "created_at": datetime.now().isoformat(),
+            "sha256": None,
+            "blob_path": None,
+        }
+        self._save(session_dir, meta)
+        return meta
+
+    def open_chunk(self, upload_id: str, offset: int) -> ChunkWriter:
+        """Open the session file for a chunk write at offset. The caller closes the writer."""
+        session_dir = self._session_dir(upload_id)
+        meta = self._load(session_dir)
+        if meta["blob_path"]:
+            raise ValueError("Upload is already finalized")
+        if offset < 0 or offset >= meta["size"]:
+            raise ValueError(f"Offset {offset} is outside the upload (size {meta['size']})")
+        return ChunkWriter(session_dir, meta["size"])
+
+    def commit_chunk(self, upload_id: str, offset: int, length: int):
+        """Record that [offset, offset + length) has been written."""
+        if length <= 0:
+            return
+        marker = os.path.join(self._session_dir(upload_id), "parts", f"{offset}_{length}")
+        open(marker, "w").close()
+
+    def _received_ranges(self, session_dir: str) -> List[Tuple[int, int]]:
+        """Merged [start, end) ranges written so far."""
+        ranges = []
+        for name in os.listdir(os.path.join(session_dir, "parts")):
+            offset, length = map(int, name.split("_"))
+            ranges.append((offset, offset + length))
+        ranges.sort()
+        merged = []
+        for start, end in ranges:
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def status(self, upload_id: str) -> Dict:
+        """Session metadata with the received byte count and the missing ranges."""
+        session_dir = self._session_dir(upload_id)
+        meta = self._load(session_dir)
+        received = self._received_ranges(session_dir)
+        missing, position = [], 0
+        for start, end in received:
+            if start > position:
+                missing.append([position, start])
+            position = max(position, end)
+        if position < meta["size"]:
+            missing.append([position, meta["size"]])
+        return {
+            **meta,
+            "received_bytes": sum(end - start for start, end in received),
+            "missing_ranges": missing,
+            "finalized": meta["blob_path"] is not None,
+        }
+
+    @contextmanager
+    def _locked(self, session_dir: str):
+        """Hold the session's lock exclusively, which serializes finalizing with other finalizing
+        and with chunk writes, across threads and processes."""
+        with open(os.path.join(session_dir, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def finalize(self, upload_id: str, sha256: str, blob_store: BlobStore) -> Dict:
+        """Verify the assembled file against sha256 and move it into the blob store.
+
+        Concurrent calls for the same session wait for the first one and get its result.
+        """
+        session_dir = self._session_dir(upload_id)
+        with self._locked(session_dir):
+            return self._finalize(upload_id, session_dir, sha256, blob_store)
+
+    def _finalize(self, upload_id: str, session_dir: str, sha256: str, blob_store: BlobStore) -> Dict:
+        status = self.status(upload_id)
+        if status["finalized"]:
+            return status
+        if status["missing_ranges"]:
+            raise ValueError(f"Upload is incomplete: missing {status['missing_ranges']}")
+
+        data_path = os.path.join(session_dir, "data")
+        digest = hashlib.sha256()
+        with open(data_path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_READ_SIZE), b""):
+                digest.update(block)
+        if digest.hexdigest() != sha256.lower():
+            raise ValueError(f"Checksum mismatch: expected {sha256}, got {digest.hexdigest()}")
+
+        blob_path, reused = blob_store.ingest(data_path, digest.hexdigest())
+        # Writers still holding the file refuse to write from here on
+        open(os.path.join(session_dir, FINALIZED_MARKER), "w").close()
+        # Keep a link in the session so blob pruning sees the blob as in use until the session goes
+        blob_store.link(blob_path, data_path)
+        meta = self._load(session_dir)
+        meta.update(sha256=digest.hexdigest(), blob_path=blob_path, upload_reused=reused)
+        self._save(session_dir, meta)
+        return self.status(upload_id)
+
+    def get_finalized(self, upload_id: str) -> Optional[Dict]:
+        """Metadata of a finalized session, or None if it is not finalized yet."""
+        meta = self._load(self._session_dir(upload_id))
+        return meta if meta["blob_path"] else None
+
+    def stale(self, max_age: float) -> List[str]:
+        """IDs of sessions that have not received a chunk in max_age seconds."""
+        cutoff = time.time() - max_age
+        stale = []
+        for upload_id in os.listdir(self.root):
+            try:
+                # parts/ gains an entry with every stored chunk
+                if os.path.getmtime(os.path.join(self.root, upload_id, "parts")) < cutoff:
+                    stale.append(upload_id)
+            except FileNotFoundError:
+                continue
+        return stale
+
+    def delete(self, upload_id: str):
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the range-capable file responses behind /preview and /download.
+
+Calls RangeFileResponse directly as an ASGI app with a send() that discards the
+body, so it measures the server-side cost of producing a response: under
+uvicorn, which offers no ASGI file extension, that is the pread fallback. Full
+files, a single range and a multipart range request are timed, and with
+--pathsend the whole-file case is also timed with http.response.pathsend
+advertised, as servers such as Granian do. Results are written as JSON.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Dict, List
+
+# Add the api directory and the repository root to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from starlette.requests import Request
+
+from media_response import CHUNK_SIZE, RangeFileResponse
+
+
+def make_scope(path: str, range_header: str = "", extensions: Dict = None) -> Dict:
+    headers = [(b"range", range_header.encode())] if range_header else []
+    return {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+            "headers": headers, "extensions": extensions or {}}
+
+
+async def serve(file_path: str, scope: Dict) -> Dict:
+    """Run one response; returns body bytes and messages sent."""
+    sent = {"bytes": 0, "messages": 0}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent["messages"] += 1
+        if message["type"] == "http.response.body":
+            sent["bytes"] += len(message.get("body", b""))
+        elif message["type"] == "http.response.pathsend":
+            sent["bytes"] += os.path.getsize(message["path"])
+
+    response = RangeFileResponse(Request(scope, receive), file_path, media_type="video/mp4")
+    await response(scope, receive, send)
+    return sent
+
+
+async def bench_case(file_path: str, scope: Dict, repeat: int, concurrency: int) -> Dict:
+    await serve(file_path, scope)  # Warm the page cache and thread pool
+    timings: List[float] = []
+    total_bytes = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = await asyncio.gather(*(serve(file_path, scope) for _ in range(concurrency)))
+        timings.append(time.perf_counter() - started)
+        total_bytes += sum(r["bytes"] for r in results)
+    wall = sum(timings)
+    return {
+        "requests": repeat * concurrency,
+        "messages_per_request": results[0]["messages"],
+        "bytes_per_request": results[0]["bytes"],
+        "wall_seconds": round(wall, 4),
+        "median_batch_seconds": round(sorted(timings)[len(timings) // 2], 4),
+        "throughput_mb_s": round(total_bytes / wall / 1e6, 1) if wall else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark RangeFileResponse')
+    parser.add_argument('--size-mb', type=int, default=256, help='Size of the served file in MB (default: 256)')
+    parser.add_argument('--repeat', type=int, default=5, help='Batches per case (default: 5)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent requests per batch (default: 4)')
+    parser.add_argument('--pathsend', action='store_true', help='Also time whole files with pathsend advertised')
+    parser.add_argument('--workdir', help='Directory for the served file (default: a temp directory)')
+    parser.add_argument('--output', '-o', help='Results JSON path (default: bench_media_TIMESTAMP.json)')
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ezcut_bench_")
+    file_path = os.path.join(workdir, f"media_{args.size_mb}mb.bin")
+    size = args.size_mb * 1024 * 1024
+    if not os.path.exists(file_path) or os.path.getsize(file_path) != size:
+        print(f"Writing test file: {file_path}")
+        with open(file_path, 'wb') as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+    cases = {
+        "full_file": make_scope("/download/bench"),
+        "single_range": make_scope("/preview/bench", f"bytes={size // 4}-{size // 2}"),
+        "multipart_ranges": make_scope("/preview/bench", ",".join(
+            ["bytes=0-1048575"] + [f"{i * size // 8}-{i * size // 8 + 1048575}" for i in range(1, 8)])),
+    }
+    if args.pathsend:
+        cases["full_file_pathsend"] = make_scope("/download/bench", extensions={"http.response.pathsend": {}})
+
+    results = {}
+    for name, scope in cases.items():
+        print(f"\n=== {name} ===")
+        results[name] = asyncio.run(bench_case(file_path, scope, args.repeat, args.concurrency))
+        print(json.dumps(results[name]))
+
+    output = {
+        "generated_at": datetime.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {**vars(args), "chunk_size": CHUNK_SIZE},
+        "results": results,
+    }
+    output_file = args.output or f"bench_media_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nResults saved to: {output_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the video processing pipeline.
+Generates deterministic synthetic videos with ffmpeg's testsrc/sine sources and
+times each VideoProcessor stage in isolation and end to end. Whisper, CLIP and the
+OpenAI client are replaced with size-configurable local stand-ins so the suite runs
+on a CPU box without network access or model downloads.
+Results are written as JSON.
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+from PIL import Image
+
+# Add parent directory to path to import video_processor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from video_processor import VideoProcessor, AUDIO_SAMPLE_RATE
+from pipeline_stats import PipelineStats
+
+
+def generate_test_video(output_path: str, duration: float, width: int, height: int, fps: int) -> str:
+    """Render a deterministic test pattern video with a sine tone audio track."""
+    cmd = [
+        'ffmpeg', '-nostdin', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc=size={width}x{height}:rate={fps}:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-threads', '1',
+        '-c:a', 'aac', '-shortest',
+        '-fflags', '+bitexact', '-flags:v', '+bitexact', '-flags:a', '+bitexact',
+        output_path
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+    return output_path
+
+
+class FakeWhisperModel:
+    """Whisper stand-in: a random projection over framed audio, emitting fixed-length segments."""
+
+    def __init__(self, width: int = 256, segment_seconds: float = 5.0, seed: int = 0):
+        self.frame_size = 400  # 25 ms windows at 16 kHz, as Whisper uses
+        self.segment_seconds = segment_seconds
+        rng = np.random.default_rng(seed)
+        self.weights = rng.standard_normal((self.frame_size, width)).astype(np.float32)
+
+    def _load(self, audio):
+        if isinstance(audio, str):
+            with wave.open(audio, 'rb') as wav:
+                pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+            return pcm.astype(np.float32) / 32768.0
+        return audio
+
+    def transcribe(self, audio, **kwargs):
+        samples = self._load(audio)
+        n_frames = len(samples) // self.frame_size
+        frames = samples[:n_frames * self.frame_size].reshape(n_frames, self.frame_size)
+        # Work proportional to audio length and model width
+        np.tanh(frames @ self.weights)
+
+        duration = len(samples) / AUDIO_SAMPLE_RATE
+        segments = []
+        start = 0.0
+        while start < duration:
+            segments.append({'start': start, 'end': min(start + self.segment_seconds, duration),
+                             'text': f' Synthetic speech at {start:.0f} seconds.'})
+            start += self.segment_seconds
+        return {'text': ''.join(s['text'] for s in segments), 'segments': segments}
+
+
+class FakeClipModel(torch.nn.Module):
+    """CLIP image tower stand-in: pooled pixels through a small MLP of configurable size."""
+
+    def __init__(self, embed_dim: int = 512, width: int = 1024, pool_size: int = 16, seed: int = 0):
+        super().__init__()
+        torch.manual_seed(seed)
+        self.pool = torch.nn.AdaptiveAvgPool2d(pool_size)
+        self.mlp = torch.nn.Sequential(
+            torch.nn.Linear(3 * pool_size * pool_size, width),
+            torch.nn.GELU(),
+            torch.nn.Linear(width, embed_dim),
+        )
+        self.eval()
+
+    def encode_image(self, images):
+        return self.mlp(self.pool(images).flatten(1))
+
+
+def fake_clip_preprocess(input_resolution: int = 224):
+    """Return a CLIP-style preprocess callable producing (3, R, R) float tensors."""
+    def preprocess(pil_image: Image.Image):
+        resized = pil_image.convert('RGB').resize((input_resolution, input_resolution), Image.BILINEAR)
+        array = np.asarray(resized, dtype=np.float32) / 255.0
+        return torch.from_numpy(array).permute(2, 0, 1)
+    return preprocess
+
+
+class FakeOpenAIClient:
+    """OpenAI client stand-in that sleeps for a fixed latency and counts requests."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.request_count = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        content = "A colourful synthetic test pattern with a moving counter."
+        # Batched requests carry several images and expect a JSON array back
+        parts = kwargs['messages'][-1]['content']
+        n_images = sum(1 for p in parts if isinstance(p, dict) and p.get('type') == 'image_url') \
+            if isinstance(parts, list) else 0
+        if n_images > 1:
+            content = json.dumps([content] * n_images)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def build_processor(args, ingest_mode: str) -> VideoProcessor:
+    """Create a VideoProcessor wired to the local stand-ins."""
+    processor = VideoProcessor(
+        ingest_mode=ingest_mode,
+        openai_client=FakeOpenAIClient(args.vision_latency),
+        whisper_model=FakeWhisperModel(args.whisper_width),
+        clip_model=FakeClipModel(args.clip_dim, args.clip_width),
+        clip_preprocess=fake_clip_preprocess(args.clip_resolution),
+    )
+    # Inputs are moved to processor.device, so the model has to live there too
+    processor.clip_model.to(processor.device)
+    return processor
+
+
+def bench_stages(processor: VideoProcessor, video_path: str, sample_rate: float,
+                 n_clusters: Optional[int], describe_batch_size: int = 1) -> Dict:
+    """Time each pipeline stage in isolation."""
+    stats = PipelineStats(f"stages-{processor.ingest_mode}")
+    temp_dir = tempfile.mkdtemp(prefix="bench_stages_")
+
+    try:
+        if processor.ingest_mode == "demux":
+            with stats.stage("ingest") as stage:
+                audio, frames_data = processor.demux_video(video_path, sample_rate)
+                stage["items"] = len(frames_data)
+        else:
+            audio = os.path.join(temp_dir, "audio.wav")
+            with stats.stage("audio_extract", items=1):
+                processor.extract_audio(video_path, audio)
+            with stats.stage("sample") as stage:
+                frames_data = processor.extract_frames_for_analysis(video_path, sample_rate)
+                stage["items"] = len(frames_data)
+
+        with stats.stage("transcribe") as stage:
+            stage["items"] = len(processor.transcribe_audio(audio)['segments'])
+
+        with stats.stage("embed", items=len(frames_data)):
+            embeddings = processor.generate_clip_embeddings(frames_data)
+
+        with stats.stage("cluster", items=len(frames_data)):
+            keyframes = processor.cluster_frames_with_faiss(embeddings, frames_data, n_clusters)
+
+        with stats.stage("describe", items=len(keyframes)):
+            processor.describe_keyframes(keyframes, batch_size=describe_batch_size)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return stats.report()
+
+
+def bench_end_to_end(processor: VideoProcessor, video_path: str, output_dir: str,
+                     sample_rate: float, n_clusters: Optional[int], describe_batch_size: int = 1) -> Dict:
+    """Time a full process_video run."""
+    output_path = os.path.join(output_dir, f"{processor.ingest_mode}_processed.txt")
+    return processor.process_video(video_path, output_path, sample_rate, n_clusters,
+                                   describe_batch_size=describe_batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark VideoProcessor stages on synthetic media with offline model stand-ins')
+    parser.add_argument('--duration', type=float, default=60, help='Test video duration in seconds (default: 60)')
+    parser.add_argument('--resolution', default='1280x720', help='Test video resolution WxH (default: 1280x720)')
+    parser.add_argument('--fps', type=int, default=30, help='Test video frame rate (default: 30)')
+    parser.add_argument('--sample-rate', type=float, default=1.0, help='Frame sampling rate for analysis (default: 1.0)')
+    parser.add_argument('--clusters', type=int, help='Number of keyframe clusters (auto-determined if not specified)')
+    parser.add_argument('--ingest', nargs='+', choices=['demux', 'legacy'], default=['demux', 'legacy'],
+                        help='Ingest modes to compare (default: demux legacy)')
+    parser.add_argument('--describe-batch', nargs='+', type=int, default=[1],
+                        help='Keyframes per Vision request to compare (default: 1)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per configuration (default: 1)')
+    parser.add_argument('--whisper-width', type=int, default=256, help='Whisper stand-in projection width (default: 256)')
+    parser.add_argument('--clip-dim', type=int, default=512, help='CLIP stand-in embedding size (default: 512)')
+    parser.add_argument('--clip-width', type=int, default=1024, help='CLIP stand-in hidden width (default: 1024)')
+    parser.add_argument('--clip-resolution', type=int, default=224, help='CLIP stand-in input resolution (default: 224)')
+    parser.add_argument('--vision-latency', type=float, default=0.0,
+                        help='Simulated latency per Vision request in seconds (default: 0)')
+    parser.add_argument('--workdir', help='Directory for generated media (default: a temp directory)')
+    parser.add_argument('--output', '-o', help='Results JSON path (default: bench_results_TIMESTAMP.json)')
+
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.lower().split('x'))
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ezcut_bench_")
+    os.makedirs(workdir, exist_ok=True)
+
+    video_path = os.path.join(workdir, f"testsrc_{args.duration:g}s_{width}x{height}_{args.fps}fps.mp4")
+    if not os.path.exists(video_path):
+        print(f"Generating test video: {video_path}")
+        generate_test_video(video_path, args.duration, width, height, args.fps)
+
+    runs: List[Dict] = []
+    for ingest_mode in args.ingest:
+        for batch_size in args.describe_batch:
+            for repeat in range(args.repeat):
+                print(f"\n=== ingest={ingest_mode} batch={batch_size} run={repeat + 1}/{args.repeat} ===")
+                processor = build_processor(args, ingest_mode)
+                stages = bench_stages(processor, video_path, args.sample_rate, args.clusters, batch_size)
+                stages_requests = processor.openai_client.request_count
+                processor.openai_client.request_count = 0
+                end_to_end = bench_end_to_end(processor, video_path, workdir, args.sample_rate, args.clusters,
+                                              batch_size)
+                runs.append({
+                    "ingest_mode": ingest_mode,
+                    "describe_batch_size": batch_size,
+                    "repeat": repeat,
+                    "stages": stages,
+                    "end_to_end": end_to_end,
+                    "vision_requests": {
+                        "stages": stages_requests,
+                        "end_to_end": processor.openai_client.request_count,
+                    },
+                })
+
+    results = {
+        "generated_at": datetime.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+        },
+        "config": vars(args),
+        "video": {"path": video_path, "duration": args.duration, "width": width, "height": height, "fps": args.fps},
+        "runs": runs,
+    }
+
+    output_file = args.output or f"bench_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n" + "=" * 60)
+    for run in runs:
+        print(f"{run['ingest_mode']} batch {run['describe_batch_size']} run {run['repeat'] + 1}: "
+              f"stages {run['stages']['total_wall_seconds']:.2f}s, "
+              f"end-to-end {run['end_to_end']['total_wall_seconds']:.2f}s")
+    print(f"Results saved to: {output_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -88,7 +88,7 @@ apiClient.interceptors.response.use(
 // Types for API responses
 export interface JobStatus {
   job_id: string;
-  status: 'uploading' | 'processing' | 'generating_narrative' | 'preparing' | 'generating_intervals' | 'cutting_videos' | 'completed' | 'error';
+  status: 'uploading' | 'queued' | 'processing' | 'generating_narrative' | 'preparing' | 'generating_intervals' | 'cutting_videos' | 'completed' | 'error' | 'cancelled';
   progress: number;
   message: string;
   result?: {
@@ -107,6 +107,7 @@ export interface JobStatus {
     filename?: string;
   };
   error?: string;
+  priority?: number;
   created_at: string;
   completed_at?: string;
 }
@@ -122,12 +123,15 @@ export interface GenerateCutsRequest {
   duration?: number;
   interval_duration?: number;
   job_id?: string;
+  refresh?: boolean;
+  selection_mode?: 'ai' | 'local';
 }
 
 export interface GenerateCutsResponse {
   job_id: string;
   message: string;
   status_endpoint: string;
+  cached?: boolean;
 }
 
 export interface JobsListResponse {
@@ -138,6 +142,7 @@ export interface JobsListResponse {
     created_at: string;
     completed_at?: string;
   }>;
+  next_cursor?: string | null;
 }
 
 // Enhanced error utility
@@ -223,17 +228,40 @@ export const api = {
     }
   },
 
-  // List all jobs
-  async listJobs(): Promise<JobsListResponse> {
+  // Cancel a queued or running job
+  async cancelJob(jobId: string): Promise<JobStatus> {
     try {
-      const response = await apiClient.get('/jobs');
-      console.log(`📋 Retrieved ${response.data.jobs.length} jobs from history`);
+      const response = await apiClient.post(`/job/${jobId}/cancel`);
+      console.log(`🚫 Job ${jobId} cancelled`);
+      return response.data;
+    } catch (error) {
+      throw enhanceError(error, `Failed to cancel job ${jobId}`);
+    }
+  },
+
+  // List one page of jobs, newest first; pass next_cursor back to get the following page
+  async listJobsPage(cursor?: string | null, limit = 50): Promise<JobsListResponse> {
+    try {
+      const response = await apiClient.get('/jobs', { params: { limit, cursor: cursor || undefined } });
       return response.data;
     } catch (error) {
       throw enhanceError(error, 'Failed to list jobs');
     }
   },
 
+  // List all jobs, following the pagination cursor
+  async listJobs(): Promise<JobsListResponse> {
+    const jobs: JobsListResponse['jobs'] = [];
+    let cursor: string | null | undefined = undefined;
+    do {
+      const page: JobsListResponse = await api.listJobsPage(cursor, 500);
+      jobs.push(...page.jobs);
+      cursor = page.next_cursor;
+    } while (cursor);
+    console.log(`📋 Retrieved ${jobs.length} jobs from history`);
+    return { jobs, next_cursor: null };
+  },
+
   // Delete a job
   async deleteJob(jobId: string): Promise<{ message: string }> {
     try {
@@ -305,10 +333,10 @@ export const pollJobStatus = async (
   onError: (error: string) => void,
   intervalMs = 2000
 ): Promise<void> => {
-  console.log(`🔄 Starting to poll job ${jobId} every ${intervalMs}ms`);
   let pollCount = 0;
   
   const poll = async () => {
+    if (pollCount === 0) console.log(`🔄 Starting to poll job ${jobId} every ${intervalMs}ms`);
     pollCount++;
     try {
       console.log(`🔄 Poll attempt #${pollCount} for job ${jobId}`);
@@ -337,8 +365,8 @@ export const pollJobStatus = async (
         });
         onComplete(status);
         return; // Stop polling
-      } else if (status.status === 'error') {
-        const errorMsg = status.error || 'Processing failed';
+      } else if (status.status === 'error' || status.status === 'cancelled') {
+        const errorMsg = status.status === 'cancelled' ? 'Job was cancelled' : status.error || 'Processing failed';
         console.error(`❌ Job ${jobId} failed after ${pollCount} polls:`, errorMsg);
         onError(errorMsg);
         return; // Stop polling
@@ -359,7 +387,48 @@ export const pollJobStatus = async (
     }
   };
 
-  await poll();
+  // Prefer the server-sent events stream; fall back to polling if it is unavailable
+  if (typeof EventSource === 'undefined') {
+    await poll();
+    return;
+  }
+
+  console.log(`📡 Subscribing to events for job ${jobId}`);
+  const source = new EventSource(`${API_BASE_URL}/job/${jobId}/events`);
+  let finished = false;
+
+  source.addEventListener('status', (event) => {
+    onUpdate(JSON.parse((event as MessageEvent).data));
+  });
+
+  source.addEventListener('done', (event) => {
+    finished = true;
+    source.close();
+    const status: JobStatus = JSON.parse((event as MessageEvent).data);
+    onUpdate(status);
+    if (status.status === 'completed') {
+      console.log(`✅ Job ${jobId} completed successfully`);
+      onComplete(status);
+    } else {
+      const errorMsg = status.status === 'cancelled' ? 'Job was cancelled' : status.error || 'Processing failed';
+      console.error(`❌ Job ${jobId} failed:`, errorMsg);
+      onError(errorMsg);
+    }
+  });
+
+  source.addEventListener('deleted', () => {
+    finished = true;
+    source.close();
+    onError('Job was deleted');
+  });
+
+  source.onerror = () => {
+    if (finished) return;
+    finished = true;
+    source.close();
+    console.warn(`⚠️ Event stream for job ${jobId} failed, falling back to polling every ${intervalMs}ms`);
+    poll();
+  };
 };
 
 export default api; 
\ No newline at end of file
@@ -1,45 +1,103 @@
 #!/usr/bin/env python3
 """
 Script to cut video segments from the JSON intervals file using ffmpeg
+
+Can also be used as a library: render_cuts() takes the intervals document in
+memory and returns a description of the render.
 """
 
 import json
+import shlex
 import subprocess
+import threading
 import os
 import sys
-from pathlib import Path
+import time
+
+from metrics import FFMPEG_SECONDS
 
 def time_to_seconds(time_str):
     """Convert time string (HH:MM:SS) to seconds"""
     parts = time_str.split(':')
     return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
 
-def run_ffmpeg_command(command):
-    """Run an ffmpeg command and handle errors"""
+# How often a running ffmpeg checks whether it has been cancelled
+CANCEL_POLL_SECONDS = 0.1
+
+def run_ffmpeg_command(command, on_progress=None, duration=None, operation="cut", cancelled=None):
+    """Run an ffmpeg command (an argument list, run without a shell) and handle errors
+    
+    If on_progress is given, ffmpeg's -progress output is parsed and
+    on_progress(fraction) is called as the output time advances towards duration.
+    If cancelled is given, it is polled every CANCEL_POLL_SECONDS and ffmpeg is
+    killed as soon as it returns True.
+    The run time is recorded in the ffmpeg duration metric under operation.
+    """
+    started = time.perf_counter()
     try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"Error running command: {command}")
-            print(f"Error output: {result.stderr}")
+        if cancelled is None and (on_progress is None or not duration):
+            result = subprocess.run(command, capture_output=True, text=True)
+            returncode, stderr = result.returncode, result.stderr
+        else:
+            track_progress = on_progress is not None and duration
+            if track_progress:
+                command = [command[0], '-progress', 'pipe:1', '-nostats', *command[1:]]
+            # No shell in between, so killing the process stops ffmpeg itself
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, text=True)
+            
+            # Drain stderr concurrently so a full pipe cannot stall ffmpeg
+            stderr_lines = []
+            stderr_reader = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+            stderr_reader.start()
+            
+            # Watch for cancellation independently of ffmpeg's output, which may stall
+            watcher = None
+            if cancelled is not None:
+                def watch():
+                    while process.poll() is None:
+                        if cancelled():
+                            process.kill()
+                            return
+                        time.sleep(CANCEL_POLL_SECONDS)
+                watcher = threading.Thread(target=watch, daemon=True)
+                watcher.start()
+            
+            for line in process.stdout:
+                key, _, value = line.strip().partition('=')
+                # out_time_us (out_time_ms in older builds, also in microseconds)
+                if track_progress and key in ('out_time_us', 'out_time_ms') and value.isdigit():
+                    on_progress(min(1.0, int(value) / 1_000_000 / duration))
+            
+            returncode = process.wait()
+            stderr_reader.join()
+            if watcher is not None:
+                watcher.join()
+            stderr = ''.join(stderr_lines)
+        
+        FFMPEG_SECONDS.observe(time.perf_counter() - started, operation=operation)
+        if returncode != 0:
+            print(f"Error running command: {shlex.join(command)}")
+            print(f"Error output: {stderr}")
             return False
         return True
     except Exception as e:
-        print(f"Exception running command: {command}")
+        print(f"Exception running command: {shlex.join(command)}")
         print(f"Exception: {e}")
         return False
 
-def cut_video_segments(json_file_path, source_video_dir="stream_videos", output_dir="output_segments", final_output="final_cut_video.mp4"):
-    """
-    Cut video segments based on the JSON intervals file
+def render_cuts(data, source_video_dir="stream_videos", output_dir="output_segments", final_output="final_cut_video.mp4",
+                progress_callback=None, cancelled=None):
     """
+    Cut and concatenate the segments of an intervals document (as produced by
+    generate_narrative_intervals)
     
-    # Read the JSON file
-    try:
-        with open(json_file_path, 'r') as f:
-            data = json.load(f)
-    except Exception as e:
-        print(f"Error reading JSON file: {e}")
-        return False
+    progress_callback, if given, is called with the overall fraction complete (0-1)
+    as segments are rendered, weighted by segment duration. cancelled, if given,
+    is polled while rendering; once it returns True ffmpeg is stopped.
+    Returns a dict with the final video, segment files and failed intervals,
+    or None if no video was produced.
+    """
     
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
@@ -51,7 +109,19 @@ def cut_video_segments(json_file_path, source_video_dir="stream_videos", output_
     intervals = data.get('intervals', [])
     print(f"Processing {len(intervals)} intervals...")
     
+    # Rendering accounts for most of the work; concatenation is a stream copy
+    total_seconds = sum(max(0, time_to_seconds(i['end_time']) - time_to_seconds(i['start_time'])) for i in intervals)
+    done_seconds = 0
+    
+    def report(fraction):
+        if progress_callback:
+            progress_callback(round(fraction, 4))
+    
+    failed = []
     for interval in intervals:
+        if cancelled is not None and cancelled():
+            print("Rendering cancelled")
+            return None
         index = interval['index']
         start_time = interval['start_time']
         end_time = interval['end_time']
@@ -65,23 +135,34 @@ def cut_video_segments(json_file_path, source_video_dir="stream_videos", output_
         # Check if source video exists
         if not os.path.exists(source_path):
             print(f"Warning: Source video not found: {source_path}")
+            failed.append(index)
             continue
         
         print(f"Cutting segment {index}: {source_video} from {start_time} to {end_time}")
         
         # ffmpeg command to cut the segment
         # Using -ss for start time, -to for end time, -c copy for fast copying without re-encoding
-        command = f'ffmpeg -i "{source_path}" -ss {start_time} -to {end_time} "{output_path}" -y'
+        command = ['ffmpeg', '-i', source_path, '-ss', start_time, '-to', end_time, output_path, '-y']
+        segment_seconds = max(0, time_to_seconds(end_time) - time_to_seconds(start_time))
         
-        if run_ffmpeg_command(command):
+        def on_segment_progress(fraction, base=done_seconds, length=segment_seconds):
+            report(0.95 * (base + fraction * length) / total_seconds)
+        
+        if run_ffmpeg_command(command, on_segment_progress if progress_callback and total_seconds else None,
+                              segment_seconds, cancelled=cancelled):
             segment_files.append(output_path)
             print(f"✓ Created segment: {output_filename}")
         else:
             print(f"✗ Failed to create segment: {output_filename}")
+            failed.append(index)
+        
+        done_seconds += segment_seconds
+        if total_seconds:
+            report(0.95 * done_seconds / total_seconds)
     
-    if not segment_files:
+    if not segment_files or (cancelled is not None and cancelled()):
         print("No segments were created successfully.")
-        return False
+        return None
     
     # Create concatenation file list
     concat_file_path = os.path.join(output_dir, "segments_list.txt")
@@ -94,10 +175,11 @@ def cut_video_segments(json_file_path, source_video_dir="stream_videos", output_
     print(f"\nConcatenating {len(segment_files)} segments into final video...")
     
     # ffmpeg command to concatenate all segments
-    concat_command = f'ffmpeg -f concat -safe 0 -i "{concat_file_path}" -c copy "{final_output}" -y'
+    concat_command = ['ffmpeg', '-f', 'concat', '-safe', '0', '-i', concat_file_path, '-c', 'copy', final_output, '-y']
     
-    if run_ffmpeg_command(concat_command):
+    if run_ffmpeg_command(concat_command, operation="concat", cancelled=cancelled):
         print(f"✓ Final video created: {final_output}")
+        report(1.0)
         
         # Get metadata from JSON
         metadata = data.get('metadata', {})
@@ -110,10 +192,36 @@ def cut_video_segments(json_file_path, source_video_dir="stream_videos", output_
         print(f"- Output video: {final_output}")
         print(f"- Segment files saved in: {output_dir}")
         
-        return True
+        return {
+            "final_output": final_output,
+            "output_dir": output_dir,
+            "segment_files": segment_files,
+            "failed_intervals": failed,
+            "intervals_count": len(intervals),
+            "total_duration": total_duration
+        }
     else:
         print("✗ Failed to create final concatenated video")
+        return None
+
+def cut_video_segments(json_file_path, source_video_dir="stream_videos", output_dir="output_segments", final_output="final_cut_video.mp4",
+                       progress_callback=None):
+    """
+    Cut video segments based on the JSON intervals file
+    
+    progress_callback, if given, is called with the overall fraction complete (0-1)
+    as segments are rendered, weighted by segment duration.
+    """
+    
+    # Read the JSON file
+    try:
+        with open(json_file_path, 'r') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Error reading JSON file: {e}")
         return False
+    
+    return render_cuts(data, source_video_dir, output_dir, final_output, progress_callback) is not None
 
 def main():
     import argparse
@@ -127,6 +235,8 @@ def main():
                        help='Directory to save output segments (default: output_segments)')
     parser.add_argument('--final-output', '-f', default='final_cut_video.mp4',
                        help='Final output video filename (default: final_cut_video.mp4)')
+    parser.add_argument('--progress', action='store_true',
+                       help='Print machine-readable "PROGRESS <fraction>" lines while rendering')
     
     args = parser.parse_args()
     
@@ -155,7 +265,11 @@ def main():
     print(f"Final output file: {final_output}")
     print("=" * 60)
     
-    success = cut_video_segments(json_file, video_dir, output_dir, final_output)
+    progress_callback = None
+    if args.progress:
+        progress_callback = lambda fraction: print(f"PROGRESS {fraction:.4f}", flush=True)
+    
+    success = cut_video_segments(json_file, video_dir, output_dir, final_output, progress_callback)
     
     if success:
         print("\n🎉 Video cutting and concatenation completed successfully!")
@@ -2,21 +2,44 @@
 """
 Script to generate dynamic timestamp intervals from narrative text and processed stream data.
 Uses OpenAI API to determine natural story breaks and generate descriptions.
+
+Can also be used as a library: select_intervals() returns the results in memory.
+With selection_mode="local" intervals are chosen offline by local_interval_selection
+instead of by OpenAI; in the default "ai" mode it is the per-video fallback.
 """
 
 import os
 import json
 import argparse
 import re
-from typing import List, Dict, Tuple, Optional
+import asyncio
+from typing import List, Dict, Tuple, Optional, Callable
 from dataclasses import dataclass
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 import openai
+import numpy as np
 from dotenv import load_dotenv
 
+from metrics import openai_request
+from openai_pool import get_async_client, get_client
+from local_interval_selection import select_intervals_locally
+
 # Load environment variables
 load_dotenv()
 
+# Per-video interval selection and description batch requests in flight at once
+MAX_PARALLEL_REQUESTS = int(os.getenv("INTERVAL_MAX_PARALLEL_REQUESTS", "4"))
+
+# Intervals described per request
+DESCRIPTION_BATCH_SIZE = int(os.getenv("INTERVAL_DESCRIPTION_BATCH_SIZE", "10"))
+
+# How often a request awaited on an event loop checks whether generation was cancelled
+CANCEL_POLL_SECONDS = 0.2
+
+# "ai" asks OpenAI to select intervals; "local" scores and packs them offline
+SELECTION_MODES = ("ai", "local")
+
 @dataclass
 class TimestampEntry:
     timestamp: str
@@ -33,22 +56,92 @@ class TimeInterval:
     ai_description: str
     source_video: str  # Which part video to cut from
 
+@dataclass
+class VideoEntries:
+    """One video's entries in time order, with their timestamps parsed once into seconds"""
+    entries: List[TimestampEntry]
+    times: np.ndarray  # Sorted seconds, times[i] belongs to entries[i]
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    @property
+    def duration(self) -> float:
+        return float(self.times[-1]) if len(self.times) else 0.0
+    
+    def span(self, start: float, end: float) -> Tuple[int, int]:
+        """Index range [lo, hi) of the entries with start <= time <= end"""
+        return (int(np.searchsorted(self.times, start, side="left")),
+                int(np.searchsorted(self.times, end, side="right")))
+    
+    def between(self, start: float, end: float) -> List[TimestampEntry]:
+        lo, hi = self.span(start, end)
+        return self.entries[lo:hi]
+
+class IntervalGenerationCancelled(Exception):
+    """Raised when the cancelled callback reports that the caller gave up."""
+
 class NarrativeIntervalGenerator:
-    def __init__(self, narrative_file: str, stream_dir: str, total_duration: int = 60, suggested_interval_duration: int = 5):
+    def __init__(self, narrative_file: Optional[str], stream_dir: str, total_duration: int = 60, suggested_interval_duration: int = 5,
+                 progress_callback: Optional[Callable[[float], None]] = None, narrative_text: Optional[str] = None,
+                 cancelled: Optional[Callable[[], bool]] = None, max_parallel_requests: int = MAX_PARALLEL_REQUESTS,
+                 description_batch_size: int = DESCRIPTION_BATCH_SIZE, selection_mode: str = "ai",
+                 event_loop: Optional[asyncio.AbstractEventLoop] = None):
+        if selection_mode not in SELECTION_MODES:
+            raise ValueError(f"Unknown selection mode: {selection_mode}")
         self.narrative_file = narrative_file
+        self.narrative_text = narrative_text  # Used instead of reading narrative_file when given
         self.stream_dir = stream_dir
         self.total_duration = total_duration  # Total target duration for entire video
         self.suggested_interval_duration = suggested_interval_duration  # Suggested duration for each interval
         self.min_interval_duration = max(1, suggested_interval_duration - 2)  # Minimum is 2s less than suggested, but at least 1s
         self.max_interval_duration = suggested_interval_duration + 2  # Maximum is 2s more than suggested
-        self.openai_client: openai.OpenAI = self._setup_openai()
+        self.progress_callback = progress_callback  # Called with overall fraction complete (0-1)
+        self.cancelled = cancelled  # Polled at each progress step; stops generation when it returns True
+        self.max_parallel_requests = max_parallel_requests  # Concurrent AI selection/description requests
+        self.description_batch_size = description_batch_size  # Intervals described per AI request
+        self.selection_mode = selection_mode
+        # When given, OpenAI requests are awaited on this running loop with its pooled async client
+        self.event_loop = event_loop
+        self.openai_api_key: Optional[str] = None
+        # Local selection runs offline and needs no client
+        self.openai_client: Optional[openai.OpenAI] = self._setup_openai() if selection_mode == "ai" else None
         
     def _setup_openai(self) -> openai.OpenAI:
-        """Initialize OpenAI client with API key from environment"""
+        """Get the shared OpenAI client for the API key from environment"""
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
-        return openai.OpenAI(api_key=api_key)
+        self.openai_api_key = api_key
+        return get_client(api_key)
+    
+    def chat_completion(self, **kwargs):
+        """Create a chat completion, on event_loop when one was given
+        
+        Requests on the loop share its pooled async client and are aborted as
+        soon as cancelled() returns True, raising IntervalGenerationCancelled.
+        """
+        if self.event_loop is None:
+            return self.openai_client.chat.completions.create(**kwargs)
+        
+        async def create():
+            return await get_async_client(self.openai_api_key).chat.completions.create(**kwargs)
+        
+        future = asyncio.run_coroutine_threadsafe(create(), self.event_loop)
+        while True:
+            try:
+                return future.result(timeout=CANCEL_POLL_SECONDS)
+            except FutureTimeoutError:
+                if self.cancelled and self.cancelled():
+                    future.cancel()
+                    raise IntervalGenerationCancelled()
+    
+    def report_progress(self, fraction: float):
+        """Forward overall progress to the progress callback, if any"""
+        if self.cancelled and self.cancelled():
+            raise IntervalGenerationCancelled()
+        if self.progress_callback:
+            self.progress_callback(round(min(1.0, max(0.0, fraction)), 4))
     
     def parse_timestamp(self, timestamp_str: str) -> float:
         """Convert timestamp string (HH:MM:SS) to seconds"""
@@ -74,6 +167,8 @@ class NarrativeIntervalGenerator:
     
     def read_narrative(self) -> str:
         """Read the narrative text file"""
+        if self.narrative_text is not None:
+            return self.narrative_text.strip()
         with open(self.narrative_file, 'r', encoding='utf-8') as f:
             return f.read().strip()
     
@@ -95,7 +190,7 @@ class NarrativeIntervalGenerator:
             content = f.read()
         
         # Parse transcript entries
-        transcript_pattern = r'\[transcript:(\d{2}:\d{2}:\d{2})\]\s*([^\n]*?)(?:\n|$)'
+        transcript_pattern = r'\[transcript:(\d{2}:\d{2}:\d{2})\][ \t]*([^\n]*?)(?:\n|$)'
         for match in re.finditer(transcript_pattern, content):
             timestamp, text = match.groups()
             speaker = None
@@ -115,7 +210,7 @@ class NarrativeIntervalGenerator:
                 entries.append(TimestampEntry(timestamp, 'transcript', text, source_video, speaker))
         
         # Parse keyframe entries
-        keyframe_pattern = r'\[keyframe:(\d{2}:\d{2}:\d{2})\]\s*([^\n]*?)(?:\n|$)'
+        keyframe_pattern = r'\[keyframe:(\d{2}:\d{2}:\d{2})\][ \t]*([^\n]*?)(?:\n|$)'
         for match in re.finditer(keyframe_pattern, content):
             timestamp, description = match.groups()
             if description.strip():
@@ -146,21 +241,28 @@ class NarrativeIntervalGenerator:
         # Note: We assume timestamps reset for each part, so we don't sort globally
         return all_entries
     
-    def group_entries_by_video(self, entries: List[TimestampEntry]) -> Dict[str, List[TimestampEntry]]:
-        """Group entries by source video"""
-        video_groups = {}
+    def group_entries_by_video(self, entries: List[TimestampEntry]) -> Dict[str, VideoEntries]:
+        """Group entries by source video, sorted by time
+        
+        Each timestamp is parsed exactly once here; everything downstream works
+        on the per-video arrays of seconds and range queries over them.
+        """
+        grouped = {}
         for entry in entries:
-            if entry.source_video not in video_groups:
-                video_groups[entry.source_video] = []
-            video_groups[entry.source_video].append(entry)
+            if entry.source_video not in grouped:
+                grouped[entry.source_video] = []
+            grouped[entry.source_video].append(entry)
         
-        # Sort entries within each video by timestamp
-        for video, video_entries in video_groups.items():
-            video_entries.sort(key=lambda x: self.parse_timestamp(x.timestamp))
+        video_groups = {}
+        for video, video_entries in grouped.items():
+            times = np.array([self.parse_timestamp(e.timestamp) for e in video_entries], dtype=float)
+            # Stable, so entries sharing a timestamp keep their file order
+            order = np.argsort(times, kind="stable")
+            video_groups[video] = VideoEntries([video_entries[i] for i in order], times[order])
         
         return video_groups
     
-    def get_ai_interval_suggestions(self, video_groups: Dict[str, List[TimestampEntry]], narrative: str) -> List[TimeInterval]:
+    def get_ai_interval_suggestions(self, video_groups: Dict[str, VideoEntries], narrative: str) -> List[TimeInterval]:
         """Use AI to determine optimal intervals that fit within target duration"""
         print("Analyzing content for optimal intervals within target duration...")
         
@@ -170,7 +272,7 @@ class NarrativeIntervalGenerator:
         
         for video, entries in video_groups.items():
             if entries:
-                duration = self.parse_timestamp(entries[-1].timestamp)
+                duration = entries.duration
                 video_durations[video] = duration
                 total_available_duration += duration
         
@@ -179,82 +281,126 @@ class NarrativeIntervalGenerator:
         # Calculate selection ratio (how much content we need vs. available)
         selection_ratio = min(1.0, self.total_duration / total_available_duration) if total_available_duration > 0 else 0
         
+        if self.selection_mode == "local":
+            all_intervals = self.local_intervals(video_groups, narrative, self.total_duration, use_summaries=True)
+            self.report_progress(0.7)
+            print(f"Locally selected {len(all_intervals)} intervals ({sum(i.duration_seconds for i in all_intervals):.0f}s)")
+            return all_intervals
+        
         all_intervals = []
         
-        for video, entries in video_groups.items():
-            if not entries:
-                continue
-                
-            print(f"Analyzing {video} with {len(entries)} entries...")
-            
-            # Create a condensed version for AI analysis
-            content_chunks = []
-            current_chunk = []
-            chunk_duration = 15  # Smaller chunks for better granularity
-            
-            chunk_start = self.parse_timestamp(entries[0].timestamp)
-            
-            for entry in entries:
-                entry_time = self.parse_timestamp(entry.timestamp)
-                
-                if entry_time - chunk_start >= chunk_duration:
-                    if current_chunk:
-                        # Summarize this chunk
-                        chunk_content = []
-                        for e in current_chunk:
-                            if e.entry_type == 'transcript' and e.content:
-                                speaker_prefix = f"{e.speaker}: " if e.speaker else ""
-                                chunk_content.append(f"{speaker_prefix}{e.content}")
-                            elif e.entry_type == 'keyframe':
-                                chunk_content.append(f"[Visual: {e.content[:50]}...]")
-                        
-                        chunk_summary = " | ".join(chunk_content[:3])
-                        content_chunks.append({
-                            'timestamp': self.seconds_to_timestamp(chunk_start),
-                            'timestamp_seconds': chunk_start,
-                            'content': chunk_summary,
-                            'duration': entry_time - chunk_start
-                        })
-                    
-                    chunk_start = entry_time
-                    current_chunk = [entry]
+        # One request per video, issued concurrently; results are merged in video order
+        videos = list(video_groups.items())
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel_requests, len(videos))))
+        try:
+            futures = {
+                pool.submit(self.select_video_intervals, video, entries, video_durations.get(video, 0),
+                            video_durations.get(video, 0) * selection_ratio, narrative): video
+                for video, entries in videos
+            }
+            # Interval selection is the first 70% of the work, one step per video
+            for done, _ in enumerate(as_completed(futures), start=1):
+                self.report_progress(0.7 * done / len(videos))
+            results = {video: future.result() for future, video in futures.items()}
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        for video, _ in videos:
+            all_intervals.extend(results[video])
+        
+        # Sort all intervals and trim to fit target duration if needed
+        all_intervals.sort(key=lambda x: (x.source_video, self.parse_timestamp(x.start_time)))
+        
+        # Ensure we don't exceed target duration
+        total_selected_duration = sum(i.duration_seconds for i in all_intervals)
+        if total_selected_duration > self.total_duration:
+            print(f"Selected {total_selected_duration:.1f}s, trimming to {self.total_duration}s...")
+            # Remove intervals until we fit the target
+            running_total = 0
+            filtered_intervals = []
+            for interval in all_intervals:
+                if running_total + interval.duration_seconds <= self.total_duration:
+                    filtered_intervals.append(interval)
+                    running_total += interval.duration_seconds
                 else:
-                    current_chunk.append(entry)
+                    break
+            all_intervals = filtered_intervals
+        
+        return all_intervals
+    
+    def select_video_intervals(self, video: str, entries: VideoEntries, video_duration: float,
+                               video_target_duration: float, narrative: str) -> List[TimeInterval]:
+        """Ask the AI for the best intervals of one video, falling back to evenly spaced ones"""
+        intervals = []
+        
+        if not entries:
+            return []
+        
+        print(f"Analyzing {video} with {len(entries)} entries...")
+        
+        # Create a condensed version for AI analysis
+        content_chunks = []
+        current_chunk = []
+        chunk_duration = 15  # Smaller chunks for better granularity
+        
+        chunk_start = float(entries.times[0])
+        
+        for entry, entry_time in zip(entries.entries, entries.times.tolist()):
             
-            # Add final chunk
-            if current_chunk:
-                chunk_content = []
-                for e in current_chunk:
-                    if e.entry_type == 'transcript' and e.content:
-                        speaker_prefix = f"{e.speaker}: " if e.speaker else ""
-                        chunk_content.append(f"{speaker_prefix}{e.content}")
-                    elif e.entry_type == 'keyframe':
-                        chunk_content.append(f"[Visual: {e.content[:50]}...]")
+            if entry_time - chunk_start >= chunk_duration:
+                if current_chunk:
+                    # Summarize this chunk
+                    chunk_content = []
+                    for e in current_chunk:
+                        if e.entry_type == 'transcript' and e.content:
+                            speaker_prefix = f"{e.speaker}: " if e.speaker else ""
+                            chunk_content.append(f"{speaker_prefix}{e.content}")
+                        elif e.entry_type == 'keyframe':
+                            chunk_content.append(f"[Visual: {e.content[:50]}...]")
+                    
+                    chunk_summary = " | ".join(chunk_content[:3])
+                    content_chunks.append({
+                        'timestamp': self.seconds_to_timestamp(chunk_start),
+                        'timestamp_seconds': chunk_start,
+                        'content': chunk_summary,
+                        'duration': entry_time - chunk_start
+                    })
                 
-                chunk_summary = " | ".join(chunk_content[:3])
-                final_duration = self.parse_timestamp(entries[-1].timestamp) - chunk_start
-                content_chunks.append({
-                    'timestamp': self.seconds_to_timestamp(chunk_start),
-                    'timestamp_seconds': chunk_start,
-                    'content': chunk_summary,
-                    'duration': final_duration
-                })
-            
-            # Calculate target duration for this video proportionally
-            video_target_duration = video_durations[video] * selection_ratio
-            
-            # Prepare content for AI analysis
-            content_for_ai = "\n".join([
-                f"{chunk['timestamp']} ({chunk['duration']:.1f}s): {chunk['content']}" 
-                for chunk in content_chunks
-            ])
+                chunk_start = entry_time
+                current_chunk = [entry]
+            else:
+                current_chunk.append(entry)
+        
+        # Add final chunk
+        if current_chunk:
+            chunk_content = []
+            for e in current_chunk:
+                if e.entry_type == 'transcript' and e.content:
+                    speaker_prefix = f"{e.speaker}: " if e.speaker else ""
+                    chunk_content.append(f"{speaker_prefix}{e.content}")
+                elif e.entry_type == 'keyframe':
+                    chunk_content.append(f"[Visual: {e.content[:50]}...]")
             
-            try:
-                prompt = f"""
+            chunk_summary = " | ".join(chunk_content[:3])
+            final_duration = entries.duration - chunk_start
+            content_chunks.append({
+                'timestamp': self.seconds_to_timestamp(chunk_start),
+                'timestamp_seconds': chunk_start,
+                'content': chunk_summary,
+                'duration': final_duration
+            })
+        
+        # Prepare content for AI analysis
+        content_for_ai = "\n".join([
+            f"{chunk['timestamp']} ({chunk['duration']:.1f}s): {chunk['content']}" 
+            for chunk in content_chunks
+        ])
+        
+        try:
+            prompt = f"""
 Based on this narrative story:
 "{narrative[:400]}"
 
-I need to select the BEST {video_target_duration:.1f} seconds of content from video "{video}" (out of {video_durations[video]:.1f}s available).
+I need to select the BEST {video_target_duration:.1f} seconds of content from video "{video}" (out of {video_duration:.1f}s available).
 
 Content with timestamps and durations:
 {content_for_ai[:2000]}...
@@ -271,8 +417,9 @@ Please select the best intervals that fit these constraints. Return ONLY a JSON
   {{"start": "00:03:20", "end": "00:03:35", "reason": "Important visual/reaction"}}
 ]
 """
-                
-                response = self.openai_client.chat.completions.create(
+            
+            with openai_request("gpt-4"):
+                response = self.chat_completion(
                     model="gpt-4",  # Use GPT-4 for better reasoning about constraints
                     messages=[
                         {"role": "system", "content": "You are a video editor expert at selecting the best moments from content. You must respect duration constraints strictly. Return only valid JSON."},
@@ -281,100 +428,118 @@ Please select the best intervals that fit these constraints. Return ONLY a JSON
                     max_tokens=600,
                     temperature=0.3
                 )
-                
-                ai_response = response.choices[0].message.content
-                if ai_response:
-                    try:
-                        # Extract JSON from response
-                        start_idx = ai_response.find('[')
-                        end_idx = ai_response.rfind(']') + 1
-                        if start_idx != -1 and end_idx > start_idx:
-                            json_str = ai_response[start_idx:end_idx]
-                            suggested_intervals = json.loads(json_str)
-                            
-                            for interval_data in suggested_intervals:
-                                if isinstance(interval_data, dict) and 'start' in interval_data and 'end' in interval_data:
-                                    start_seconds = self.parse_timestamp(interval_data['start'])
-                                    end_seconds = self.parse_timestamp(interval_data['end'])
-                                    duration = end_seconds - start_seconds
-                                    
-                                    # Enforce max duration
-                                    if duration > self.max_interval_duration:
-                                        end_seconds = start_seconds + self.max_interval_duration
-                                        duration = self.max_interval_duration
-                                    
-                                    # Enforce min duration
-                                    if duration < self.min_interval_duration:
-                                        continue
-                                    
-                                    interval = TimeInterval(
-                                        start_time=self.seconds_to_timestamp(start_seconds),
-                                        end_time=self.seconds_to_timestamp(end_seconds),
-                                        duration_seconds=duration,
-                                        ai_description=interval_data.get('reason', ''),
-                                        source_video=video
-                                    )
-                                    all_intervals.append(interval)
-                            
-                            print(f"AI selected {len([i for i in all_intervals if i.source_video == video])} intervals for {video}")
-                            continue
-                    except Exception as e:
-                        print(f"Failed to parse AI response for {video}: {e}")
-            
-            except Exception as e:
-                print(f"Error getting AI suggestions for {video}: {e}")
             
-            # Fallback: select best moments manually
-            if video_target_duration > 0:
-                # Calculate intervals based on suggested duration
-                num_intervals = max(1, int(video_target_duration / self.suggested_interval_duration))
-                if num_intervals > 0:
-                    video_duration = video_durations[video]
-                    interval_size = min(self.max_interval_duration, max(self.min_interval_duration, video_target_duration / num_intervals))
-                    
-                    # Select evenly distributed intervals
-                    for i in range(num_intervals):
-                        start_time = (video_duration / num_intervals) * i
-                        end_time = min(start_time + interval_size, video_duration)
+            ai_response = response.choices[0].message.content
+            if ai_response:
+                try:
+                    # Extract JSON from response
+                    start_idx = ai_response.find('[')
+                    end_idx = ai_response.rfind(']') + 1
+                    if start_idx != -1 and end_idx > start_idx:
+                        json_str = ai_response[start_idx:end_idx]
+                        suggested_intervals = json.loads(json_str)
+                        
+                        for interval_data in suggested_intervals:
+                            if isinstance(interval_data, dict) and 'start' in interval_data and 'end' in interval_data:
+                                start_seconds = self.parse_timestamp(interval_data['start'])
+                                end_seconds = self.parse_timestamp(interval_data['end'])
+                                duration = end_seconds - start_seconds
+                                
+                                # Enforce max duration
+                                if duration > self.max_interval_duration:
+                                    end_seconds = start_seconds + self.max_interval_duration
+                                    duration = self.max_interval_duration
+                                
+                                # Enforce min duration
+                                if duration < self.min_interval_duration:
+                                    continue
+                                
+                                interval = TimeInterval(
+                                    start_time=self.seconds_to_timestamp(start_seconds),
+                                    end_time=self.seconds_to_timestamp(end_seconds),
+                                    duration_seconds=duration,
+                                    ai_description=interval_data.get('reason', ''),
+                                    source_video=video
+                                )
+                                intervals.append(interval)
                         
-                        if end_time - start_time >= self.min_interval_duration:
-                            interval = TimeInterval(
-                                start_time=self.seconds_to_timestamp(start_time),
-                                end_time=self.seconds_to_timestamp(end_time),
-                                duration_seconds=end_time - start_time,
-                                ai_description=f"Selected segment from {video}",
-                                source_video=video
-                            )
-                            all_intervals.append(interval)
+                        print(f"AI selected {len(intervals)} intervals for {video}")
+                        return intervals
+                except Exception as e:
+                    print(f"Failed to parse AI response for {video}: {e}")
         
-        # Sort all intervals and trim to fit target duration if needed
-        all_intervals.sort(key=lambda x: (x.source_video, self.parse_timestamp(x.start_time)))
+        except IntervalGenerationCancelled:
+            raise
+        except Exception as e:
+            print(f"Error getting AI suggestions for {video}: {e}")
         
-        # Ensure we don't exceed target duration
-        total_selected_duration = sum(i.duration_seconds for i in all_intervals)
-        if total_selected_duration > self.total_duration:
-            print(f"Selected {total_selected_duration:.1f}s, trimming to {self.total_duration}s...")
-            # Remove intervals until we fit the target
-            running_total = 0
-            filtered_intervals = []
-            for interval in all_intervals:
-                if running_total + interval.duration_seconds <= self.total_duration:
-                    filtered_intervals.append(interval)
-                    running_total += interval.duration_seconds
-                else:
-                    break
-            all_intervals = filtered_intervals
+        # Fallback: pick the best-scoring moments locally
+        try:
+            local = self.local_intervals({video: entries}, narrative, round(video_target_duration))
+            if local:
+                print(f"Locally selected {len(local)} intervals for {video}")
+                return intervals + local
+        except Exception as e:
+            print(f"Local selection failed for {video}: {e}")
+        
+        # Last resort: evenly spaced moments
+        if video_target_duration > 0:
+            # Calculate intervals based on suggested duration
+            num_intervals = max(1, int(video_target_duration / self.suggested_interval_duration))
+            if num_intervals > 0:
+                interval_size = min(self.max_interval_duration, max(self.min_interval_duration, video_target_duration / num_intervals))
+                
+                # Select evenly distributed intervals
+                for i in range(num_intervals):
+                    start_time = (video_duration / num_intervals) * i
+                    end_time = min(start_time + interval_size, video_duration)
+                    
+                    if end_time - start_time >= self.min_interval_duration:
+                        interval = TimeInterval(
+                            start_time=self.seconds_to_timestamp(start_time),
+                            end_time=self.seconds_to_timestamp(end_time),
+                            duration_seconds=end_time - start_time,
+                            ai_description=f"Selected segment from {video}",
+                            source_video=video
+                        )
+                        intervals.append(interval)
         
-        return all_intervals
+        return intervals
+    
+    def entry_arrays(self, entries: VideoEntries) -> Tuple[np.ndarray, List[str], List[str]]:
+        """Times in seconds, kinds and texts of a video's time-sorted entries"""
+        kinds = [e.entry_type for e in entries.entries]
+        texts = [f"{e.speaker}: {e.content}" if e.speaker else e.content for e in entries.entries]
+        return entries.times, kinds, texts
     
-    def create_intervals(self, entries: List[TimestampEntry], narrative: str) -> List[TimeInterval]:
+    def local_intervals(self, video_groups: Dict[str, VideoEntries], narrative: str, target: int,
+                        use_summaries: bool = False) -> List[TimeInterval]:
+        """Select intervals totalling target seconds without AI
+        
+        With use_summaries, each interval's description is its longest transcript
+        line; otherwise it is left for generate_ai_descriptions.
+        """
+        durations = range(self.min_interval_duration, self.max_interval_duration + 1)
+        videos = {video: self.entry_arrays(entries) for video, entries in video_groups.items() if entries}
+        intervals = []
+        for candidate in select_intervals_locally(videos, narrative, target, durations):
+            description = f"Selected segment from {candidate.video}"
+            if use_summaries and candidate.summary:
+                description = candidate.summary
+            intervals.append(TimeInterval(
+                start_time=self.seconds_to_timestamp(candidate.start),
+                end_time=self.seconds_to_timestamp(candidate.end),
+                duration_seconds=float(candidate.duration),
+                ai_description=description,
+                source_video=candidate.video
+            ))
+        return intervals
+    
+    def create_intervals(self, video_groups: Dict[str, VideoEntries], narrative: str) -> List[TimeInterval]:
         """Create time intervals based on AI-suggested selections that fit target duration"""
-        if not entries:
+        if not video_groups:
             return []
         
-        # Group entries by video
-        video_groups = self.group_entries_by_video(entries)
-        
         # Get AI suggestions for optimal intervals within target duration
         all_intervals = self.get_ai_interval_suggestions(video_groups, narrative)
         
@@ -382,79 +547,117 @@ Please select the best intervals that fit these constraints. Return ONLY a JSON
         
         return all_intervals
     
-    def generate_ai_descriptions(self, intervals: List[TimeInterval], entries: List[TimestampEntry], narrative: str) -> List[TimeInterval]:
-        """Generate enhanced AI descriptions for intervals that don't already have good descriptions"""
+    def interval_context(self, interval: TimeInterval, video_groups: Dict[str, VideoEntries]) -> Tuple[str, str]:
+        """Dialogue and visual summaries of the entries inside an interval"""
+        # Get entries for this interval from the same source video
+        video_entries = video_groups.get(interval.source_video)
+        if video_entries is None:
+            return "", ""
+        interval_entries = video_entries.between(self.parse_timestamp(interval.start_time),
+                                                 self.parse_timestamp(interval.end_time))
+        
+        # Create a brief content summary for AI context
+        transcript_parts = []
+        visual_parts = []
+        
+        for entry in interval_entries[:10]:  # Limit to first 10 entries
+            if entry.entry_type == 'transcript' and entry.content:
+                speaker_prefix = f"{entry.speaker}: " if entry.speaker else ""
+                transcript_parts.append(f"{speaker_prefix}{entry.content}")
+            elif entry.entry_type == 'keyframe':
+                visual_parts.append(entry.content[:100])
+        
+        return " | ".join(transcript_parts[:5]), " | ".join(visual_parts[:2])
+    
+    def describe_batch(self, batch: List[Tuple[int, TimeInterval, str, str]], narrative: str) -> Dict[int, str]:
+        """Describe several intervals in one request. Returns descriptions by interval index"""
+        segments = "\n".join(
+            f"{index}. {interval.source_video} ({interval.start_time} to {interval.end_time}) - "
+            f"Dialogue/Audio: {transcript_text} / Visuals: {visual_text}"
+            for index, interval, transcript_text, visual_text in batch
+        )
+        prompt = f"""
+Based on this narrative context:
+"{narrative[:1000]}..."
+
+These video segments contain:
+{segments}
+
+For each segment, generate a concise, engaging description (15-25 words) of what's happening. Focus on the main action, emotion, or story beat. Make it punchy and descriptive for video editing.
+Return ONLY a JSON object mapping each segment number to its description, like:
+{{"{batch[0][0]}": "Description of the segment"}}
+"""
+        
+        with openai_request("gpt-3.5-turbo"):
+            response = self.chat_completion(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": "You are a video editor creating brief, punchy descriptions for video segments. Keep it concise and engaging. Return only valid JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=60 * len(batch) + 20,
+                temperature=0.7
+            )
+        
+        ai_response = response.choices[0].message.content or ""
+        start_idx = ai_response.find('{')
+        end_idx = ai_response.rfind('}') + 1
+        if start_idx == -1 or end_idx <= start_idx:
+            raise ValueError("No JSON object in response")
+        descriptions = json.loads(ai_response[start_idx:end_idx])
+        return {
+            int(key): value.strip() for key, value in descriptions.items()
+            if str(key).strip().isdigit() and isinstance(value, str) and value.strip()
+        }
+    
+    def generate_ai_descriptions(self, intervals: List[TimeInterval], video_groups: Dict[str, VideoEntries], narrative: str) -> List[TimeInterval]:
+        """Generate enhanced AI descriptions for intervals that don't already have good descriptions
+        
+        Pending intervals are described description_batch_size at a time, one
+        request per batch, with up to max_parallel_requests batches in flight.
+        """
         print("Enhancing AI descriptions for intervals...")
         
+        pending = []
         for i, interval in enumerate(intervals):
             # Skip if already has a good AI description from the selection process
             if interval.ai_description and len(interval.ai_description) > 10 and not interval.ai_description.startswith("Selected segment"):
                 print(f"Keeping existing description for interval {i+1}/{len(intervals)} ({interval.source_video})")
                 continue
-                
-            try:
-                # Get entries for this interval from the same source video
-                start_seconds = self.parse_timestamp(interval.start_time)
-                end_seconds = self.parse_timestamp(interval.end_time)
-                
-                interval_entries = [
-                    e for e in entries 
-                    if (e.source_video == interval.source_video and 
-                        start_seconds <= self.parse_timestamp(e.timestamp) <= end_seconds)
-                ]
-                
-                # Create a brief content summary for AI context
-                transcript_parts = []
-                visual_parts = []
-                
-                for entry in interval_entries[:10]:  # Limit to first 10 entries
-                    if entry.entry_type == 'transcript' and entry.content:
-                        speaker_prefix = f"{entry.speaker}: " if entry.speaker else ""
-                        transcript_parts.append(f"{speaker_prefix}{entry.content}")
-                    elif entry.entry_type == 'keyframe':
-                        visual_parts.append(entry.content[:100])
-                
-                transcript_text = " | ".join(transcript_parts[:5])
-                visual_text = " | ".join(visual_parts[:2])
-                
-                prompt = f"""
-Based on this narrative context:
-"{narrative[:1000]}..."
-
-This video segment from {interval.source_video} ({interval.start_time} to {interval.end_time}) contains:
-Dialogue/Audio: {transcript_text}
-Visuals: {visual_text}
-
-Generate a concise, engaging description (15-25 words) of what's happening in this segment. Focus on the main action, emotion, or story beat. Make it punchy and descriptive for video editing.
-"""
-                
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a video editor creating brief, punchy descriptions for video segments. Keep it concise and engaging."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=80,
-                    temperature=0.7
-                )
-                
-                ai_description = response.choices[0].message.content
-                if ai_description:
-                    interval.ai_description = ai_description.strip()
-                else:
-                    interval.ai_description = f"Video segment from {interval.source_video}"
-                
-                print(f"Generated description for interval {i+1}/{len(intervals)} ({interval.source_video})")
-                
-            except Exception as e:
-                print(f"Error generating AI description for interval {i+1}: {e}")
-                if not interval.ai_description:
-                    interval.ai_description = f"Video segment from {interval.source_video}"
+            pending.append((i + 1, interval, *self.interval_context(interval, video_groups)))
+        
+        batch_size = max(1, self.description_batch_size)
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        if not batches:
+            return intervals
+        
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel_requests, len(batches))))
+        try:
+            futures = {pool.submit(self.describe_batch, batch, narrative): batch for batch in batches}
+            for done, future in enumerate(as_completed(futures), start=1):
+                # Descriptions are the remaining 30% of the work
+                self.report_progress(0.7 + 0.3 * done / len(batches))
+                batch = futures[future]
+                try:
+                    descriptions = future.result()
+                except IntervalGenerationCancelled:
+                    raise
+                except Exception as e:
+                    print(f"Error generating AI descriptions for intervals {batch[0][0]}-{batch[-1][0]}: {e}")
+                    descriptions = {}
+                for index, interval, _, _ in batch:
+                    if index in descriptions:
+                        interval.ai_description = descriptions[index]
+                        print(f"Generated description for interval {index}/{len(intervals)} ({interval.source_video})")
+                    elif not interval.ai_description:
+                        interval.ai_description = f"Video segment from {interval.source_video}"
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
         
         return intervals
     
-    def save_results(self, intervals: List[TimeInterval], output_file: str):
-        """Save the intervals to a JSON file"""
+    def build_results(self, intervals: List[TimeInterval]) -> Dict:
+        """Results document for the intervals, as saved to the JSON file"""
         results = {
             "metadata": {
                 "generated_at": datetime.now().isoformat(),
@@ -462,6 +665,7 @@ Generate a concise, engaging description (15-25 words) of what's happening in th
                 "stream_directory": self.stream_dir,
                 "total_target_duration": self.total_duration,
                 "suggested_interval_duration": self.suggested_interval_duration,
+                "selection_mode": self.selection_mode,
                 "min_interval_duration": self.min_interval_duration,
                 "max_interval_duration": self.max_interval_duration,
                 "actual_total_duration": sum(i.duration_seconds for i in intervals),
@@ -480,14 +684,18 @@ Generate a concise, engaging description (15-25 words) of what's happening in th
                 "ai_description": interval.ai_description,
                 "source_video": interval.source_video
             })
-        
+        return results
+    
+    def save_results(self, intervals: List[TimeInterval], output_file: str):
+        """Save the intervals to a JSON file"""
+        results = self.build_results(intervals)
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(results, f, indent=2, ensure_ascii=False)
         
         print(f"Results saved to: {output_file}")
     
-    def generate_intervals(self, output_file: Optional[str] = None):
-        """Main method to generate intervals"""
+    def generate(self) -> List[TimeInterval]:
+        """Select and describe intervals, returning them in memory"""
         print("Reading narrative...")
         narrative = self.read_narrative()
         
@@ -497,18 +705,29 @@ Generate a concise, engaging description (15-25 words) of what's happening in th
         
         if not entries:
             print("No stream entries found!")
-            return
+            return []
+        
+        video_groups = self.group_entries_by_video(entries)
         
         print("Creating dynamic intervals based on story flow...")
-        intervals = self.create_intervals(entries, narrative)
+        intervals = self.create_intervals(video_groups, narrative)
         print(f"Created {len(intervals)} total intervals")
         
         if not intervals:
             print("No intervals created!")
-            return
+            return []
         
-        print("Generating AI descriptions...")
-        intervals = self.generate_ai_descriptions(intervals, entries, narrative)
+        if self.selection_mode == "ai":
+            print("Generating AI descriptions...")
+            intervals = self.generate_ai_descriptions(intervals, video_groups, narrative)
+        self.report_progress(1.0)
+        return intervals
+    
+    def generate_intervals(self, output_file: Optional[str] = None):
+        """Main method to generate intervals"""
+        intervals = self.generate()
+        if not intervals:
+            return
         
         # Generate output filename if not provided
         if not output_file:
@@ -537,6 +756,31 @@ Generate a concise, engaging description (15-25 words) of what's happening in th
             print(f"   {interval.ai_description}")
             print()
 
+def select_intervals(narrative: str, stream_dir: str, total_duration: int = 60, suggested_interval_duration: int = 5,
+                     progress_callback: Optional[Callable[[float], None]] = None,
+                     cancelled: Optional[Callable[[], bool]] = None,
+                     max_parallel_requests: int = MAX_PARALLEL_REQUESTS, selection_mode: str = "ai",
+                     event_loop: Optional[asyncio.AbstractEventLoop] = None) -> Dict:
+    """Generate intervals for narrative text and return the results document (metadata and intervals)
+    
+    Raises IntervalGenerationCancelled if cancelled() returns True while generating.
+    Call from a worker thread; with event_loop (a loop running in another thread)
+    OpenAI requests are awaited there with its pooled async client.
+    """
+    generator = NarrativeIntervalGenerator(
+        narrative_file=None,
+        stream_dir=stream_dir,
+        total_duration=total_duration,
+        suggested_interval_duration=suggested_interval_duration,
+        progress_callback=progress_callback,
+        narrative_text=narrative,
+        cancelled=cancelled,
+        max_parallel_requests=max_parallel_requests,
+        selection_mode=selection_mode,
+        event_loop=event_loop
+    )
+    return generator.build_results(generator.generate())
+
 def main():
     parser = argparse.ArgumentParser(description="Generate dynamic timestamp intervals from narrative and stream data")
     parser.add_argument("narrative_file", help="Path to the narrative text file")
@@ -547,6 +791,14 @@ def main():
     parser.add_argument("--interval-duration", type=int, default=5,
                        help="Suggested duration for each individual interval in seconds (default: 5s)")
     parser.add_argument("--output", "-o", help="Output JSON file path")
+    parser.add_argument("--max-parallel", type=int, default=MAX_PARALLEL_REQUESTS,
+                       help=f"AI selection/description requests to run at once (default: {MAX_PARALLEL_REQUESTS})")
+    parser.add_argument("--selection", choices=SELECTION_MODES, default="ai",
+                       help='How intervals are chosen: "ai" (OpenAI) or "local" (offline scoring, no API calls)')
+    parser.add_argument("--description-batch-size", type=int, default=DESCRIPTION_BATCH_SIZE,
+                       help=f"Intervals described per AI request (default: {DESCRIPTION_BATCH_SIZE})")
+    parser.add_argument("--progress", action="store_true",
+                       help='Print machine-readable "PROGRESS <fraction>" lines while generating')
     
     args = parser.parse_args()
     
@@ -555,7 +807,11 @@ def main():
             narrative_file=args.narrative_file,
             stream_dir=args.stream_dir,
             total_duration=args.duration,
-            suggested_interval_duration=args.interval_duration
+            suggested_interval_duration=args.interval_duration,
+            progress_callback=(lambda fraction: print(f"PROGRESS {fraction:.4f}", flush=True)) if args.progress else None,
+            max_parallel_requests=args.max_parallel,
+            description_batch_size=args.description_batch_size,
+            selection_mode=args.selection
         )
         
         generator.generate_intervals(args.output)
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Persistent CLIP embedding index covering frames from all processed videos.
+Embeddings are stored in FAISS HNSW indexes (inner product on normalized vectors,
+i.e. cosine similarity) and each row is mapped to its job, video and timestamp
+in a SQLite side table. Text queries are encoded with CLIP's text tower.
+
+The index is split into immutable shards: every add writes its vectors to a
+new shard file, so adding a video costs O(video), and other processes load
+only the shards they have not seen yet. Searches query every shard and merge
+the hits. Once there are more than MAX_SHARDS, add merges the smallest ones,
+which keeps searches fast at an amortized logarithmic rewrite cost per vector.
+HNSW graphs can't drop vectors, so removed jobs leave dead vectors behind until
+compact() drops their shards or rebuilds them from the live rows. The SQLite
+shards table lists the shard files in use and each row records its shard, so a
+crash at any point leaves the two consistent.
+"""
+
+import os
+import re
+import fcntl
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import faiss
+
+# CLIP model shared by frame embedding and text search, so both live in the same space
+CLIP_MODEL_NAME = "ViT-B/32"
+CLIP_EMBEDDING_DIM = 512
+
+# compact() rebuilds a shard once at least this fraction of its vectors belong to removed rows
+COMPACT_DEAD_FRACTION = 0.2
+
+# Vectors read back from a shard at a time while merging or compacting
+COMPACT_BLOCK = 65536
+
+# add merges the smallest shards into one once there are more than this many
+MAX_SHARDS = 16
+
+SHARD_FILE = re.compile(r"^shard_(\d+)\.faiss$")
+
+
+class KeyframeIndex:
+    """Sharded FAISS HNSW index of frame embeddings with job/video/timestamp metadata."""
+
+    def __init__(self, index_dir: str = "keyframe_index", dim: int = CLIP_EMBEDDING_DIM,
+                 hnsw_m: int = 32, ef_search: int = 64):
+        self.index_dir = index_dir
+        self.dim = dim
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        os.makedirs(index_dir, exist_ok=True)
+
+        self.db_path = os.path.join(index_dir, "frames.db")
+        self.lock_path = os.path.join(index_dir, ".lock")
+
+        self._lock = threading.Lock()
+        # Loaded shards by shard ID; shard files never change once written
+        self._shards: Dict[int, faiss.Index] = {}
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS frames (
+                    row_id INTEGER PRIMARY KEY,
+                    job_id TEXT NOT NULL,
+                    video TEXT NOT NULL,
+                    timestamp REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_frames_job ON frames (job_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS shards (
+                    shard_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    size INTEGER NOT NULL
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(frames)")}
+            if "shard_id" not in columns:
+                conn.execute("ALTER TABLE frames ADD COLUMN shard_id INTEGER")
+            # Hash of the video's content, so a job reusing another job's result can copy its frames
+            if "content_hash" not in columns:
+                conn.execute("ALTER TABLE frames ADD COLUMN content_hash TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_frames_shard ON frames (shard_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_frames_content ON frames (content_hash)")
+        self._migrate()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize index writes across processes."""
+        with open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _new_index(self):
+        index = faiss.IndexHNSWFlat(self.dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = self.ef_search
+        # Vectors are labelled with their frames row ID
+        return faiss.IndexIDMap2(index)
+
+    def shard_path(self, shard_id: int) -> str:
+        return os.path.join(self.index_dir, f"shard_{shard_id}.faiss")
+
+    def _legacy_paths(self) -> List[str]:
+        """Index files of the unsharded format: frames.faiss and compacted frames.<generation>.faiss."""
+        return [os.path.join(self.index_dir, name) for name in os.listdir(self.index_dir)
+                if re.match(r"^frames(\.\d+)?\.faiss$", name)]
+
+    def _migrate(self):
+        """Turn an index from the unsharded format into a single shard."""
+        if not self._legacy_paths():
+            return
+        with self._lock, self._file_lock():
+            legacy = self._legacy_paths()
+            if not legacy:
+                return
+            with self._connect() as conn:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+                generation = row[0] if row else 0
+                path = os.path.join(self.index_dir, f"frames.{generation}.faiss" if generation else "frames.faiss")
+                if os.path.exists(path):
+                    # Unsharded row IDs are positions in the index
+                    old = faiss.read_index(path)
+                    live = self._live_rows(conn, "shard_id IS NULL")
+                    index = self._copy_live(live, [(old, np.arange(old.ntotal, dtype=np.int64))])
+                    if index.ntotal:
+                        shard_id = self._write_shard(conn, index)
+                        conn.execute("UPDATE frames SET shard_id = ? WHERE shard_id IS NULL AND row_id < ?",
+                                     (shard_id, old.ntotal))
+                # Rows without vectors can never be found
+                conn.execute("DELETE FROM frames WHERE shard_id IS NULL")
+                conn.execute("DELETE FROM meta WHERE key = 'generation'")
+            for path in legacy:
+                os.remove(path)
+
+    def _sync(self):
+        """Load shards other processes have added and forget the ones merged or dropped since."""
+        for _ in range(3):
+            with self._connect() as conn:
+                shard_ids = {row[0] for row in conn.execute("SELECT shard_id FROM shards")}
+            for shard_id in list(self._shards):
+                if shard_id not in shard_ids:
+                    del self._shards[shard_id]
+            try:
+                for shard_id in sorted(shard_ids - set(self._shards)):
+                    shard = faiss.read_index(self.shard_path(shard_id))
+                    faiss.downcast_index(shard.index).hnsw.efSearch = self.ef_search
+                    self._shards[shard_id] = shard
+                return
+            except RuntimeError:
+                # Merged away by another process between listing and loading; list again
+                continue
+        raise RuntimeError(f"Keyframe index shards in {self.index_dir} keep changing while loading")
+
+    def _write_shard(self, conn: sqlite3.Connection, index) -> int:
+        """Write index as a new shard within conn's transaction. Returns its shard ID."""
+        shard_id = conn.execute("INSERT INTO shards (size) VALUES (?)", (index.ntotal,)).lastrowid
+        path = self.shard_path(shard_id)
+        temp_path = path + ".tmp"
+        faiss.write_index(index, temp_path)
+        os.replace(temp_path, path)
+        self._shards[shard_id] = index
+        return shard_id
+
+    def _live_rows(self, conn: sqlite3.Connection, where: str, params=()) -> np.ndarray:
+        return np.array([row[0] for row in conn.execute(f"SELECT row_id FROM frames WHERE {where}", params)],
+                        dtype=np.int64)
+
+    def _copy_live(self, live: np.ndarray, sources: Iterable) -> faiss.Index:
+        """New index holding the vectors of (index, row IDs) sources whose row ID is in live."""
+        index = self._new_index()
+        for source, ids in sources:
+            vectors = faiss.downcast_index(source.index) if isinstance(source, faiss.IndexIDMap2) else source
+            for start in range(0, source.ntotal, COMPACT_BLOCK):
+                count = min(COMPACT_BLOCK, source.ntotal - start)
+                block_ids = ids[start:start + count]
+                keep = np.isin(block_ids, live)
+                if keep.any():
+                    index.add_with_ids(vectors.reconstruct_n(start, count)[keep], block_ids[keep])
+        return index
+
+    def _merge(self, conn: sqlite3.Connection, shard_ids: List[int]) -> int:
+        """Replace shards with one shard of their live vectors. Returns the vectors dropped."""
+        shards = [self._shards[shard_id] for shard_id in shard_ids]
+        placeholders = ",".join("?" * len(shard_ids))
+        live = self._live_rows(conn, f"shard_id IN ({placeholders})", shard_ids)
+        index = self._copy_live(live, [(shard, faiss.vector_to_array(shard.id_map)) for shard in shards])
+        conn.execute(f"DELETE FROM shards WHERE shard_id IN ({placeholders})", shard_ids)
+        if index.ntotal:
+            merged = self._write_shard(conn, index)
+            conn.execute(f"UPDATE frames SET shard_id = ? WHERE shard_id IN ({placeholders})",
+                         [merged, *shard_ids])
+        for shard_id in shard_ids:
+            del self._shards[shard_id]
+        return sum(shard.ntotal for shard in shards) - index.ntotal
+
+    @contextmanager
+    def _reload_on_error(self):
+        """Forget loaded shards if a write fails, since they may include ones that never committed."""
+        try:
+            yield
+        except Exception:
+            self._shards = {}
+            raise
+
+    def _remove_unlisted_files(self, shard_ids: Iterable[int]):
+        """Delete shard files no longer listed (merged away, or left by a crash before their commit)."""
+        listed = set(shard_ids)
+        for name in os.listdir(self.index_dir):
+            match = SHARD_FILE.match(name)
+            if (match and int(match.group(1)) not in listed) or name.endswith(".faiss.tmp"):
+                try:
+                    os.remove(os.path.join(self.index_dir, name))
+                except FileNotFoundError:
+                    pass
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            self._sync()
+            return sum(shard.ntotal for shard in self._shards.values())
+
+    @property
+    def shard_count(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._shards)
+
+    def add(self, embeddings: np.ndarray, job_id: str, video: str, timestamps: List[float],
+            content_hash: Optional[str] = None) -> int:
+        """Add normalized embeddings for one video as a new shard. Returns the number of rows added.
+
+        content_hash identifies the video's content for copy_video().
+        """
+        if len(embeddings) == 0:
+            return 0
+        if len(embeddings) != len(timestamps):
+            raise ValueError("embeddings and timestamps must have the same length")
+
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with self._lock, self._file_lock(), self._reload_on_error():
+            self._sync()
+            self._add_shard(vectors, job_id, video, timestamps, content_hash)
+        return len(vectors)
+
+    def copy_video(self, content_hash: str, job_id: str, video: str) -> int:
+        """Index another job's frames of the video with content_hash again, under job_id and video.
+
+        Used when a job reuses an earlier job's processed result instead of
+        embedding the video itself. Returns the number of rows added: 0 when no
+        live job has frames for that content.
+        """
+        with self._lock, self._file_lock(), self._reload_on_error():
+            self._sync()
+            with self._connect() as conn:
+                source = conn.execute(
+                    "SELECT job_id, video FROM frames WHERE content_hash = ? ORDER BY row_id DESC LIMIT 1",
+                    (content_hash,)
+                ).fetchone()
+                if source is None:
+                    return 0
+                rows = conn.execute(
+                    "SELECT row_id, timestamp, shard_id FROM frames "
+                    "WHERE content_hash = ? AND job_id = ? AND video = ? ORDER BY row_id",
+                    (content_hash, *source)
+                ).fetchall()
+            if not rows:
+                return 0
+            vectors = np.stack([self._shards[shard_id].reconstruct(row_id) for row_id, _, shard_id in rows])
+            self._add_shard(vectors, job_id, video, [ts for _, ts, _ in rows], content_hash)
+        return len(rows)
+
+    def _add_shard(self, vectors: np.ndarray, job_id: str, video: str, timestamps: List[float],
+                   content_hash: Optional[str]):
+        """Write vectors as a new shard and insert their rows; the caller holds both locks."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'next_row'").fetchone()
+            first_row = max(row[0] if row else 0,
+                            conn.execute("SELECT COALESCE(MAX(row_id) + 1, 0) FROM frames").fetchone()[0])
+            row_ids = np.arange(first_row, first_row + len(vectors), dtype=np.int64)
+            index = self._new_index()
+            index.add_with_ids(vectors, row_ids)
+            # The shard file is in place before the rows that refer to it commit
+            shard_id = self._write_shard(conn, index)
+            conn.executemany(
+                "INSERT INTO frames (row_id, job_id, video, timestamp, shard_id, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(int(r), job_id, video, float(ts), shard_id, content_hash) for r, ts in zip(row_ids, timestamps)]
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('next_row', ?)",
+                         (first_row + len(vectors),))
+            if len(self._shards) > MAX_SHARDS:
+                smallest = sorted(self._shards, key=lambda s: self._shards[s].ntotal)
+                self._merge(conn, smallest[:len(smallest) - MAX_SHARDS // 2 + 1])
+            shard_ids = list(self._shards)
+        self._remove_unlisted_files(shard_ids)
+
+    def remove_job(self, job_id: str) -> int:
+        """Drop a job's rows from search results. Its vectors stay in their shards until compact()."""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM frames WHERE job_id = ?", (job_id,)).rowcount
+
+    def compact(self, min_dead_fraction: float = COMPACT_DEAD_FRACTION) -> int:
+        """Drop shards without live rows and rebuild those with enough dead vectors. Returns the vectors dropped."""
+        with self._lock, self._file_lock(), self._reload_on_error():
+            self._sync()
+            dropped = 0
+            with self._connect() as conn:
+                live = dict(conn.execute(
+                    "SELECT shard_id, COUNT(*) FROM frames WHERE shard_id IS NOT NULL GROUP BY shard_id"
+                ).fetchall())
+                for shard_id, shard in list(self._shards.items()):
+                    dead = shard.ntotal - live.get(shard_id, 0)
+                    if dead and dead >= shard.ntotal * min_dead_fraction:
+                        dropped += self._merge(conn, [shard_id])
+                shard_ids = list(self._shards)
+            self._remove_unlisted_files(shard_ids)
+        return dropped
+
+    def clear(self):
+        """Remove every row and vector."""
+        with self._lock, self._file_lock():
+            with self._connect() as conn:
+                conn.execute("DELETE FROM frames")
+                conn.execute("DELETE FROM shards")
+            self._shards = {}
+            self._remove_unlisted_files([])
+
+    def search(self, query: np.ndarray, k: int = 10, job_id: Optional[str] = None) -> List[Dict]:
+        """Return the top-k frames most similar to a normalized query embedding."""
+        query = np.asarray(query, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            self._sync()
+            total = sum(shard.ntotal for shard in self._shards.values())
+            if total == 0:
+                return []
+            # Over-fetch to make room for removed rows and job filtering
+            fetch = min(total, k * (10 if job_id else 4))
+            hits = []
+            for shard in self._shards.values():
+                if shard.ntotal == 0:
+                    continue
+                scores, row_ids = shard.search(query, min(fetch, shard.ntotal))
+                hits.extend((int(r), float(s)) for r, s in zip(row_ids[0], scores[0]) if r != -1)
+
+        hits = sorted(hits, key=lambda hit: -hit[1])[:fetch]
+        if not hits:
+            return []
+
+        placeholders = ",".join("?" * len(hits))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT row_id, job_id, video, timestamp FROM frames WHERE row_id IN ({placeholders})",
+                [r for r, _ in hits]
+            ).fetchall()
+        metadata = {row[0]: row[1:] for row in rows}
+
+        results = []
+        for row_id, score in hits:
+            if row_id not in metadata:
+                continue
+            row_job, video, timestamp = metadata[row_id]
+            if job_id and row_job != job_id:
+                continue
+            results.append({"job_id": row_job, "video": video, "timestamp": timestamp, "score": score})
+            if len(results) == k:
+                break
+        return results
+
+
+class ClipTextEncoder:
+    """Lazily loaded CLIP text tower for encoding search queries."""
+
+    def __init__(self, model_name: str = CLIP_MODEL_NAME):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        import torch
+        import clip
+        with self._lock:
+            if self._model is None:
+                self.device = "cuda" if torch.cuda.is_available() else "cpu"
+                self._model, _ = clip.load(self.model_name, device=self.device)
+        return self._model
+
+    def encode(self, text: str) -> np.ndarray:
+        """Return the normalized CLIP embedding of a text query."""
+        import torch
+        import clip
+        model = self._model or self._load()
+        tokens = clip.tokenize([text], truncate=True).to(self.device)
+        with torch.no_grad():
+            features = model.encode_text(tokens)
+            features = features / features.norm(dim=-1, keepdim=True)
+        return features.cpu().numpy().astype(np.float32).flatten()
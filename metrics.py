@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Minimal Prometheus-compatible metrics for the API and the processing pipeline.
+
+Counters, gauges and histograms live in a process-local registry and are
+rendered in the Prometheus text exposition format. Recording a value is a
+dict lookup and an addition under a lock, so instrumentation is safe on hot
+paths. Worker processes ship their counter and histogram increments to the
+API process with drain()/merge().
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+        self._unshipped: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+            self._unshipped[key] = self._unshipped.get(key, 0) + amount
+
+    def drain(self) -> Dict[Tuple, float]:
+        with self._lock:
+            delta, self._unshipped = self._unshipped, {}
+        return delta
+
+    def merge(self, delta: Dict[Tuple, float]):
+        with self._lock:
+            for key, amount in delta.items():
+                self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(Metric):
+    """Point-in-time value, either set directly or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, callback: Optional[Callable[[], float]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        if self.callback is not None:
+            return [f"{self.name} {self.callback()}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple, list] = {}
+        self._unshipped: Dict[Tuple, list] = {}
+
+    def _new(self) -> list:
+        return [[0] * (len(self.buckets) + 1), 0.0]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            for series in (self._values, self._unshipped):
+                entry = series.get(key)
+                if entry is None:
+                    entry = series[key] = self._new()
+                entry[0][index] += 1
+                entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def drain(self) -> Dict[Tuple, list]:
+        with self._lock:
+            delta, self._unshipped = self._unshipped, {}
+        return delta
+
+    def merge(self, delta: Dict[Tuple, list]):
+        with self._lock:
+            for key, (counts, total) in delta.items():
+                entry = self._values.get(key)
+                if entry is None:
+                    entry = self._values[key] = self._new()
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def drain(self) -> Dict[str, Dict]:
+        """Increments recorded since the last drain, for shipping to another process."""
+        deltas = {}
+        for name, metric in self._metrics.items():
+            if isinstance(metric, (Counter, Histogram)):
+                delta = metric.drain()
+                if delta:
+                    deltas[name] = delta
+        return deltas
+
+    def merge(self, deltas: Dict[str, Dict]):
+        """Add increments drained in another process."""
+        for name, delta in deltas.items():
+            metric = self._metrics.get(name)
+            if isinstance(metric, (Counter, Histogram)):
+                metric.merge(delta)
+
+
+REGISTRY = Registry()
+
+# Pipeline and API series
+JOB_STAGE_SECONDS = Histogram(
+    "ezcut_job_stage_seconds", "Duration of job stages (upload, process, narrative, intervals, cut)", ["stage"]
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    "ezcut_pipeline_stage_seconds", "Duration of VideoProcessor stages per video", ["stage"]
+)
+OPENAI_REQUEST_SECONDS = Histogram(
+    "ezcut_openai_request_seconds", "OpenAI request latency", ["model"]
+)
+OPENAI_ERRORS = Counter(
+    "ezcut_openai_errors_total", "Failed OpenAI requests", ["model", "error"]
+)
+FFMPEG_SECONDS = Histogram(
+    "ezcut_ffmpeg_seconds", "Duration of ffmpeg runs", ["operation"]
+)
+BYTES_UPLOADED = Counter("ezcut_uploaded_bytes_total", "Video bytes received from clients")
+BYTES_SERVED = Counter("ezcut_served_bytes_total", "Video bytes sent to clients", ["endpoint"])
+
+
+@contextmanager
+def openai_request(model: str):
+    """Time an OpenAI request and count it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        OPENAI_ERRORS.inc(model=model, error=type(e).__name__)
+        raise
+    finally:
+        OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - start, model=model)
@@ -1,10 +1,14 @@
 import os
-import openai
 import glob
 import sys
 import argparse
 from datetime import datetime
 
+# Add parent directory to path to import metrics and the shared OpenAI client
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import openai_request
+from openai_pool import get_client
+
 def read_file_raw(file_path: str) -> str:
     """Read the entire file as raw text."""
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -34,13 +38,8 @@ def read_folder_raw(folder_path: str) -> str:
 
 def generate_narrative(file_content: str, api_key: str = None) -> str:
     """Generate narrative using OpenAI API with raw file content."""
-    if api_key:
-        client = openai.OpenAI(api_key=api_key)
-    else:
-        client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    
-    if not client.api_key:
-        raise ValueError("OpenAI API key not found. Set OPENAI_API_KEY environment variable or pass api_key parameter.")
+    # Shared per-process client, so repeated calls reuse warm connections
+    client = get_client(api_key)
     
     prompt = f"""Based on this video content (keyframes and transcripts from multiple files), create a short, engaging summary (2-3 paragraphs) that captures the essence of this stream/vlog content. Do not use nouns. Make it entertaining and conversational:
 
@@ -49,15 +48,16 @@ def generate_narrative(file_content: str, api_key: str = None) -> str:
 Create a short narrative that flows naturally from this content:"""
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a creative writer who creates engaging, short-form narratives from video content. Keep responses concise and entertaining."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=300,
-            temperature=0.7
-        )
+        with openai_request("gpt-4o-mini"):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "You are a creative writer who creates engaging, short-form narratives from video content. Keep responses concise and entertaining."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=300,
+                temperature=0.7
+            )
         return response.choices[0].message.content
     except Exception as e:
         return f"Error generating narrative: {str(e)}"
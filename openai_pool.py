@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Process-wide OpenAI clients sharing one pooled HTTP connection pool.
+
+Creating an OpenAI client per call opens a new connection pool each time, so
+every request pays a fresh TCP and TLS handshake. get_client() returns one
+client per API key and process, with keep-alive connections, explicit
+timeouts and bounded retries, so concurrent callers in the same process
+reuse warm connections. get_async_client() does the same for asyncio code,
+one client per event loop, with the same limits and timeouts.
+"""
+
+import os
+import asyncio
+import threading
+import weakref
+from typing import Dict, Optional
+
+import httpx
+import openai
+
+# Connections kept open per client, and how many of them may sit idle between requests
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "16"))
+# Seconds an idle connection is kept for reuse
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+# Overall request timeout (completions can take a while) and connect timeout, in seconds
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+_lock = threading.Lock()
+_clients: Dict[str, openai.OpenAI] = {}
+_clients_pid: Optional[int] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, openai.AsyncOpenAI]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY)
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+
+
+def _resolve_key(api_key: Optional[str]) -> str:
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OpenAI API key not found. Set OPENAI_API_KEY environment variable or pass api_key.")
+    return api_key
+
+
+def _reset_after_fork():
+    """Drop clients inherited from a parent process: pooled sockets must not be shared with a forked child."""
+    global _clients_pid
+    if _clients_pid != os.getpid():
+        _clients.clear()
+        _async_clients.clear()
+        _clients_pid = os.getpid()
+
+
+def get_client(api_key: Optional[str] = None) -> openai.OpenAI:
+    """Shared synchronous client for api_key (default: OPENAI_API_KEY). Thread-safe."""
+    api_key = _resolve_key(api_key)
+    with _lock:
+        _reset_after_fork()
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = openai.OpenAI(
+                api_key=api_key,
+                timeout=_timeout(),
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=httpx.Client(limits=_limits(), timeout=_timeout()),
+            )
+        return client
+
+
+
+def get_async_client(api_key: Optional[str] = None) -> openai.AsyncOpenAI:
+    """Shared async client for api_key (default: OPENAI_API_KEY) on the running event loop."""
+    api_key = _resolve_key(api_key)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        _reset_after_fork()
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(api_key)
+        if client is None:
+            client = clients[api_key] = openai.AsyncOpenAI(
+                api_key=api_key,
+                timeout=_timeout(),
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout()),
+            )
+        return client
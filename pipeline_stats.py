@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and throughput instrumentation for the video processing pipeline.
+Records wall time, CPU time, item counts, throughput and peak RSS for each stage
+and serializes them as a JSON report.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from metrics import PIPELINE_STAGE_SECONDS
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Return the peak resident set size of this process in MB, if available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    if sys.platform == "darwin":
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+def stats_path_for(output_path: str) -> str:
+    """Return the report path written next to a pipeline output file."""
+    return os.path.splitext(output_path)[0] + ".stats.json"
+
+
+class PipelineStats:
+    """Collects per-stage measurements for one pipeline run."""
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.stages: List[Dict] = []
+        self.started_at = datetime.now()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0):
+        """Time a stage. Set record['items'] inside the block to report throughput."""
+        record = {"stage": name, "items": items}
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - wall_start
+            PIPELINE_STAGE_SECONDS.observe(wall, stage=name)
+            record["wall_seconds"] = round(wall, 4)
+            record["cpu_seconds"] = round(time.process_time() - cpu_start, 4)
+            record["items_per_second"] = round(record["items"] / wall, 3) if wall > 0 else None
+            record["peak_rss_mb"] = peak_rss_mb()
+            self.stages.append(record)
+
+    def report(self) -> Dict:
+        """Return the collected measurements as a JSON-serializable dict."""
+        return {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "total_wall_seconds": round(time.perf_counter() - self._wall_start, 4),
+            "total_cpu_seconds": round(time.process_time() - self._cpu_start, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": self.stages,
+        }
+
+    def save(self, path: str) -> Dict:
+        """Write the report to a JSON file and return it."""
+        report = self.report()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        return report
@@ -0,0 +1,54 @@
+"""
+Unit tests for cut_video_segments. Run with: python -m pytest test_cut_video_segments.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+from cut_video_segments import CANCEL_POLL_SECONDS, run_ffmpeg_command
+
+# Stands in for a long ffmpeg run that prints nothing: records its PID, then sleeps
+SLOW_COMMAND = [sys.executable, "-c", "import os, sys, time; open(sys.argv[1], 'w').write(str(os.getpid())); time.sleep(60)"]
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # Reaped children are gone; anything else would be left behind
+    with open(f"/proc/{pid}/stat") as f:
+        return f.read().split(") ", 1)[1][0] != "Z"
+
+
+def test_cancel_stops_the_process_promptly(tmp_path):
+    pid_file = tmp_path / "pid"
+    cancel = threading.Event()
+    result = {}
+
+    def run():
+        result["ok"] = run_ffmpeg_command(SLOW_COMMAND + [str(pid_file)], cancelled=cancel.is_set)
+
+    runner = threading.Thread(target=run)
+    runner.start()
+    deadline = time.monotonic() + 10
+    while not (pid_file.exists() and pid_file.read_text()) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pid = int(pid_file.read_text())
+
+    cancelled_at = time.monotonic()
+    cancel.set()
+    runner.join(timeout=5)
+
+    assert not runner.is_alive()
+    assert time.monotonic() - cancelled_at < 1 + CANCEL_POLL_SECONDS
+    assert result["ok"] is False
+    assert not process_alive(pid)
+
+
+def test_successful_command():
+    assert run_ffmpeg_command([sys.executable, "-c", "pass"], cancelled=lambda: False)
+    assert run_ffmpeg_command([sys.executable, "-c", "pass"])
+    assert not run_ffmpeg_command([sys.executable, "-c", "raise SystemExit(1)"])
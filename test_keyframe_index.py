@@ -0,0 +1,154 @@
+"""
+Unit tests for keyframe_index. Run with: python -m pytest test_keyframe_index.py
+"""
+
+import os
+import sqlite3
+
+import faiss
+import numpy as np
+import pytest
+
+import keyframe_index
+from keyframe_index import KeyframeIndex
+
+DIM = 16
+
+
+def vectors(count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    v = rng.standard_normal((count, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    return str(tmp_path / "keyframe_index")
+
+
+def add_video(index, job_id, video, count, seed):
+    v = vectors(count, seed)
+    index.add(v, job_id, video, [float(i) for i in range(count)])
+    return v
+
+
+def shard_files(index_dir):
+    return sorted(name for name in os.listdir(index_dir) if name.endswith(".faiss"))
+
+
+def test_each_add_writes_one_new_shard(index_dir):
+    index = KeyframeIndex(index_dir, dim=DIM)
+    add_video(index, "a", "one.mp4", 20, 0)
+    before = {name: os.path.getmtime(os.path.join(index_dir, name)) for name in shard_files(index_dir)}
+    b = add_video(index, "b", "two.mp4", 10, 1)
+
+    # Existing shards are left untouched
+    assert all(os.path.getmtime(os.path.join(index_dir, name)) == mtime for name, mtime in before.items())
+    assert len(shard_files(index_dir)) == 2
+    assert index.size == 30
+    hit = index.search(b[3], k=1)[0]
+    assert (hit["job_id"], hit["video"], hit["timestamp"]) == ("b", "two.mp4", 3.0)
+
+
+def test_other_instances_load_new_shards(index_dir):
+    writer, reader = KeyframeIndex(index_dir, dim=DIM), KeyframeIndex(index_dir, dim=DIM)
+    add_video(writer, "a", "one.mp4", 10, 0)
+    assert reader.size == 10
+    loaded = dict(reader._shards)
+
+    b = add_video(writer, "b", "two.mp4", 10, 1)
+    assert reader.search(b[0], k=1)[0]["job_id"] == "b"
+    # Shards already loaded are kept as they are
+    assert all(reader._shards[shard_id] is shard for shard_id, shard in loaded.items())
+
+
+def test_small_shards_are_merged(index_dir, monkeypatch):
+    monkeypatch.setattr(keyframe_index, "MAX_SHARDS", 4)
+    index = KeyframeIndex(index_dir, dim=DIM)
+    added = [add_video(index, f"job{i}", "video.mp4", 5, i) for i in range(9)]
+
+    assert index.shard_count <= 4
+    assert len(shard_files(index_dir)) == index.shard_count
+    assert index.size == 45
+    for i, v in enumerate(added):
+        assert index.search(v[2], k=1)[0]["job_id"] == f"job{i}"
+
+
+def test_remove_and_compact(index_dir):
+    index = KeyframeIndex(index_dir, dim=DIM)
+    a = add_video(index, "a", "one.mp4", 20, 0)
+    b = add_video(index, "b", "two.mp4", 20, 1)
+    index.remove_job("a")
+    assert all(hit["job_id"] == "b" for hit in index.search(a[0], k=5))
+
+    reader = KeyframeIndex(index_dir, dim=DIM)
+    assert index.compact() == 20
+    assert index.size == 20 and index.shard_count == 1
+    assert reader.search(b[4], k=1)[0]["timestamp"] == 4.0
+    # Nothing left to drop
+    assert index.compact() == 0
+
+
+def test_compact_rebuilds_partly_dead_shards(index_dir):
+    index = KeyframeIndex(index_dir, dim=DIM)
+    v = vectors(10, 0)
+    index.add(v[:5], "a", "one.mp4", [0, 1, 2, 3, 4])
+    index.add(v[5:], "b", "one.mp4", [5, 6, 7, 8, 9])
+    with index._connect() as conn:
+        conn.execute("DELETE FROM frames WHERE job_id = 'b' AND timestamp >= 8")
+
+    assert index.compact(min_dead_fraction=0.5) == 0
+    assert index.compact(min_dead_fraction=0.3) == 2
+    assert index.size == 8
+    assert index.search(v[6], k=1)[0]["timestamp"] == 6.0
+
+
+def test_clear(index_dir):
+    index = KeyframeIndex(index_dir, dim=DIM)
+    add_video(index, "a", "one.mp4", 5, 0)
+    index.clear()
+
+    assert index.size == 0 and shard_files(index_dir) == []
+    assert index.search(vectors(1, 0)[0]) == []
+
+
+def test_unsharded_index_is_migrated(index_dir):
+    # Index and rows as written before sharding: row IDs are positions in frames.faiss
+    os.makedirs(index_dir)
+    v = vectors(6, 0)
+    old = faiss.IndexHNSWFlat(DIM, 32, faiss.METRIC_INNER_PRODUCT)
+    old.add(v)
+    faiss.write_index(old, os.path.join(index_dir, "frames.faiss"))
+    conn = sqlite3.connect(os.path.join(index_dir, "frames.db"))
+    conn.execute("CREATE TABLE frames (row_id INTEGER PRIMARY KEY, job_id TEXT NOT NULL, video TEXT NOT NULL, "
+                 "timestamp REAL NOT NULL)")
+    conn.executemany("INSERT INTO frames VALUES (?, ?, ?, ?)", [(i, "old", "one.mp4", float(i)) for i in range(5)])
+    conn.commit()
+    conn.close()
+
+    index = KeyframeIndex(index_dir, dim=DIM)
+
+    assert shard_files(index_dir) == ["shard_1.faiss"]
+    # The vector without a row is dropped
+    assert index.size == 5
+    assert index.search(v[3], k=1)[0]["timestamp"] == 3.0
+    new = add_video(index, "new", "two.mp4", 3, 1)
+    assert index.size == 8
+    assert index.search(new[1], k=1)[0]["job_id"] == "new"
+    assert index.search(v[0], k=1)[0]["job_id"] == "old"
+
+
+def test_copy_video_indexes_frames_under_the_new_job(index_dir):
+    index = KeyframeIndex(index_dir, dim=DIM)
+    v = vectors(6, 0)
+    index.add(v, "first", "clip.mp4", [float(i) for i in range(6)], content_hash="abc")
+
+    assert index.copy_video("abc", "second", "clip.mp4") == 6
+    assert index.copy_video("unknown", "second", "clip.mp4") == 0
+    assert index.search(v[2], k=1, job_id="second")[0]["timestamp"] == 2.0
+
+    # The copy outlives the job it came from
+    index.remove_job("first")
+    index.compact()
+    assert [hit["job_id"] for hit in index.search(v[4], k=1)] == ["second"]
+    assert index.copy_video("abc", "third", "clip.mp4") == 6
@@ -0,0 +1,136 @@
+"""
+Unit tests for local_interval_selection. Run with: python -m pytest test_local_interval_selection.py
+"""
+
+import numpy as np
+import pytest
+
+from local_interval_selection import Candidate, pack_intervals, score_windows, select_intervals_locally
+
+DURATIONS = range(3, 8)
+
+
+def make_video(n_entries: int, step: float = 2.0, seed: int = 0):
+    """Entries every step seconds: a keyframe every fifth, transcript lines otherwise."""
+    rng = np.random.default_rng(seed)
+    words = "race car pit stop missile defense iron dome crowd cheers driver team".split()
+    times = np.arange(n_entries) * step
+    kinds = ["keyframe" if i % 5 == 0 else "transcript" for i in range(n_entries)]
+    texts = [" ".join(rng.choice(words, 6)) for _ in range(n_entries)]
+    return times, kinds, texts
+
+
+def assert_valid(chosen, videos, durations=DURATIONS):
+    by_video = {}
+    for candidate in chosen:
+        assert candidate.duration in durations
+        times = videos[candidate.video][0]
+        assert 0 <= candidate.start and candidate.end <= times[-1]
+        by_video.setdefault(candidate.video, []).append(candidate)
+    for candidates in by_video.values():
+        # Time order within a video, and no overlaps
+        for before, after in zip(candidates, candidates[1:]):
+            assert before.end <= after.start
+
+
+@pytest.mark.parametrize("target", [3, 10, 37, 60, 121])
+def test_hits_target_exactly_without_overlaps(target):
+    videos = {f"part{i}": make_video(300, seed=i) for i in range(3)}
+    chosen = select_intervals_locally(videos, "missile defense and the iron dome", target, DURATIONS)
+
+    assert sum(c.duration for c in chosen) == target
+    assert_valid(chosen, videos)
+
+
+def test_keeps_video_order():
+    videos = {name: make_video(200, seed=i) for i, name in enumerate(["part2", "part1", "part3"])}
+    chosen = select_intervals_locally(videos, "crowd cheers", 90, DURATIONS)
+
+    order = [c.video for c in chosen]
+    assert order == sorted(order, key=list(videos).index)
+
+
+def test_unreachable_target_uses_largest_total_below_it():
+    # 10 seconds of content holds at most one 7s window, or a 3s and a 7s one back to back
+    videos = {"part1": make_video(6)}
+    chosen = select_intervals_locally(videos, "race car", 60, DURATIONS)
+
+    assert sum(c.duration for c in chosen) == 10
+    assert_valid(chosen, videos)
+
+
+def test_pack_prefers_higher_scores():
+    candidates = {
+        "a": [Candidate("a", 0, 5, 1.0, 0, 0), Candidate("a", 10, 15, 5.0, 0, 0), Candidate("a", 12, 17, 4.0, 0, 0)],
+        "b": [Candidate("b", 0, 5, 3.0, 0, 0), Candidate("b", 20, 25, 0.5, 0, 0)],
+    }
+    chosen = pack_intervals(candidates, 10)
+
+    assert [(c.video, c.start) for c in chosen] == [("a", 10), ("b", 0)]
+
+
+def test_pack_never_overlaps_within_a_video():
+    # The two best windows overlap, so only one of them can be used
+    candidates = {"a": [Candidate("a", 0, 6, 10.0, 0, 0), Candidate("a", 3, 9, 10.0, 0, 0),
+                        Candidate("a", 20, 26, 1.0, 0, 0)]}
+    chosen = pack_intervals(candidates, 12)
+
+    assert [(c.start, c.end) for c in chosen] in ([(0, 6), (20, 26)], [(3, 9), (20, 26)])
+
+
+def test_pack_zero_target_and_empty_input():
+    assert pack_intervals({"a": [Candidate("a", 0, 5, 1.0, 0, 0)]}, 0) == []
+    assert pack_intervals({}, 30) == []
+
+
+def test_score_windows_stays_inside_video():
+    times, kinds, texts = make_video(50)
+    candidates = score_windows("part1", times, kinds, texts, "iron dome", float(times[-1]), DURATIONS)
+
+    assert candidates
+    assert all(c.end <= times[-1] and c.duration in DURATIONS for c in candidates)
+    # Entry ranges match the window bounds
+    for c in candidates:
+        assert all(c.start <= t < c.end for t in times[c.first_entry:c.last_entry])
+
+
+def test_stop_word_only_text_still_selects():
+    times = np.arange(40) * 1.0
+    videos = {"part1": (times, ["transcript"] * 40, ["the and of"] * 40)}
+    chosen = select_intervals_locally(videos, "the", 12, DURATIONS)
+
+    assert sum(c.duration for c in chosen) == 12
+
+
+def test_summary_prefers_transcript_lines():
+    times = np.arange(20) * 1.0
+    kinds = ["keyframe"] * 20
+    kinds[4] = "transcript"
+    texts = ["a long visual description of the scene"] * 20
+    texts[4] = "short line"
+    # The window must cover all 20 seconds, so it contains the transcript line
+    chosen = select_intervals_locally({"part1": (times, kinds, texts)}, "line", 19, [19])
+
+    assert [(c.start, c.end) for c in chosen] == [(0, 19)]
+    assert chosen[0].summary == "short line"
+
+
+def test_empty_transcript_line_does_not_leak_into_summary(tmp_path):
+    from generate_narrative_intervals import NarrativeIntervalGenerator
+
+    stream_file = tmp_path / "part1_processed.txt"
+    stream_file.write_text("[transcript:00:00:01] \n"
+                           "[transcript:00:00:02] the crowd cheers\n"
+                           "[keyframe:00:00:03] A race car in the pit lane\n"
+                           "[transcript:00:00:09] \n"
+                           "[keyframe:00:00:10] The car leaves the pit\n")
+    generator = NarrativeIntervalGenerator(None, str(tmp_path), total_duration=8, suggested_interval_duration=8,
+                                           narrative_text="crowd", selection_mode="local")
+
+    entries = generator.parse_stream_file(str(stream_file))
+    assert sorted(e.content for e in entries) == ["A race car in the pit lane", "The car leaves the pit",
+                                                  "the crowd cheers"]
+
+    intervals = generator.local_intervals(generator.group_entries_by_video(entries), "crowd", 8, use_summaries=True)
+    assert intervals
+    assert all("[" not in i.ai_description for i in intervals)
@@ -16,55 +16,243 @@ from pathlib import Path
 from PIL import Image
 import base64
 import io
-from openai import OpenAI
 from dotenv import load_dotenv
 from tqdm import tqdm
 import json
+import time
 import tempfile
+import subprocess
+import threading
 import numpy as np
 import torch
 import clip
 import faiss
 from sklearn.cluster import KMeans
-from typing import List, Tuple, Dict, Optional
+from typing import List, Dict, Optional
+from pipeline_stats import PipelineStats, stats_path_for
+from metrics import FFMPEG_SECONDS, openai_request
+from openai_pool import get_client
+from keyframe_index import KeyframeIndex, CLIP_MODEL_NAME
 
 # Load environment variables
 load_dotenv()
 
+# Whisper expects mono 16 kHz audio
+AUDIO_SAMPLE_RATE = 16000
+
+DEFAULT_IMAGE_PROMPT = """Describe this video frame in detail. Focus on:
+        - Main subjects and actions
+        - Setting/environment
+        - Key visual elements
+        - Mood/atmosphere
+        Keep the description concise but informative (2-3 sentences)."""
+
+# Assumed seconds per Vision request until real calls have been timed
+DEFAULT_DESCRIBE_LATENCY = 4.0
+
+
+class ProcessingCancelled(Exception):
+    """Raised by VideoProcessor methods once cancel() has been called."""
+
 class VideoProcessor:
-    def __init__(self, openai_api_key=None):
-        """Initialize the video processor with required models."""
-        self.openai_client = OpenAI(api_key=openai_api_key or os.getenv('OPENAI_API_KEY'))
+    def __init__(self, openai_api_key=None, ingest_mode: str = "demux", max_frame_size: int = 1024,
+                 openai_client=None, whisper_model=None, clip_model=None, clip_preprocess=None,
+                 keyframe_index: Optional[KeyframeIndex] = None):
+        """Initialize the video processor with required models.
+
+        ingest_mode selects how the container is read: "demux" decodes audio and
+        sampled frames in a single ffmpeg pass, "legacy" uses separate ffmpeg,
+        Whisper and OpenCV readers.
+        Pre-built clients and models can be passed in to skip loading the defaults.
+        If a keyframe_index is given, frame embeddings of videos processed with an
+        index_job_id are persisted into it for cross-job search.
+        """
+        if ingest_mode not in ("demux", "legacy"):
+            raise ValueError(f"Unknown ingest mode: {ingest_mode}")
+        self.ingest_mode = ingest_mode
+        self.max_frame_size = max_frame_size
+        self.openai_client = openai_client or get_client(openai_api_key)
         
         # Load Whisper model (you can change to 'base', 'small', 'medium', 'large')
-        print("Loading Whisper model...")
-        self.whisper_model = whisper.load_model("base")
+        if whisper_model is None:
+            print("Loading Whisper model...")
+            whisper_model = whisper.load_model("base")
+        self.whisper_model = whisper_model
         
         # Load CLIP model
-        print("Loading CLIP model...")
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.clip_model, self.clip_preprocess = clip.load("ViT-B/32", device=self.device)
+        if clip_model is None:
+            print("Loading CLIP model...")
+            clip_model, clip_preprocess = clip.load(CLIP_MODEL_NAME, device=self.device)
+        self.clip_model, self.clip_preprocess = clip_model, clip_preprocess
+        self.keyframe_index = keyframe_index
+        
+        # Running estimate of Vision request latency, used by budgeted keyframe selection
+        self.describe_latency = DEFAULT_DESCRIBE_LATENCY
+        
+        # Cancellation flag and the ffmpeg processes to kill when it is set
+        self._cancel_event = threading.Event()
+        self._children = set()
+        self._children_lock = threading.Lock()
+    
+    def cancel(self):
+        """Stop the current processing: kill running ffmpeg children and skip remaining work.
+        
+        Safe to call from another thread. Work in progress raises ProcessingCancelled
+        at its next check; call reset_cancel() before processing again.
+        """
+        self._cancel_event.set()
+        with self._children_lock:
+            for proc in self._children:
+                if proc.poll() is None:
+                    proc.kill()
+    
+    def reset_cancel(self):
+        self._cancel_event.clear()
+    
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise ProcessingCancelled("Processing cancelled")
+    
+    def _track_child(self, proc):
+        with self._children_lock:
+            self._children.add(proc)
+            if self._cancel_event.is_set():
+                proc.kill()
+    
+    def _untrack_child(self, proc):
+        with self._children_lock:
+            self._children.discard(proc)
         
     def extract_audio(self, video_path, output_path):
         """Extract audio from video file."""
+        proc = (
+            ffmpeg
+            .input(video_path)
+            .output(output_path, acodec='pcm_s16le', ac=1, ar='16k')
+            .overwrite_output()
+            .run_async(pipe_stdout=True, pipe_stderr=True)
+        )
+        self._track_child(proc)
         try:
-            (
-                ffmpeg
-                .input(video_path)
-                .output(output_path, acodec='pcm_s16le', ac=1, ar='16k')
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
-            )
-            return True
-        except ffmpeg.Error as e:
-            print(f"Error extracting audio: {e}")
+            with FFMPEG_SECONDS.time(operation="extract_audio"):
+                _, stderr = proc.communicate()
+        finally:
+            self._untrack_child(proc)
+        self.check_cancelled()
+        if proc.returncode != 0:
+            print(f"Error extracting audio: {stderr.decode(errors='replace').strip()}")
             return False
+        return True
     
-    def transcribe_audio(self, audio_path):
-        """Transcribe audio using Whisper with timestamps."""
-        result = self.whisper_model.transcribe(audio_path, word_timestamps=True)
+    def transcribe_audio(self, audio):
+        """Transcribe audio (file path or 16 kHz float32 samples) using Whisper with timestamps."""
+        result = self.whisper_model.transcribe(audio, word_timestamps=True)
         return result
     
+    def demux_video(self, video_path, sample_rate=1.0):
+        """Decode audio and sampled frames from a video in a single ffmpeg pass.
+        
+        ffmpeg writes 16 kHz mono PCM to an extra pipe and fps-limited, downscaled
+        PPM frames to stdout, so the container is parsed and demuxed only once.
+        Returns (audio, frames_data) where audio is a float32 array ready for Whisper.
+        """
+        audio_read_fd, audio_write_fd = os.pipe()
+        size = self.max_frame_size
+        video_filter = (f"fps={sample_rate},"
+                        f"scale=w='min({size},iw)':h='min({size},ih)':force_original_aspect_ratio=decrease")
+        cmd = [
+            'ffmpeg', '-nostdin', '-v', 'error', '-i', video_path,
+            # Output 1: raw PCM for Whisper on the extra pipe
+            '-map', '0:a:0', '-ac', '1', '-ar', str(AUDIO_SAMPLE_RATE), '-f', 's16le', f'pipe:{audio_write_fd}',
+            # Output 2: sampled frames as self-describing PPM images on stdout
+            '-map', '0:v:0', '-vf', video_filter, '-f', 'image2pipe', '-c:v', 'ppm', 'pipe:1',
+        ]
+        
+        started = time.perf_counter()
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    pass_fds=(audio_write_fd,))
+        finally:
+            os.close(audio_write_fd)
+        self._track_child(proc)
+        
+        audio_chunks = []
+        stderr_chunks = []
+        
+        def drain(fileobj, chunks):
+            with fileobj:
+                for chunk in iter(lambda: fileobj.read(1 << 16), b''):
+                    chunks.append(chunk)
+        
+        readers = [
+            threading.Thread(target=drain, args=(os.fdopen(audio_read_fd, 'rb'), audio_chunks), daemon=True),
+            threading.Thread(target=drain, args=(proc.stderr, stderr_chunks), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        
+        print(f"Demuxing audio and frames (sample rate: {sample_rate} fps)...")
+        frames_data = []
+        try:
+            with tqdm() as pbar:
+                while True:
+                    frame = self._read_ppm_frame(proc.stdout)
+                    if frame is None:
+                        break
+                    frame_index = len(frames_data)
+                    frames_data.append({
+                        'timestamp': frame_index / sample_rate,
+                        'frame': frame,
+                        'frame_index': frame_index
+                    })
+                    pbar.update(1)
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+            FFMPEG_SECONDS.observe(time.perf_counter() - started, operation="demux")
+            self._untrack_child(proc)
+            for reader in readers:
+                reader.join()
+        
+        self.check_cancelled()
+        if returncode != 0:
+            raise Exception(f"ffmpeg demux failed: {b''.join(stderr_chunks).decode(errors='replace').strip()}")
+        
+        pcm = np.frombuffer(b''.join(audio_chunks), dtype=np.int16)
+        audio = pcm.astype(np.float32) / 32768.0
+        return audio, frames_data
+    
+    @staticmethod
+    def _read_ppm_frame(stream):
+        """Read one binary PPM (P6) image from a stream as a BGR array, or None at EOF."""
+        header = []
+        # Magic, width, height and maxval are whitespace separated tokens
+        while len(header) < 4:
+            token = b''
+            while True:
+                char = stream.read(1)
+                if not char:
+                    return None
+                if char.isspace():
+                    if token:
+                        break
+                    continue
+                token += char
+            header.append(token)
+        
+        if header[0] != b'P6':
+            raise ValueError(f"Unexpected frame format from ffmpeg: {header[0]!r}")
+        width, height = int(header[1]), int(header[2])
+        size = width * height * 3
+        data = stream.read(size)
+        if len(data) < size:
+            return None
+        
+        rgb = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+        # Keep the OpenCV BGR convention used by the rest of the pipeline
+        return np.ascontiguousarray(rgb[:, :, ::-1])
+    
     def extract_frames_for_analysis(self, video_path, sample_rate=2.0):
         """Extract frames from video for CLIP analysis at specified sample rate (frames per second)."""
         cap = cv2.VideoCapture(video_path)
@@ -80,7 +268,7 @@ class VideoProcessor:
         with tqdm(total=total_frames // frame_interval) as pbar:
             while True:
                 ret, frame = cap.read()
-                if not ret:
+                if not ret or self._cancel_event.is_set():
                     break
                     
                 if frame_count % frame_interval == 0:
@@ -95,6 +283,7 @@ class VideoProcessor:
                 frame_count += 1
         
         cap.release()
+        self.check_cancelled()
         return frames_data
     
     def generate_clip_embeddings(self, frames_data: List[Dict]) -> np.ndarray:
@@ -168,6 +357,7 @@ class VideoProcessor:
             keyframe_data['cluster_id'] = cluster_id
             keyframe_data['cluster_size'] = len(cluster_indices)
             keyframe_data['similarity_score'] = similarities[best_frame_idx_in_cluster]
+            keyframe_data['embedding'] = embeddings[best_frame_idx]
             
             keyframes.append(keyframe_data)
         
@@ -178,20 +368,37 @@ class VideoProcessor:
         return keyframes
     
     def extract_intelligent_keyframes(self, video_path, sample_rate=1.0, n_clusters: Optional[int] = None, 
-                                    similarity_threshold=0.8):
+                                    similarity_threshold=0.8, frames_data: Optional[List[Dict]] = None,
+                                    stats: Optional[PipelineStats] = None, index_job_id: Optional[str] = None,
+                                    index_content_hash: Optional[str] = None):
         """Extract keyframes using CLIP embeddings and FAISS clustering."""
-        # Extract frames for analysis
-        frames_data = self.extract_frames_for_analysis(video_path, sample_rate)
+        stats = stats or PipelineStats()
+        
+        # Extract frames for analysis unless they were already decoded during ingest
+        if frames_data is None:
+            with stats.stage("sample") as stage:
+                frames_data = self.extract_frames_for_analysis(video_path, sample_rate)
+                stage["items"] = len(frames_data)
         
         if not frames_data:
             print("No frames extracted for analysis")
             return []
         
         # Generate CLIP embeddings
-        embeddings = self.generate_clip_embeddings(frames_data)
+        self.check_cancelled()
+        with stats.stage("embed", items=len(frames_data)):
+            embeddings = self.generate_clip_embeddings(frames_data)
+        
+        # Persist frame embeddings for cross-job search
+        if self.keyframe_index is not None and index_job_id:
+            with stats.stage("index", items=len(frames_data)):
+                self.keyframe_index.add(embeddings, index_job_id, os.path.basename(video_path),
+                                        [f['timestamp'] for f in frames_data], content_hash=index_content_hash)
         
         # Cluster and select keyframes
-        keyframes = self.cluster_frames_with_faiss(embeddings, frames_data, n_clusters, similarity_threshold)
+        self.check_cancelled()
+        with stats.stage("cluster", items=len(frames_data)):
+            keyframes = self.cluster_frames_with_faiss(embeddings, frames_data, n_clusters, similarity_threshold)
         
         return keyframes
     
@@ -214,41 +421,170 @@ class VideoProcessor:
         """Generate description for keyframe using OpenAI Vision API."""
         base64_image = self.frame_to_base64(frame)
         
-        default_prompt = """Describe this video frame in detail. Focus on:
-        - Main subjects and actions
-        - Setting/environment
-        - Key visual elements
-        - Mood/atmosphere
-        Keep the description concise but informative (2-3 sentences)."""
-        
-        prompt = custom_prompt or default_prompt
+        prompt = custom_prompt or DEFAULT_IMAGE_PROMPT
         
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
-                                    "detail": "low"
+            with openai_request("gpt-4o"):
+                response = self.openai_client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": prompt},
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/jpeg;base64,{base64_image}",
+                                        "detail": "low"
+                                    }
                                 }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=150
-            )
+                            ]
+                        }
+                    ],
+                    max_tokens=150
+                )
             content = response.choices[0].message.content
             return content.strip() if content else "No description generated"
         except Exception as e:
             print(f"Error describing image: {e}")
             return "Unable to generate description"
     
+    def describe_images_batch(self, keyframes: List[Dict], custom_prompt=None) -> List[str]:
+        """Describe several keyframes in a single multimodal request.
+        
+        Raises ValueError if the response is not a JSON array with one description per frame.
+        """
+        prompt = custom_prompt or DEFAULT_IMAGE_PROMPT
+        instructions = (f"{prompt}\n\nYou are given {len(keyframes)} frames from the same video, each preceded "
+                        f"by its timestamp. Describe each frame independently. Return ONLY a JSON array of "
+                        f"{len(keyframes)} strings, one description per frame, in the order given.")
+        
+        content = [{"type": "text", "text": instructions}]
+        for keyframe in keyframes:
+            content.append({"type": "text", "text": f"Frame at {self.format_timestamp(keyframe['timestamp'])}:"})
+            content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{self.frame_to_base64(keyframe['frame'])}",
+                    "detail": "low"
+                }
+            })
+        
+        with openai_request("gpt-4o"):
+            response = self.openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": content}],
+                max_tokens=150 * len(keyframes)
+            )
+        ai_response = response.choices[0].message.content or ""
+        
+        # Extract JSON array from response
+        start_idx = ai_response.find('[')
+        end_idx = ai_response.rfind(']') + 1
+        if start_idx == -1 or end_idx <= start_idx:
+            raise ValueError("No JSON array in batched description response")
+        descriptions = json.loads(ai_response[start_idx:end_idx])
+        
+        if not isinstance(descriptions, list) or len(descriptions) != len(keyframes):
+            raise ValueError(f"Expected {len(keyframes)} descriptions, got {len(descriptions) if isinstance(descriptions, list) else 'non-list'}")
+        if not all(isinstance(d, str) and d.strip() for d in descriptions):
+            raise ValueError("Batched description response contains empty or non-string entries")
+        
+        return [d.strip() for d in descriptions]
+    
+    def describe_keyframes(self, keyframes: List[Dict], custom_prompt=None, batch_size: int = 1,
+                           deadline: Optional[float] = None) -> List[str]:
+        """Describe keyframes, packing up to batch_size frames into each Vision request.
+        
+        Batches whose response cannot be parsed fall back to one request per frame.
+        If a time.monotonic() deadline is given, no new request is started after it
+        passes and only the descriptions obtained so far are returned, in input order.
+        """
+        batch_size = max(1, batch_size)
+        descriptions = []
+        with tqdm(total=len(keyframes), desc="Processing keyframes") as pbar:
+            for start in range(0, len(keyframes), batch_size):
+                self.check_cancelled()
+                if deadline is not None and time.monotonic() >= deadline:
+                    print(f"Description budget exhausted, skipping {len(keyframes) - start} keyframes")
+                    break
+                
+                batch = keyframes[start:start + batch_size]
+                request_start = time.monotonic()
+                if batch_size == 1:
+                    descriptions.append(self.describe_image(batch[0]['frame'], custom_prompt))
+                else:
+                    try:
+                        descriptions.extend(self.describe_images_batch(batch, custom_prompt))
+                    except Exception as e:
+                        print(f"Batched description failed ({e}), falling back to single-frame requests")
+                        descriptions.extend(self.describe_image(k['frame'], custom_prompt) for k in batch)
+                
+                # Exponential moving average of observed request latency
+                elapsed = time.monotonic() - request_start
+                self.describe_latency = 0.7 * self.describe_latency + 0.3 * elapsed
+                pbar.update(len(batch))
+        
+        return descriptions
+    
+    def rank_keyframes(self, keyframes: List[Dict]) -> List[Dict]:
+        """Order keyframes by cluster size weighted by novelty.
+        
+        Selection is greedy: each step picks the keyframe with the highest
+        normalized cluster size times (1 - max cosine similarity to the keyframes
+        already picked), so large clusters come first and near-duplicates sink.
+        """
+        if not keyframes:
+            return []
+        
+        embeddings = np.array([k['embedding'] for k in keyframes], dtype=np.float32)
+        sizes = np.array([k.get('cluster_size', 1) for k in keyframes], dtype=np.float32)
+        size_scores = sizes / sizes.max()
+        
+        max_similarity = np.zeros(len(keyframes), dtype=np.float32)
+        remaining = list(range(len(keyframes)))
+        ranked = []
+        
+        while remaining:
+            novelty = 1.0 - np.clip(max_similarity[remaining], 0.0, 1.0)
+            scores = size_scores[remaining] * novelty
+            best = remaining[int(np.argmax(scores))]
+            
+            keyframe = keyframes[best]
+            keyframe['rank'] = len(ranked)
+            keyframe['novelty'] = float(novelty[remaining.index(best)])
+            ranked.append(keyframe)
+            
+            remaining.remove(best)
+            max_similarity = np.maximum(max_similarity, embeddings @ embeddings[best])
+        
+        return ranked
+    
+    def select_keyframes_within_budget(self, keyframes: List[Dict], max_describe_calls: Optional[int] = None,
+                                       time_budget: Optional[float] = None, batch_size: int = 1) -> List[Dict]:
+        """Keep the highest ranked keyframes that fit a request-count or time budget.
+        
+        Returned keyframes are in rank order so that describing them in sequence
+        under a deadline drops the least valuable ones first.
+        """
+        batch_size = max(1, batch_size)
+        ranked = self.rank_keyframes(keyframes)
+        
+        affordable_calls = None
+        if max_describe_calls is not None:
+            affordable_calls = max_describe_calls
+        if time_budget is not None:
+            calls_in_time = int(time_budget // self.describe_latency)
+            affordable_calls = calls_in_time if affordable_calls is None else min(affordable_calls, calls_in_time)
+        
+        if affordable_calls is None:
+            return ranked
+        
+        selected = ranked[:max(0, affordable_calls) * batch_size]
+        print(f"Budget allows {affordable_calls} description calls: describing {len(selected)} of {len(ranked)} keyframes")
+        return selected
+    
     def format_timestamp(self, seconds):
         """Convert seconds to HH:MM:SS format."""
         hours = int(seconds // 3600)
@@ -257,28 +593,58 @@ class VideoProcessor:
         return f"{hours:02d}:{minutes:02d}:{secs:02d}"
     
     def process_video(self, video_path, output_path, sample_rate=1.0, n_clusters: Optional[int] = None, 
-                     similarity_threshold=0.8, image_prompt=None):
-        """Process a single video file with intelligent keyframe selection."""
+                     similarity_threshold=0.8, image_prompt=None, describe_batch_size: int = 1,
+                     max_describe_calls: Optional[int] = None, describe_time_budget: Optional[float] = None,
+                     index_job_id: Optional[str] = None, index_content_hash: Optional[str] = None):
+        """Process a single video file with intelligent keyframe selection.
+        
+        max_describe_calls and describe_time_budget (seconds) cap the Vision stage:
+        keyframes are ranked by cluster size and novelty and only the top ones
+        that fit the budget are described. index_job_id tags the frame embeddings
+        stored in the keyframe index, if one is configured, and index_content_hash
+        (the video's content hash) lets later jobs copy them with copy_video().
+        Returns the per-stage timing report, which is also written next to the output.
+        """
         print(f"Processing video: {video_path}")
         
-        # Create temporary audio file
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_audio:
-            temp_audio_path = temp_audio.name
+        stats = PipelineStats(os.path.basename(video_path))
+        temp_audio_path = None
         
         try:
-            # Extract audio
-            print("Extracting audio...")
-            if not self.extract_audio(video_path, temp_audio_path):
-                raise Exception("Failed to extract audio")
+            if self.ingest_mode == "demux":
+                # Decode audio and sampled frames in one pass over the container
+                with stats.stage("ingest") as stage:
+                    audio, frames_data = self.demux_video(video_path, sample_rate)
+                    stage["items"] = len(frames_data)
+                if audio.size == 0:
+                    raise Exception("Failed to extract audio")
+                audio_input = audio
+            else:
+                # Create temporary audio file
+                with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_audio:
+                    temp_audio_path = temp_audio.name
+                
+                # Extract audio
+                print("Extracting audio...")
+                with stats.stage("audio_extract", items=1):
+                    if not self.extract_audio(video_path, temp_audio_path):
+                        raise Exception("Failed to extract audio")
+                audio_input = temp_audio_path
+                frames_data = None
             
             # Transcribe audio
+            self.check_cancelled()
             print("Transcribing audio...")
-            transcript_result = self.transcribe_audio(temp_audio_path)
+            with stats.stage("transcribe") as stage:
+                transcript_result = self.transcribe_audio(audio_input)
+                stage["items"] = len(transcript_result.get('segments', []))
             
             # Extract keyframes using CLIP and FAISS
+            self.check_cancelled()
             print("Extracting intelligent keyframes...")
             keyframes = self.extract_intelligent_keyframes(
-                video_path, sample_rate, n_clusters, similarity_threshold
+                video_path, sample_rate, n_clusters, similarity_threshold, frames_data, stats, index_job_id,
+                index_content_hash
             )
             
             # Generate output
@@ -292,9 +658,21 @@ class VideoProcessor:
                     output_lines.append(f"[transcript:{timestamp}] {text}")
             
             # Add keyframes with AI descriptions
-            for i, keyframe in enumerate(tqdm(keyframes, desc="Processing keyframes")):
+            deadline = None
+            if max_describe_calls is not None or describe_time_budget is not None:
+                keyframes = self.select_keyframes_within_budget(
+                    keyframes, max_describe_calls, describe_time_budget, describe_batch_size
+                )
+                if describe_time_budget is not None:
+                    deadline = time.monotonic() + describe_time_budget
+            
+            with stats.stage("describe") as stage:
+                descriptions = self.describe_keyframes(keyframes, image_prompt, describe_batch_size, deadline)
+                stage["items"] = len(descriptions)
+            keyframes = keyframes[:len(descriptions)]
+            
+            for keyframe, description in zip(keyframes, descriptions):
                 timestamp = self.format_timestamp(keyframe['timestamp'])
-                description = self.describe_image(keyframe['frame'], image_prompt)
                 
                 # Include cluster information in the description
                 cluster_info = f" (Cluster {keyframe.get('cluster_id', 'N/A')}, " \
@@ -310,22 +688,29 @@ class VideoProcessor:
                 h, m, s = map(int, timestamp_str.split(':'))
                 return h * 3600 + m * 60 + s
             
-            output_lines.sort(key=extract_timestamp)
-            
             # Write output
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(output_lines))
+            self.check_cancelled()
+            with stats.stage("write", items=len(output_lines)):
+                output_lines.sort(key=extract_timestamp)
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(output_lines))
             
             print(f"Output saved to: {output_path}")
             print(f"Processed {len(keyframes)} intelligent keyframes")
             
+            stats_path = stats_path_for(output_path)
+            report = stats.save(stats_path)
+            print(f"Stage report saved to: {stats_path}")
+            return report
+            
         finally:
             # Clean up temporary audio file
-            if os.path.exists(temp_audio_path):
+            if temp_audio_path and os.path.exists(temp_audio_path):
                 os.unlink(temp_audio_path)
     
     def process_videos(self, video_dir, output_dir, sample_rate=1.0, n_clusters: Optional[int] = None, 
-                      similarity_threshold=0.8, image_prompt=None):
+                      similarity_threshold=0.8, image_prompt=None, describe_batch_size: int = 1,
+                      max_describe_calls: Optional[int] = None, describe_time_budget: Optional[float] = None):
         """Process multiple videos in a directory."""
         video_extensions = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm'}
         video_dir = Path(video_dir)
@@ -343,7 +728,8 @@ class VideoProcessor:
             output_file = output_dir / f"{video_file.stem}_processed.txt"
             try:
                 self.process_video(str(video_file), str(output_file), 
-                                 sample_rate, n_clusters, similarity_threshold, image_prompt)
+                                 sample_rate, n_clusters, similarity_threshold, image_prompt,
+                                 describe_batch_size, max_describe_calls, describe_time_budget)
             except Exception as e:
                 print(f"Error processing {video_file}: {e}")
                 continue
@@ -361,6 +747,14 @@ def main():
     parser.add_argument('-p', '--prompt', 
                        help='Custom prompt for image description')
     parser.add_argument('--api-key', help='OpenAI API key (or set OPENAI_API_KEY env var)')
+    parser.add_argument('--ingest', choices=['demux', 'legacy'], default='demux',
+                       help='Decode audio and frames in one ffmpeg pass (demux) or separately (legacy)')
+    parser.add_argument('-b', '--describe-batch', type=int, default=1,
+                       help='Keyframes described per Vision request (default: 1)')
+    parser.add_argument('--max-describe-calls', type=int,
+                       help='Maximum Vision requests per video; keyframes are ranked by cluster size and novelty')
+    parser.add_argument('--describe-budget', type=float,
+                       help='Time budget in seconds for Vision requests per video')
     
     args = parser.parse_args()
     
@@ -371,18 +765,20 @@ def main():
         return 1
     
     try:
-        processor = VideoProcessor(api_key)
+        processor = VideoProcessor(api_key, ingest_mode=args.ingest)
         
         input_path = Path(args.input)
         
         if input_path.is_file():
             # Process single video
             processor.process_video(args.input, args.output, args.sample_rate, 
-                                  args.clusters, args.threshold, args.prompt)
+                                  args.clusters, args.threshold, args.prompt, args.describe_batch,
+                                  args.max_describe_calls, args.describe_budget)
         elif input_path.is_dir():
             # Process multiple videos
             processor.process_videos(args.input, args.output, args.sample_rate, 
-                                   args.clusters, args.threshold, args.prompt)
+                                   args.clusters, args.threshold, args.prompt, args.describe_batch,
+                                   args.max_describe_calls, args.describe_budget)
         else:
             print(f"Error: {args.input} is not a valid file or directory")
             return 1